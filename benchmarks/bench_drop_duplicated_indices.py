@@ -0,0 +1,88 @@
+'''
+Benchmark of mics_library.utils.drop_duplicated_indices(..., 'mode'),
+as called by mics_library.loaders.merge_questionnaires,
+against the previous implementation based on groupby().agg(lambda)
+
+Usage:
+    python bench_drop_duplicated_indices.py [--rows N] [--columns N] [--dup-rate R]
+'''
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from mics_library.utils import drop_duplicated_indices
+
+def _mymode(x):
+    if x.isna().sum() == len(x):
+        return(np.nan)
+    else:
+        return(x.value_counts().index[0])
+
+def drop_duplicated_indices_reference(dataframe):
+    '''
+    Previous implementation of drop_duplicated_indices(dataframe, 'mode')
+    '''
+    dupl_indices = dataframe.index[np.where(dataframe.index.duplicated())[0]]
+    dataframe_dupl = dataframe.loc[dupl_indices]
+    dataframe_nodupl = dataframe.drop(dupl_indices, axis=0)
+    dataframe_dupl = dataframe_dupl.groupby(dataframe_dupl.index).agg(lambda x: _mymode(x))
+    dataframe = pd.concat([dataframe_dupl, dataframe_nodupl], axis=0)
+    return(dataframe)
+
+def create_data(n_rows, n_columns, dup_rate, seed=1234):
+    '''
+    Create a dataframe similar to a concatenated 'hl' questionnaire:
+    string HLID indices, coded answers (1-9, 98, 99) with missing values,
+    and a fraction dup_rate of rows that repeat an existing HLID
+    '''
+    rng = np.random.default_rng(seed)
+    
+    n_dupl = int(n_rows * dup_rate)
+    hlid = np.array([f'5_Country_{i // 500}_{(i // 5) % 100}_{i % 5 + 1}' for i in range(n_rows - n_dupl)])
+    hlid = np.concatenate([hlid, rng.choice(hlid, n_dupl)])
+    
+    data = {}
+    for j in range(n_columns):
+        values = rng.choice([1., 2., 3., 4., 5., 6., 7., 8., 9., 98., 99., np.nan], n_rows)
+        data[f'IND{j}'] = values
+    dataframe = pd.DataFrame(data, index=hlid)
+    dataframe = dataframe.sample(frac=1, random_state=seed)
+    return(dataframe)
+
+def _timeit(function, dataframe, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = function(dataframe)
+        times.append(time.perf_counter() - start)
+    return(result, min(times))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--columns', type=int, default=40)
+    parser.add_argument('--dup-rate', type=float, default=0.02)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    
+    dataframe = create_data(args.rows, args.columns, args.dup_rate)
+    print(f'{args.rows} rows, {args.columns} columns, '
+          f'{dataframe.index.duplicated().sum()} duplicated rows')
+    
+    result_reference, time_reference = _timeit(drop_duplicated_indices_reference, dataframe, args.repeat)
+    result, time_vectorized = _timeit(lambda df: drop_duplicated_indices(df, 'mode')[0], dataframe, args.repeat)
+    
+    #pandas does not define which value is returned by value_counts
+    #in case of ties: compare only groups with a unique mode
+    dataframe_dupl = dataframe.loc[dataframe.index[dataframe.index.duplicated()].unique()]
+    unique_mode = dataframe_dupl.groupby(dataframe_dupl.index).agg(
+        lambda x: (x.value_counts() == x.value_counts().max()).sum() <= 1)
+    unique_mode = unique_mode.reindex(result.index, fill_value=True).values.astype(bool)
+    
+    identical = (result_reference.loc[result.index].values == result.values) | \
+                (result_reference.loc[result.index].isna().values & result.isna().values)
+    
+    print(f'reference:  {time_reference:.3f} s')
+    print(f'vectorized: {time_vectorized:.3f} s')
+    print(f'speedup:    {time_reference / time_vectorized:.1f}x')
+    print(f'identical (groups with a unique mode): {bool(identical[unique_mode].all())}')
@@ -0,0 +1,164 @@
+'''
+Benchmark of the public entry points of mics_library
+(import_dataset, merge_questionnaires, screen, check_values)
+on a synthetic MICS_ROOTDIR (see synthetic.py).
+
+Each case runs in a new process, so that the wall time and the peak
+resident memory (RSS) of a case are not affected by the other cases.
+The results are saved in a json file, that can be compared with the
+results of a previous run to catch regressions.
+
+Usage:
+    python bench_entry_points.py [--rootdir DIR] [--round N] [--cases ...]
+                                 [--output results.json]
+                                 [--compare previous.json] [--threshold 0.2]
+'''
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+INDICATORS = {'hh': ['HELEVEL', 'HC1A', 'HHX1', 'HHX2'],
+              'hl': ['HL4', 'HL6', 'ED3', 'ED4A', 'HLX1', 'HLX2'],
+              'wm': ['WB2', 'MA1', 'WMX1'],
+              'ch': ['AG2', 'UB2', 'CHX1']}
+
+def _run_import(micsround, **kwargs):
+    from mics_library.loaders import import_dataset
+    return(lambda: import_dataset(micsround, INDICATORS, **kwargs))
+
+def _run_merge(micsround, **kwargs):
+    from mics_library.loaders import import_dataset, merge_questionnaires
+    dataset = import_dataset(micsround, INDICATORS)
+    return(lambda: merge_questionnaires(dataset, **kwargs))
+
+def _run_screen(micsround, **kwargs):
+    from mics_library.preview import screen
+    return(lambda: screen(micsround, **kwargs))
+
+def _run_check_values(micsround, **kwargs):
+    from mics_library.preview import check_values
+    return(lambda: check_values(micsround, INDICATORS, **kwargs))
+
+#name : (setup function, arguments); the setup returns the function to be timed
+CASES = {'import_dataset': (_run_import, {}),
+         'import_dataset_n_jobs': (_run_import, {'n_jobs': 4}),
+         'import_dataset_compact': (_run_import, {'compact': True, 'key_format': 'int'}),
+         'import_dataset_prefetch': (_run_import, {'prefetch': 2}),
+         'merge_questionnaires': (_run_merge, {}),
+         'merge_questionnaires_by_country': (_run_merge, {'by_country': True}),
+         'screen': (_run_screen, {}),
+         'check_values': (_run_check_values, {}),
+         'check_values_counts': (_run_check_values, {'counts': True})}
+
+def _peak_rss():
+    '''
+    Peak resident memory of this process, in bytes
+    '''
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return(maxrss if sys.platform == 'darwin' else maxrss * 1024)
+
+def run_case(name, rootdir, micsround):
+    '''
+    Run a case in this process and return its measures.
+    The output of the library is discarded.
+    '''
+    import mics_library
+    mics_library.set_rootdir(rootdir)
+
+    setup, kwargs = CASES[name]
+    with open(os.devnull, 'w') as devnull:
+        stdout = sys.stdout
+        sys.stdout = devnull
+        try:
+            function = setup(micsround, **kwargs)
+            rss_start = _peak_rss()
+            start = time.perf_counter()
+            function()
+            wall_time = time.perf_counter() - start
+        finally:
+            sys.stdout = stdout
+
+    return({'wall_time': wall_time,
+            'peak_rss': _peak_rss(),
+            'peak_rss_increase': _peak_rss() - rss_start})
+
+def run_in_subprocess(name, rootdir, micsround):
+    '''
+    Run a case in a new process
+    '''
+    output = subprocess.run([sys.executable, __file__, '--child', name, '--rootdir', rootdir,
+                             '--round', str(micsround)],
+                            check=True, capture_output=True, text=True).stdout
+    return(json.loads(output.strip().splitlines()[-1]))
+
+def compare(results, previous, threshold):
+    '''
+    Cases slower (or using more memory) than in the previous results
+    by more than a fraction threshold
+    '''
+    regressions = []
+    for name, result in results.items():
+        if name not in previous:
+            continue
+        for measure in ['wall_time', 'peak_rss']:
+            ratio = result[measure] / previous[name][measure]
+            if ratio > 1 + threshold:
+                regressions.append(f'{name}: {measure} {ratio:.2f}x')
+    return(regressions)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rootdir', help='MICS_ROOTDIR; default: a synthetic dataset in a temporary folder')
+    parser.add_argument('--round', type=int, default=5)
+    parser.add_argument('--countries', type=int, default=10)
+    parser.add_argument('--households', type=int, default=2000)
+    parser.add_argument('--cases', nargs='+', default=list(CASES.keys()), choices=list(CASES.keys()))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='json file where to save the results')
+    parser.add_argument('--compare', help='json file with the results of a previous run')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_case(args.child, args.rootdir, args.round)))
+        sys.exit(0)
+
+    tmpdir = None
+    if args.rootdir is None:
+        from synthetic import generate
+        tmpdir = tempfile.TemporaryDirectory()
+        args.rootdir = tmpdir.name
+        n_files = generate(args.rootdir, [args.round], args.countries, args.households)
+        print(f'{n_files} synthetic files, {args.countries} countries, {args.households} households each')
+
+    results = {}
+    for name in args.cases:
+        #best of the repetitions
+        runs = [run_in_subprocess(name, args.rootdir, args.round) for i in range(args.repeat)]
+        results[name] = {'wall_time': min([x['wall_time'] for x in runs]),
+                         'peak_rss': min([x['peak_rss'] for x in runs]),
+                         'peak_rss_increase': min([x['peak_rss_increase'] for x in runs])}
+        print(f"{name:<35} {results[name]['wall_time']:8.3f} s {results[name]['peak_rss']/1e6:8.1f} MB "
+              f"(+{results[name]['peak_rss_increase']/1e6:.1f} MB)")
+
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'round': args.round, 'results': results}, f, indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            previous = json.load(f)['results']
+        regressions = compare(results, previous, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if len(regressions) > 0:
+            sys.exit(1)
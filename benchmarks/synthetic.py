@@ -0,0 +1,304 @@
+'''
+Generator of a synthetic MICS_ROOTDIR, to test and benchmark mics_library
+without the datasets distributed by UNICEF.
+
+The tree follows the conventions of the MICS downloads:
+    MICS_ROOTDIR/MICS3/Ghana MICS 2006/hh.sav
+    MICS_ROOTDIR/MICS4/Ghana_MICS4_Datasets/hl.sav
+    MICS_ROOTDIR/MICS5/Ghana MICS 2015/wm.sav
+with the hh, hl, wm, ch, mn, bh questionnaires of each round, the columns
+needed to compute the keys, coded indicators with value labels, rows with
+duplicated keys, lowercase or mixed-case variable names in some countries,
+and the renamed variables listed in mics_library.swap_indicators.
+
+Usage:
+    python synthetic.py ROOTDIR [--rounds 3 4 5] [--countries N]
+                                [--households N] [--indicators N]
+'''
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import pyreadstat
+from mics_library.loaders import _get_key_cols
+from mics_library.swap_indicators import swap_indicators
+
+COUNTRIES = ['Ghana', 'Nepal', 'Mexico', 'Mongolia', 'Chad', 'Kenya', 'Albania',
+             'Burundi', 'Nigeria', 'Cameroon', 'Bangladesh', 'Malawi', 'Togo',
+             'Iraq', 'Belize', 'Guyana', 'Sudan', 'Viet Nam', 'Zimbabwe', 'Jamaica']
+
+YEARS = {3: 2006, 4: 2011, 5: 2015}
+
+#label of the coded indicators of each questionnaire: {acronym : (label, values)}
+INDICATORS = {'hh': {'HELEVEL': ('Education of household head', {1: 'None', 2: 'Primary', 3: 'Secondary', 9: 'Missing/DK'}),
+                     'HC1A': ('Religion of household head', {1: 'Religion A', 2: 'Religion B', 3: 'Other', 99: 'Missing'}),
+                     'HH6': ('Area', {1: 'Urban', 2: 'Rural'})},
+              'hl': {'HL4': ('Sex', {1: 'Male', 2: 'Female', 9: 'Missing'}),
+                     'ED3': ('Ever attended school', {1: 'Yes', 2: 'No', 8: 'DK', 9: 'Missing'}),
+                     'ED4A': ('Highest level of education attended', {0: 'Preschool', 1: 'Primary', 2: 'Secondary', 3: 'Higher', 8: 'DK', 9: 'Missing'})},
+              'wm': {'WB2': ('Age of woman', None),
+                     'MA1': ('Currently married or living with a man', {1: 'Yes, currently married', 2: 'Yes, living with a man', 3: 'No, not in union', 9: 'Missing'})},
+              'ch': {'AG2': ('Age of child', None),
+                     'UB2': ('Child attending early childhood education', {1: 'Yes', 2: 'No', 8: 'DK', 9: 'Missing'})},
+              'mn': {'MWB2': ('Age of man', None),
+                     'MMA1': ('Currently married or living with a woman', {1: 'Yes, currently married', 2: 'Yes, living with a woman', 3: 'No, not in union', 9: 'Missing'})},
+              'bh': {'BH4C': ('Sex of child', {1: 'Boy', 2: 'Girl'}),
+                     'BH5': ('Child still alive', {1: 'Yes', 2: 'No'})}}
+
+#labels of the additional coded indicators
+CODED_LABELS = {1: 'Yes', 2: 'No', 8: 'DK', 9: 'Missing'}
+
+#labels of the numerical indicators (e.g. the ages): only the special codes
+SPECIAL_LABELS = {98: 'DK', 99: 'Missing'}
+
+def get_folder(micsround, countryname):
+    '''
+    Name of the folder of a country, as parsed by
+    mics_library.utils.get_countryname
+    '''
+    if micsround == 4:
+        return(f'{countryname}_MICS4_Datasets')
+    return(f'{countryname} MICS {YEARS[micsround]}')
+
+def get_countrynames(n_countries):
+    '''
+    Names of the synthetic countries: real names first,
+    then regions of the real countries
+    '''
+    countrynames = []
+    for i in range(n_countries):
+        name = COUNTRIES[i % len(COUNTRIES)]
+        if i >= len(COUNTRIES):
+            name = f'{name} (Region {i // len(COUNTRIES)})'
+        countrynames.append(name)
+    return(countrynames)
+
+def _get_questionnaires(micsround):
+    '''
+    Questionnaires with an individual key in the round (and 'hh')
+    '''
+    return([q for q in ['hh', 'hl', 'wm', 'ch', 'mn', 'bh']
+            if q == 'hh' or 'HLID' in _get_key_cols(q, micsround)])
+
+def _line_number_columns(micsround):
+    '''
+    Name of the columns with line numbers of the household members,
+    in the role of each key
+    '''
+    roles = {'child_hh': ('hh', 'child_HLID'),
+             'line_hl': ('hl', 'HLID'),
+             'mother_hl': ('hl', 'mother_HLID'),
+             'father_hl': ('hl', 'father_HLID'),
+             'line_wm': ('wm', 'HLID'),
+             'line_ch': ('ch', 'HLID'),
+             'caretaker_ch': ('ch', 'caretaker_HLID'),
+             'line_mn': ('mn', 'HLID'),
+             'child_bh': ('bh', 'HLID'),
+             'mother_bh': ('bh', 'mother_HLID')}
+
+    questionnaires = _get_questionnaires(micsround)
+    columns = {}
+    for role, (questionnaire, key) in roles.items():
+        key_cols = _get_key_cols(questionnaire, micsround) if questionnaire in questionnaires else {}
+        columns[role] = key_cols[key][2] if key in key_cols else None
+    return(columns)
+
+def _create_household_members(n_households, rng):
+    '''
+    Members of the households: HH1 (cluster), HH2 (household),
+    line number, age, sex and line numbers of the parents
+    '''
+    n_clusters = max(1, n_households // 20)
+    hh1 = np.sort(rng.integers(1, n_clusters + 1, n_households))
+    hh2 = np.zeros(n_households, dtype=int)
+    for cluster in np.unique(hh1):
+        hh2[hh1 == cluster] = np.arange(1, (hh1 == cluster).sum() + 1)
+    households = pd.DataFrame({'HH1': hh1, 'HH2': hh2})
+
+    size = rng.integers(1, 9, n_households)
+    members = households.loc[households.index.repeat(size)].reset_index(drop=True)
+    members['line'] = members.groupby(['HH1', 'HH2']).cumcount() + 1
+    members['age'] = np.where(members['line'] <= 2, rng.integers(18, 80, len(members)), rng.integers(0, 40, len(members)))
+    members['sex'] = np.where(members['line'] == 1, 1, np.where(members['line'] == 2, 2, rng.integers(1, 3, len(members))))
+
+    #children of the first two members
+    is_child = (members['line'] > 2) & (members['age'] < 18)
+    members['mother'] = np.where(is_child, 2, np.nan)
+    members['father'] = np.where(is_child, 1, np.nan)
+    return(households, members)
+
+def _coded(rng, n, values, p_missing=0.05):
+    values = rng.choice(np.array(list(values), dtype=float), n)
+    values[rng.random(n) < p_missing] = np.nan
+    return(values)
+
+def _add_indicators(df, questionnaire, n_indicators, rng):
+    '''
+    Add the coded indicators of the questionnaire and n_indicators
+    additional coded indicators.
+
+    Returns the column labels and the value labels
+    '''
+    column_labels = {}
+    value_labels = {}
+    if 'HL6' in df.columns:
+        column_labels['HL6'] = 'Age'
+        value_labels['HL6'] = {float(k): v for k, v in SPECIAL_LABELS.items()}
+    for acronym, (label, labels) in INDICATORS[questionnaire].items():
+        if labels is None:
+            df[acronym] = rng.integers(0, 50, len(df)).astype(float)
+            value_labels[acronym] = {float(k): v for k, v in SPECIAL_LABELS.items()}
+        else:
+            df[acronym] = _coded(rng, len(df), labels.keys())
+            value_labels[acronym] = {float(k): v for k, v in labels.items()}
+        column_labels[acronym] = label
+
+    for j in range(n_indicators):
+        acronym = f'{questionnaire.upper()}X{j + 1}'
+        df[acronym] = _coded(rng, len(df), CODED_LABELS.keys())
+        column_labels[acronym] = f'Synthetic indicator {j + 1}'
+        value_labels[acronym] = {float(k): v for k, v in CODED_LABELS.items()}
+
+    return(column_labels, value_labels)
+
+def _create_questionnaires(micsround, n_households, rng):
+    '''
+    Data of all the questionnaires of a country
+    '''
+    columns = _line_number_columns(micsround)
+    households, members = _create_household_members(n_households, rng)
+
+    data = {}
+
+    hh = households.copy()
+    children = members[members['age'] < 5]
+    child = children.groupby(['HH1', 'HH2'])['line'].first()
+    hh[columns['child_hh']] = child.reindex(pd.MultiIndex.from_frame(households)).values
+    data['hh'] = hh
+
+    hl = members[['HH1', 'HH2']].copy()
+    hl[columns['line_hl']] = members['line'].values
+    hl['HL6'] = members['age'].values
+    hl[columns['mother_hl']] = members['mother'].values
+    hl[columns['father_hl']] = members['father'].values
+    data['hl'] = hl
+
+    women = members[(members['sex'] == 2) & (members['age'] >= 15) & (members['age'] <= 49)]
+    wm = women[['HH1', 'HH2']].copy()
+    wm[columns['line_wm']] = women['line'].values
+    data['wm'] = wm
+
+    ch = children[['HH1', 'HH2']].copy()
+    ch[columns['line_ch']] = children['line'].values
+    ch[columns['caretaker_ch']] = 2
+    data['ch'] = ch
+
+    if columns['line_mn'] is not None:
+        men = members[(members['sex'] == 1) & (members['age'] >= 15) & (members['age'] <= 59)]
+        mn = men[['HH1', 'HH2']].copy()
+        mn[columns['line_mn']] = men['line'].values
+        data['mn'] = mn
+
+    if columns['child_bh'] is not None:
+        #births of the women in the households: some children live elsewhere
+        births = women.loc[women.index.repeat(rng.integers(0, 4, len(women)))]
+        bh = births[['HH1', 'HH2']].copy()
+        bh[columns['mother_bh']] = births['line'].values
+        bh[columns['child_bh']] = np.where(rng.random(len(bh)) < 0.7, rng.integers(3, 9, len(bh)), 0)
+        data['bh'] = bh
+
+    data = {q: df.astype(float).reset_index(drop=True) for q, df in data.items()}
+    return(data)
+
+def _add_duplicates(df, indicators, dup_rate, rng):
+    '''
+    Repeat the keys of a fraction dup_rate of the rows
+    (with different values of the indicators)
+    '''
+    n_dupl = int(len(df) * dup_rate)
+    if n_dupl == 0:
+        return(df)
+    dupl = df.iloc[rng.choice(len(df), n_dupl)].copy()
+    for c in indicators:
+        dupl[c] = rng.permutation(dupl[c].values)
+    return(pd.concat([df, dupl], axis=0, ignore_index=True))
+
+def _rename(df, column_labels, value_labels, renames):
+    df = df.rename(columns = renames)
+    column_labels = {renames.get(k, k): v for k, v in column_labels.items()}
+    value_labels = {renames.get(k, k): v for k, v in value_labels.items()}
+    return(df, column_labels, value_labels)
+
+def generate(rootdir, rounds=[3, 4, 5], n_countries=5, n_households=500, n_indicators=20, dup_rate=0.01, seed=0):
+    '''
+    Write a synthetic MICS_ROOTDIR
+
+    Parameters
+    ----------
+    rootdir : str
+        Path of the MICS_ROOTDIR to be created
+    rounds : list of int, optional
+        Rounds of the MICS. Default [3, 4, 5]
+    n_countries : int, optional
+        Number of countries in each round. Default 5
+    n_households : int, optional
+        Number of households in each country. Default 500
+    n_indicators : int, optional
+        Number of additional coded indicators in each questionnaire. Default 20
+    dup_rate : float, optional
+        Fraction of rows with duplicated keys. Default 0.01
+    seed : int, optional
+        Seed of the random generator. Default 0
+
+    Returns
+    -------
+    int
+        Number of files written
+    '''
+    rng = np.random.default_rng(seed)
+
+    n_files = 0
+    for micsround in rounds:
+        for i, countryname in enumerate(get_countrynames(n_countries)):
+            folder = os.path.join(rootdir, f'MICS{micsround}', get_folder(micsround, countryname))
+            os.makedirs(folder, exist_ok=True)
+
+            data = _create_questionnaires(micsround, n_households, rng)
+            for questionnaire, df in data.items():
+                column_labels, value_labels = _add_indicators(df, questionnaire, n_indicators, rng)
+                df = _add_duplicates(df, list(column_labels.keys()), dup_rate, rng)
+
+                #names used in the country instead of the standard ones
+                swap = swap_indicators[micsround].get(questionnaire, {}).get(countryname, {})
+                renames = {k: v for k, v in swap.items() if v != '' and k in df.columns}
+                df, column_labels, value_labels = _rename(df, column_labels, value_labels, renames)
+
+                #lowercase names in some countries, mixed case in others
+                if i % 3 == 1:
+                    renames = {c: c.lower() for c in df.columns}
+                elif i % 3 == 2:
+                    renames = {c: c.lower() for c in df.columns[1::2]}
+                else:
+                    renames = {}
+                df, column_labels, value_labels = _rename(df, column_labels, value_labels, renames)
+
+                pyreadstat.write_sav(df, os.path.join(folder, f'{questionnaire}.sav'),
+                                     column_labels = [column_labels.get(c, c) for c in df.columns],
+                                     variable_value_labels = value_labels)
+                n_files += 1
+    return(n_files)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('rootdir')
+    parser.add_argument('--rounds', type=int, nargs='+', default=[3, 4, 5])
+    parser.add_argument('--countries', type=int, default=5)
+    parser.add_argument('--households', type=int, default=500)
+    parser.add_argument('--indicators', type=int, default=20)
+    parser.add_argument('--dup-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    n_files = generate(args.rootdir, args.rounds, args.countries, args.households,
+                       args.indicators, args.dup_rate, args.seed)
+    print(f'{n_files} files written in {args.rootdir}')
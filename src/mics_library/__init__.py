@@ -7,4 +7,14 @@ def get_rootdir():
     MICS_ROOTDIR = None
     if 'MICS_ROOTDIR' in os.environ:
         MICS_ROOTDIR = os.environ['MICS_ROOTDIR']
-    return(MICS_ROOTDIR)
\ No newline at end of file
+    return(MICS_ROOTDIR)
+
+def set_cachedir(MICS_CACHEDIR, maxsize=10e9):
+    os.environ['MICS_CACHEDIR'] = str(MICS_CACHEDIR)
+    os.environ['MICS_CACHE_MAXSIZE'] = str(int(maxsize))
+
+def get_cachedir():
+    MICS_CACHEDIR = None
+    if 'MICS_CACHEDIR' in os.environ:
+        MICS_CACHEDIR = os.environ['MICS_CACHEDIR']
+    return(MICS_CACHEDIR)
\ No newline at end of file
@@ -0,0 +1,95 @@
+import pandas as pd
+
+#pyarrow is optional: only needed for the arrow backend
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+#columns of the keys with few distinct values, stored as dictionaries
+DICTIONARY_COLUMNS = ['HHID', 'country']
+
+def _check_pyarrow():
+    if pa is None:
+        raise ImportError('pyarrow is required for the arrow backend: pip install mics_library[arrow]')
+
+def _to_pyarrow(values, dictionary=False):
+    '''
+    Convert the values of a column to a pyarrow array.
+    Arrow-backed columns are not copied; nans become nulls
+    '''
+    if isinstance(values.dtype, pd.ArrowDtype):
+        array = pa.array(values.array)
+    else:
+        array = pa.Array.from_pandas(values)
+
+    if dictionary and not pa.types.is_dictionary(array.type) and pa.types.is_string(array.type):
+        array = array.dictionary_encode()
+    return(array)
+
+def to_arrow_dtypes(df, dictionary_columns=DICTIONARY_COLUMNS):
+    '''
+    Convert the columns and the index of a dataframe to pyarrow dtypes
+    (pandas.ArrowDtype): numbers with nans become nullable arrow numbers,
+    categoricals and the string columns in dictionary_columns become
+    dictionary-encoded arrays
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The data or the keys of a dataset
+    dictionary_columns : list of str, optional
+        String columns to be dictionary-encoded.
+        Default: HHID and country
+
+    Returns
+    -------
+    pandas.DataFrame
+        The dataframe with arrow-backed columns
+    '''
+    _check_pyarrow()
+
+    data = {}
+    for c in df.columns:
+        data[c] = pd.arrays.ArrowExtensionArray(_to_pyarrow(df[c], c in dictionary_columns))
+    index = pd.Index(pd.arrays.ArrowExtensionArray(_to_pyarrow(df.index.to_series())), name = df.index.name)
+
+    return(pd.DataFrame(data, index = index, columns = df.columns, copy = False))
+
+def to_arrow(data, keys=None):
+    '''
+    Convert the data (and the keys) of a dataset to a pyarrow.Table,
+    e.g. to be used by polars (polars.from_arrow) or DuckDB.
+    Arrow-backed columns (see the dtype_backend of
+    mics_library.loaders.import_dataset and merge_questionnaires) share
+    their buffers with the table, the other columns are converted.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        The data, as returned by import_dataset or merge_questionnaires
+    keys : pandas.DataFrame, optional
+        The keys. Columns of the keys already in the data are not added.
+        Default None = only the data
+
+    Returns
+    -------
+    pyarrow.Table
+        The index (named as the index of the data, or 'index'),
+        the columns of the data and the columns of the keys
+    '''
+    _check_pyarrow()
+
+    if keys is not None:
+        assert data.index.equals(keys.index), 'data and keys must have the same index'
+
+    index_name = data.index.name if data.index.name is not None else 'index'
+    columns = {index_name: _to_pyarrow(data.index.to_series())}
+    for c in data.columns:
+        columns[c] = _to_pyarrow(data[c])
+    if keys is not None:
+        for c in keys.columns:
+            if c not in columns:
+                columns[c] = _to_pyarrow(keys[c], c in DICTIONARY_COLUMNS)
+
+    return(pa.table(columns))
@@ -0,0 +1,246 @@
+import numpy as np
+import pandas as pd
+import pyreadstat
+import hashlib
+import json
+import pickle
+import shutil
+from . import get_cachedir
+import os
+
+#bump when the layout of the cache entries changes
+CACHE_VERSION = 1
+
+#folder of the cache directory with the harmonization plans (see mics_library.plan)
+PLANS_DIRNAME = 'plans'
+
+def read_sav(datafile, usecols=None):
+    '''
+    Read a .sav file, through the column cache if a cache directory has been
+    set with mics_library.set_cachedir
+
+    Parameters
+    ----------
+    datafile : str
+        Path to the .sav datafile
+    usecols : list of str, optional
+        Columns to be read. Columns not in the file are ignored.
+        Default None = all columns
+
+    Returns
+    -------
+    pandas.DataFrame : df
+        Dataframe with the loaded data
+    pandas.DataFrame : meta
+        Dataframe with the metadata
+    '''
+    if get_cachedir() is None:
+        df, meta = pyreadstat.read_sav(datafile, usecols = usecols)
+    else:
+        df, meta = _read_sav_cached(datafile, usecols)
+    return(df, meta)
+
+def read_meta(datafile):
+    '''
+    Read only the metadata of a .sav file, from the cache if a cache
+    directory has been set with mics_library.set_cachedir
+
+    Parameters
+    ----------
+    datafile : str
+        Path to the .sav datafile
+
+    Returns
+    -------
+    pandas.DataFrame : meta
+        Dataframe with the metadata
+    '''
+    if get_cachedir() is None:
+        _, meta = pyreadstat.read_sav(datafile, metadataonly=True)
+    else:
+        _, meta = _open_entry(datafile)
+    return(meta)
+
+def clear_cache():
+    '''
+    Remove all the entries in the cache directory
+    '''
+    CACHEDIR = get_cachedir()
+    if CACHEDIR is not None and os.path.exists(CACHEDIR):
+        for entry in os.listdir(CACHEDIR):
+            shutil.rmtree(os.path.join(CACHEDIR, entry), ignore_errors=True)
+
+def _get_maxsize():
+    if 'MICS_CACHE_MAXSIZE' in os.environ:
+        return(int(os.environ['MICS_CACHE_MAXSIZE']))
+    return(None)
+
+def _get_fingerprint(datafile):
+    '''
+    Identify the version of a source file: a cache entry is valid only if
+    the fingerprint it was created from matches the current one
+    '''
+    stat = os.stat(datafile)
+    fingerprint = {'path': os.path.abspath(datafile),
+                   'size': stat.st_size,
+                   'mtime_ns': stat.st_mtime_ns,
+                   'version': CACHE_VERSION}
+    return(fingerprint)
+
+def _get_entry(datafile):
+    '''
+    Path of the cache entry (a folder) of a source file
+    '''
+    name = hashlib.sha1(os.path.abspath(datafile).encode('utf-8')).hexdigest()
+    return(os.path.join(get_cachedir(), name))
+
+def _atomic_save(filename, save_function):
+    '''
+    Write a file via a temporary file, so that readers never see it partial
+    '''
+    filename_tmp = f'{filename}.{os.getpid()}.tmp'
+    with open(filename_tmp, 'wb') as f:
+        save_function(f)
+    os.replace(filename_tmp, filename)
+
+def _open_entry(datafile):
+    '''
+    Return the path and the metadata of the cache entry of a source file.
+    The entry is (re)created if missing or if the source file has changed.
+    '''
+    entry = _get_entry(datafile)
+    fingerprint = _get_fingerprint(datafile)
+    fingerprint_file = os.path.join(entry, 'fingerprint.json')
+
+    valid = False
+    if os.path.exists(fingerprint_file):
+        with open(fingerprint_file) as f:
+            valid = json.load(f) == fingerprint
+
+    if not valid:
+        #the source changed (or new file): drop all the decoded columns
+        shutil.rmtree(entry, ignore_errors=True)
+        os.makedirs(entry, exist_ok=True)
+
+        _, meta = pyreadstat.read_sav(datafile, metadataonly=True)
+        _atomic_save(os.path.join(entry, 'meta.pkl'), lambda f: pickle.dump(meta, f))
+
+        #the fingerprint is written last: it marks the entry as complete
+        _atomic_save(fingerprint_file, lambda f: f.write(json.dumps(fingerprint).encode('utf-8')))
+    else:
+        #mark as recently used
+        os.utime(fingerprint_file)
+
+    with open(os.path.join(entry, 'meta.pkl'), 'rb') as f:
+        meta = pickle.load(f)
+
+    return(entry, meta)
+
+def _is_cached(datafile, usecols=None):
+    '''
+    Whether the selected columns of a source file are all in a valid cache
+    entry, so that reading them does not open the source file
+    '''
+    if get_cachedir() is None:
+        return(False)
+
+    entry = _get_entry(datafile)
+    try:
+        with open(os.path.join(entry, 'fingerprint.json')) as f:
+            if json.load(f) != _get_fingerprint(datafile):
+                return(False)
+        with open(os.path.join(entry, 'meta.pkl'), 'rb') as f:
+            meta = pickle.load(f)
+    except (OSError, ValueError, pickle.UnpicklingError): #missing, incomplete or removed entry
+        return(False)
+
+    columns = [c for c in meta.column_names if usecols is None or c in usecols]
+    return(all([os.path.exists(os.path.join(entry, f'col_{meta.column_names.index(c)}.npy')) for c in columns]))
+
+def _read_sav_cached(datafile, usecols=None):
+    '''
+    Read the selected columns of a .sav file from the cache.
+    Columns not yet in the cache are decoded with pyreadstat and stored,
+    one .npy file for each column.
+    '''
+    entry, meta = _open_entry(datafile)
+
+    #select the columns in the file, keeping the order of the file
+    if usecols is None:
+        columns = list(meta.column_names)
+    else:
+        columns = [c for c in meta.column_names if c in usecols]
+
+    column_files = {}
+    for c in columns:
+        column_files[c] = os.path.join(entry, f'col_{meta.column_names.index(c)}.npy')
+
+    #decode and store the missing columns
+    missing = [c for c in columns if not os.path.exists(column_files[c])]
+    if len(missing) > 0:
+        df_missing, _ = pyreadstat.read_sav(datafile, usecols = missing)
+        for c in missing:
+            values = df_missing[c].values
+            _atomic_save(column_files[c], lambda f: np.save(f, values, allow_pickle=True))
+        _evict(keep = entry)
+
+    data = {}
+    for c in columns:
+        data[c] = np.load(column_files[c], allow_pickle=True)
+    df = pd.DataFrame(data, columns = columns)
+
+    return(df, meta)
+
+def _get_size(entry):
+    size = 0
+    for item in os.listdir(entry):
+        size += os.path.getsize(os.path.join(entry, item))
+    return(size)
+
+def _evict(keep=None):
+    '''
+    Remove the least recently used entries until the size of the cache
+    is below the maximum size. The harmonization plans (see 
+    mics_library.plan.get_plan) are entries too, one for each plan file.
+    '''
+    maxsize = _get_maxsize()
+    if maxsize is None:
+        return
+
+    CACHEDIR = get_cachedir()
+    entries = []
+    for name in os.listdir(CACHEDIR):
+        entry = os.path.join(CACHEDIR, name)
+        fingerprint_file = os.path.join(entry, 'fingerprint.json')
+        try:
+            last_used = os.path.getmtime(fingerprint_file)
+            entries.append([last_used, entry, _get_size(entry)])
+        except OSError: #incomplete entry, or removed by another process
+            continue
+
+    plansdir = os.path.join(CACHEDIR, PLANS_DIRNAME)
+    if os.path.isdir(plansdir):
+        for name in os.listdir(plansdir):
+            planfile = os.path.join(plansdir, name)
+            if not name.endswith('.pkl'): #being written
+                continue
+            try:
+                entries.append([os.path.getmtime(planfile), planfile, os.path.getsize(planfile)])
+            except OSError: #removed by another process
+                continue
+
+    total_size = sum([x[2] for x in entries])
+
+    #oldest first
+    for last_used, entry, size in sorted(entries):
+        if total_size <= maxsize:
+            break
+        if entry != keep:
+            if os.path.isdir(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                try:
+                    os.remove(entry)
+                except OSError: #removed by another process
+                    pass
+            total_size -= size
@@ -0,0 +1,208 @@
+import pyreadstat
+import sqlite3
+from . import get_rootdir
+import os
+
+CATALOG_FILENAME = 'mics_catalog.sqlite'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    micsround INTEGER, country TEXT, questionnaire TEXT,
+    size INTEGER, mtime_ns INTEGER, number_rows INTEGER,
+    PRIMARY KEY (micsround, country, questionnaire));
+CREATE TABLE IF NOT EXISTS variables (
+    micsround INTEGER, country TEXT, questionnaire TEXT,
+    position INTEGER, name TEXT, label TEXT, value_label_set TEXT);
+CREATE TABLE IF NOT EXISTS value_labels (
+    micsround INTEGER, country TEXT, questionnaire TEXT,
+    value_label_set TEXT, value, label TEXT);
+CREATE INDEX IF NOT EXISTS variables_unit
+    ON variables (micsround, questionnaire, country);
+CREATE INDEX IF NOT EXISTS value_labels_unit
+    ON value_labels (micsround, questionnaire, country);
+'''
+
+class CatalogMeta:
+    '''
+    Metadata of a .sav file, as stored in the catalog.
+    It provides the same attributes of the metadata returned by
+    pyreadstat.read_sav used by mics_library.loaders.get_dict, and the
+    (size, mtime_ns) of the file when it was catalogued in source
+    '''
+    def __init__(self):
+        self.column_names = []
+        self.column_labels = []
+        self.variable_to_label = {}
+        self.value_labels = {}
+        self.number_rows = None
+        self.number_columns = 0
+        self.source = None
+
+def get_catalogfile():
+    '''
+    Path of the catalog file, stored in the MICS_ROOTDIR
+    '''
+    return(os.path.join(get_rootdir(), CATALOG_FILENAME))
+
+def _connect():
+    con = sqlite3.connect(get_catalogfile())
+    con.executescript(_SCHEMA)
+    return(con)
+
+def _delete_unit(con, micsround, country, questionnaire):
+    for table in ['files', 'variables', 'value_labels']:
+        con.execute(f'DELETE FROM {table} WHERE micsround=? AND country=? AND questionnaire=?',
+                    (micsround, country, questionnaire))
+
+def _insert_unit(con, micsround, country, questionnaire, stat, meta):
+    unit = (micsround, country, questionnaire)
+
+    con.execute('INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)',
+                unit + (stat.st_size, stat.st_mtime_ns, meta.number_rows))
+
+    variables = []
+    for position, (name, label) in enumerate(zip(meta.column_names, meta.column_labels)):
+        value_label_set = meta.variable_to_label[name] if name in meta.variable_to_label else None
+        variables.append(unit + (position, name, label, value_label_set))
+    con.executemany('INSERT INTO variables VALUES (?, ?, ?, ?, ?, ?, ?)', variables)
+
+    value_labels = []
+    for value_label_set, int2value_dict in meta.value_labels.items():
+        for value, label in int2value_dict.items():
+            value_labels.append(unit + (value_label_set, value, label))
+    con.executemany('INSERT INTO value_labels VALUES (?, ?, ?, ?, ?, ?)', value_labels)
+
+def update_catalog(micsround, questionnaires=None):
+    '''
+    Create or incrementally refresh the catalog of a MICS's round.
+    Only the metadata of new or changed files (based on size and
+    modification time) are read; files that have been removed are
+    removed from the catalog.
+
+    Parameters
+    ----------
+    micsround : int
+        The round of the mics
+    questionnaires: list, optional
+        Which questionnaires to refresh
+        Default None = all the .sav files of each country
+
+    Returns
+    -------
+    int
+        Number of files whose metadata have been (re)read
+    '''
+    MICS_ROOTDIR = get_rootdir()
+    DATADIR = os.path.join(MICS_ROOTDIR, f'MICS{micsround}')
+
+    con = _connect()
+
+    #fingerprints of the files already in the catalog
+    known = {}
+    for country, questionnaire, size, mtime_ns in con.execute(
+            'SELECT country, questionnaire, size, mtime_ns FROM files WHERE micsround=?', (micsround,)):
+        if (questionnaires is None) or (questionnaire in questionnaires):
+            known[(country, questionnaire)] = (size, mtime_ns)
+
+    n_updated = 0
+    with con:
+        for country in sorted(os.listdir(DATADIR)):
+            for item in sorted(os.listdir(os.path.join(DATADIR, country))):
+                questionnaire, extension = os.path.splitext(item)
+                if (extension != '.sav') or ((questionnaires is not None) and (questionnaire not in questionnaires)):
+                    continue
+
+                stat = os.stat(os.path.join(DATADIR, country, item))
+
+                #unchanged file
+                if known.pop((country, questionnaire), None) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+
+                _, meta = pyreadstat.read_sav(os.path.join(DATADIR, country, item), metadataonly=True)
+                _delete_unit(con, micsround, country, questionnaire)
+                _insert_unit(con, micsround, country, questionnaire, stat, meta)
+                n_updated += 1
+
+        #remaining files are not anymore in the MICS_ROOTDIR
+        for country, questionnaire in known.keys():
+            _delete_unit(con, micsround, country, questionnaire)
+
+    con.close()
+    return(n_updated)
+
+def get_metas(micsround, questionnaire, country=None):
+    '''
+    Obtain the metadata of a questionnaire for all the countries in the catalog
+
+    Parameters
+    ----------
+    micsround : int
+        The round of the mics
+    questionnaire : str
+        The questionnaire
+    country : str, optional
+        Name of the folder of the country.
+        Default None = all the countries
+
+    Returns
+    -------
+    dict
+        {country_folder : CatalogMeta}
+    '''
+    con = _connect()
+
+    condition = 'micsround=? AND questionnaire=?'
+    parameters = (micsround, questionnaire)
+    if country is not None:
+        condition += ' AND country=?'
+        parameters += (country,)
+
+    metas = {}
+    for country, number_rows, size, mtime_ns in con.execute(
+            f'SELECT country, number_rows, size, mtime_ns FROM files WHERE {condition} ORDER BY country', parameters):
+        meta = CatalogMeta()
+        meta.number_rows = number_rows
+        meta.source = (size, mtime_ns)
+        metas[country] = meta
+
+    for country, name, label, value_label_set in con.execute(
+            f'SELECT country, name, label, value_label_set FROM variables WHERE {condition} ORDER BY country, position',
+            parameters):
+        meta = metas[country]
+        meta.column_names.append(name)
+        meta.column_labels.append(label)
+        meta.number_columns += 1
+        if value_label_set is not None:
+            meta.variable_to_label[name] = value_label_set
+
+    for country, value_label_set, value, label in con.execute(
+            f'SELECT country, value_label_set, value, label FROM value_labels WHERE {condition}', parameters):
+        value_labels = metas[country].value_labels
+        if value_label_set not in value_labels:
+            value_labels[value_label_set] = {}
+        value_labels[value_label_set][value] = label
+
+    con.close()
+    return(metas)
+
+def get_meta(micsround, country, questionnaire):
+    '''
+    Obtain the metadata of a questionnaire of a country from the catalog
+
+    Parameters
+    ----------
+    micsround : int
+        The round of the mics
+    country : str
+        Name of the folder of the country
+    questionnaire : str
+        The questionnaire
+
+    Returns
+    -------
+    CatalogMeta or None
+        None if the file is not in the catalog
+    '''
+    metas = get_metas(micsround, questionnaire, country)
+    meta = metas[country] if country in metas else None
+    return(meta)
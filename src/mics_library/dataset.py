@@ -0,0 +1,178 @@
+import copy
+from .loaders import import_dataset, import_rounds, merge_questionnaires
+
+class MICSDataset:
+    '''
+    Lazy description of a dataset to be imported from one or more
+    MICS's rounds.
+
+    Indicators, countries and row filters are only recorded by the
+    select, countries and filter methods (each returns a new MICSDataset);
+    nothing is read until collect is called. The selections are then pushed
+    down to the import: only the selected columns of the files of the
+    selected countries are read, and the rows are filtered while the
+    files are read in chunks.
+
+    E.g.:
+        ds = MICSDataset(5, recoding_dictionary)
+        ds = ds.select('hl', ['HL4', 'HL6']).select('ch', ['UB2'])
+        ds = ds.countries(['Ghana', 'Nepal']).filter('hl', 'HL6', 5, 17)
+        dataset = ds.collect()
+
+    With a list of rounds the dataset is imported with
+    mics_library.loaders.import_rounds (all the rounds stacked):
+        ds = MICSDataset([4, 5], {4: recoding_dictionary_4, 5: recoding_dictionary_5})
+
+    Parameters
+    ----------
+    micsround : int or list of int
+        The round of the mics, or a list of rounds
+    recoding_dictionary : dict, optional
+        See mics_library.loaders.import_dataset.
+        { micsround : recoding_dictionary } if micsround is a list
+    swap_indicators : dict, optional
+        See mics_library.loaders.import_dataset.
+        { micsround : swap_indicators } if micsround is a list
+    ignorecase : bool, optional
+        See mics_library.loaders.import_dataset
+    '''
+    def __init__(self, micsround, recoding_dictionary={}, swap_indicators={}, ignorecase=True):
+        self.micsround = micsround
+        self.recoding_dictionary = recoding_dictionary
+        self.swap_indicators = swap_indicators
+        self.ignorecase = ignorecase
+        self.indicators = {}
+        self.country_names = None
+        self.filters = {}
+
+    def __repr__(self):
+        countries = 'all' if self.country_names is None else self.country_names
+        return(f'MICSDataset(micsround={self.micsround}, indicators={self.indicators}, countries={countries}, filters={self.filters})')
+
+    def _copy(self):
+        new = copy.copy(self)
+        new.indicators = copy.deepcopy(self.indicators)
+        new.filters = copy.deepcopy(self.filters)
+        new.country_names = None if self.country_names is None else list(self.country_names)
+        return(new)
+
+    def select(self, questionnaire, indicators):
+        '''
+        Add indicators of a questionnaire to the dataset
+
+        Parameters
+        ----------
+        questionnaire : str
+            The questionnaire
+        indicators : list of str
+            The indicators to be imported
+
+        Returns
+        -------
+        MICSDataset
+            The new dataset
+        '''
+        new = self._copy()
+        selected = new.indicators.setdefault(questionnaire, [])
+        selected.extend([x for x in indicators if x not in selected])
+        return(new)
+
+    def countries(self, countries):
+        '''
+        Restrict the dataset to some countries
+
+        Parameters
+        ----------
+        countries : list of str
+            Names of the countries (as returned by
+            mics_library.utils.get_countryname)
+
+        Returns
+        -------
+        MICSDataset
+            The new dataset
+        '''
+        new = self._copy()
+        if new.country_names is None:
+            new.country_names = list(countries)
+        else:
+            new.country_names = [x for x in new.country_names if x in countries]
+        return(new)
+
+    def filter(self, questionnaire, indicator, low=None, high=None):
+        '''
+        Keep only the rows of a questionnaire with low <= indicator <= high.
+        The values are compared after the recoding; rows with nan values
+        are excluded. Filters on the same indicator are intersected
+        (with ignorecase, the case of the indicator is ignored).
+
+        Parameters
+        ----------
+        questionnaire : str
+            The questionnaire
+        indicator : str
+            The indicator used to select the rows (it needs not be selected)
+        low : float, optional
+            Minimum value. Default None = no limit
+        high : float, optional
+            Maximum value. Default None = no limit
+
+        Returns
+        -------
+        MICSDataset
+            The new dataset
+        '''
+        new = self._copy()
+        if new.ignorecase:
+            indicator = indicator.upper()
+        filters_questionnaire = new.filters.setdefault(questionnaire, {})
+        if indicator in filters_questionnaire:
+            low_old, high_old = filters_questionnaire[indicator]
+            if low is None or (low_old is not None and low_old > low):
+                low = low_old
+            if high is None or (high_old is not None and high_old < high):
+                high = high_old
+        filters_questionnaire[indicator] = (low, high)
+        return(new)
+
+    def collect(self, merge=False, merge_kwargs={}, **kwargs):
+        '''
+        Import the dataset
+
+        Parameters
+        ----------
+        merge : bool, optional
+            Whether to merge the questionnaires with
+            mics_library.loaders.merge_questionnaires. Default False
+        merge_kwargs : dict, optional
+            Arguments of mics_library.loaders.merge_questionnaires
+            (e.g. by_country, duplicates)
+        **kwargs
+            Other arguments of mics_library.loaders.import_dataset
+            (or import_rounds) (e.g. n_jobs, key_format, compact)
+
+        Returns
+        -------
+        dict or tuple
+            The result of import_dataset (or import_rounds), or the 
+            merged (data, keys) dataframes if merge
+        '''
+        assert len(self.indicators) > 0, "No indicators selected"
+
+        #questionnaires filtered but not selected are not imported
+        filters = {q: f for q, f in self.filters.items() if q in self.indicators}
+
+        if isinstance(self.micsround, (list, tuple)):
+            dataset = import_rounds(self.micsround, self.indicators, self.recoding_dictionary,
+                                    self.swap_indicators, self.ignorecase,
+                                    countries=self.country_names, filters=filters, **kwargs)
+            if merge:
+                return(merge_questionnaires({q: {'all': v} for q, v in dataset.items()}, **merge_kwargs))
+            return(dataset)
+
+        dataset = import_dataset(self.micsround, self.indicators, self.recoding_dictionary,
+                                 self.swap_indicators, self.ignorecase,
+                                 countries=self.country_names, filters=filters, **kwargs)
+        if merge:
+            return(merge_questionnaires(dataset, **merge_kwargs))
+        return(dataset)
@@ -0,0 +1,212 @@
+import pandas as pd
+import time
+import os
+from contextlib import contextmanager
+
+#in the worker processes of import_dataset the events are kept
+#and sent back to the main process, where the listeners are
+_deferred = False
+_pending = []
+
+def defer():
+    '''
+    Keep the events of this process until collect is called, instead of
+    emitting them. Used as initializer of the worker processes.
+    '''
+    global _deferred
+    _deferred = True
+
+def _add(event):
+    if _deferred:
+        _pending.append(event)
+    else:
+        emit([event])
+
+def _get_rss():
+    '''
+    Current resident memory of the process in bytes (None if not available)
+    '''
+    try:
+        with open('/proc/self/statm') as f:
+            return(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE'))
+    except (OSError, ValueError, AttributeError):
+        return(None)
+
+def _new_event(questionnaire, country, stage):
+    return({'questionnaire': questionnaire, 'country': country, 'stage': stage,
+            'duration': None, 'rows': None, 'columns': None, 'bytes': None,
+            'memory_delta': None})
+
+@contextmanager
+def stage(questionnaire, country, name):
+    '''
+    Measure a stage of the processing of a questionnaire of a country.
+    The event is yielded, so that rows, columns and bytes can be filled,
+    and is emitted at the end of the stage.
+
+    E.g.:
+        with stage('hl', 'Ghana', 'read') as event:
+            df = ...
+            event['rows'], event['columns'] = df.shape
+    '''
+    event = _new_event(questionnaire, country, name)
+    memory_start = _get_rss()
+    start = time.perf_counter()
+    try:
+        yield(event)
+    finally:
+        event['duration'] = time.perf_counter() - start
+        memory_end = _get_rss()
+        if memory_start is not None and memory_end is not None:
+            event['memory_delta'] = memory_end - memory_start
+        _add(event)
+
+def notice(questionnaire, country, name, **fields):
+    '''
+    Record an event without duration (e.g. a file not found)
+    '''
+    event = _new_event(questionnaire, country, name)
+    event.update(fields)
+    _add(event)
+
+def collect():
+    '''
+    Remove and return the events kept by a worker process (see defer),
+    to send them back to import_dataset.
+    '''
+    events = list(_pending)
+    _pending.clear()
+    return(events)
+
+def emit(events):
+    '''
+    Send the events to all the listeners
+    '''
+    for event in events:
+        for listener in list(_listeners):
+            listener(event)
+
+def print_notices(event):
+    '''
+    Default listener: print the files not found, the files skipped,
+    the failed units, the values not in the recoding dictionary,
+    the memory saved by compacting and the updates of a manifest
+    '''
+    if event['stage'] == 'not_found':
+        print(f">>>>>>>>>>>>>>>>>> {event['datafile']}  NOT FOUND")
+    elif event['stage'] == 'skipped':
+        print(f">>>>>>>>>>>>>>>>>> {event['questionnaire']}: {event['country']}  SKIPPED (none of the indicators in the file)")
+    elif event['stage'] == 'failed':
+        print(f">>>>>>>>>>>>>>>>>> {event['questionnaire']}: {event['country']}  FAILED ({event['error']})")
+    elif event['stage'] == 'unmapped':
+        print(f">>>>>>>>>>>>>>>>>> {event['questionnaire']}: {event['country']}  {event['indicator']}: {event['n_unmapped']} values not in the recoding dictionary")
+    elif event['stage'] == 'compacted':
+        print(f">>>>>>>>>>>>>>>>>> {event['bytes_saved']/1e6:.1f} MB saved by compacting dtypes")
+    elif event['stage'] == 'manifest':
+        print(f">>>>>>>>>>>>>>>>>> {event['stale']} new or changed files, {event['removed']} removed, {event['unchanged']} unchanged")
+
+_listeners = [print_notices]
+
+def add_listener(listener):
+    '''
+    Add a function called with each event (a dict with
+    questionnaire, country, stage, duration, rows, columns, bytes,
+    memory_delta and, for some stages, other information).
+    bytes is the size of the file for the 'read' stage, and the memory
+    used by the data for the 'index' and 'compact' stages; bytes_saved
+    is the memory saved by the 'compact' stage.
+    memory_delta is the change of the resident memory of the process
+    during the stage.
+
+    Events are emitted by the main process, also when the import
+    runs in parallel.
+    '''
+    _listeners.append(listener)
+
+def remove_listener(listener):
+    '''
+    Remove a listener. Remove print_notices to silence the messages
+    about the files not found, the values not recoded, etc.
+    '''
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+class Recorder:
+    '''
+    Collect the events emitted while active. See record
+    '''
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def to_frame(self):
+        '''
+        The events as a pandas.DataFrame, one row for each event
+        '''
+        columns = ['questionnaire', 'country', 'stage', 'duration', 'rows', 'columns', 'bytes', 'memory_delta']
+        return(pd.DataFrame(self.events).reindex(columns = columns))
+
+    def summary(self, n=5):
+        '''
+        Summary of the recorded events
+
+        Parameters
+        ----------
+        n : int, optional
+            Number of the slowest countries and units to report. Default 5
+
+        Returns
+        -------
+        dict
+            {'stages': total duration and memory of each stage,
+             'countries': the n slowest (questionnaire, country),
+             'units': the n slowest (questionnaire, country, stage)}
+        '''
+        events = self.to_frame()
+        events = events[events['duration'].notna()]
+        events = events.fillna({'questionnaire': '', 'country': ''})
+
+        stages = events.groupby('stage', sort=False).agg(duration = ('duration', 'sum'),
+                                                         count = ('duration', 'size'),
+                                                         memory_delta = ('memory_delta', 'sum'))
+        stages = stages.sort_values('duration', ascending=False)
+        stages['fraction'] = stages['duration'] / stages['duration'].sum()
+
+        countries = events.groupby(['questionnaire', 'country'])['duration'].sum()
+        countries = countries.sort_values(ascending=False).head(n)
+
+        units = events.groupby(['questionnaire', 'country', 'stage'])['duration'].sum()
+        units = units.sort_values(ascending=False).head(n)
+
+        return({'stages': stages, 'countries': countries, 'units': units})
+
+    def report(self, n=5):
+        '''
+        Print the summary of the recorded events (see summary)
+        '''
+        summary = self.summary(n)
+        print('Time by stage:')
+        print(summary['stages'].to_string())
+        print(f'\nSlowest {n} countries:')
+        print(summary['countries'].to_string())
+        print(f'\nSlowest {n} stages of a country:')
+        print(summary['units'].to_string())
+
+@contextmanager
+def record():
+    '''
+    Record the events emitted in the block.
+
+    E.g.:
+        with record() as recorder:
+            dataset = import_dataset(5, indicators)
+        recorder.report()
+    '''
+    recorder = Recorder()
+    add_listener(recorder)
+    try:
+        yield(recorder)
+    finally:
+        remove_listener(recorder)
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+#key of the related person, for each relation
+RELATIONS = {'mother': 'mother_HLID',
+             'father': 'father_HLID',
+             'caretaker': 'caretaker_HLID',
+             'child': 'child_HLID'}
+
+def _get_positions(target_ids, ids):
+    '''
+    Positions in target_ids of the ids (-1 if not found or nan).
+    If an id is repeated in target_ids, the first row is used.
+    '''
+    target_ids = pd.Index(target_ids)
+    first_rows = None
+    if not target_ids.is_unique:
+        is_first = ~target_ids.duplicated()
+        first_rows = np.where(is_first)[0]
+        target_ids = target_ids[is_first]
+
+    positions = target_ids.get_indexer(ids)
+    if first_rows is not None:
+        positions = np.where(positions >= 0, first_rows[positions], -1)
+    positions[np.asarray(pd.isna(ids))] = -1
+    return(positions.astype(np.int64))
+
+def build_links(keys, target_keys=None, relations=None):
+    '''
+    Build the link index of the related persons: for each row of keys and
+    each relation, the (integer) position of the row of the related person
+    in the target, found once with a single vectorized lookup of the HLIDs.
+
+    Parameters
+    ----------
+    keys : pandas.DataFrame
+        The keys, as returned by import_dataset or merge_questionnaires
+    target_keys : pandas.DataFrame, optional
+        The keys of the rows where the related persons are searched
+        (by HLID). Default None = keys (e.g. the merged keys)
+    relations : list of str, optional
+        Relations among 'mother', 'father', 'caretaker', 'child'.
+        Default None = all the relations with a key in keys
+
+    Returns
+    -------
+    pandas.DataFrame
+        Same index of keys, one int64 column for each relation:
+        the position of the related person in the target, -1 if
+        not available
+    '''
+    if target_keys is None:
+        target_keys = keys
+    if relations is None:
+        relations = [r for r, c in RELATIONS.items() if c in keys.columns]
+
+    links = {}
+    for relation in relations:
+        assert relation in RELATIONS, f'relation must be one of {list(RELATIONS.keys())}'
+        links[relation] = _get_positions(target_keys['HLID'].values, keys[RELATIONS[relation]].values)
+    return(pd.DataFrame(links, index = keys.index, columns = relations))
+
+def _take(values, positions):
+    '''
+    values[positions], with nan where positions is -1
+    '''
+    if isinstance(values.dtype, np.dtype):
+        values = values.to_numpy()
+    else:
+        values = values.array
+    return(pd.api.extensions.take(values, positions, allow_fill=True))
+
+def _get_cached_links(keys, relations, n_rows):
+    '''
+    The link index stored in the keys by merge_questionnaires(links=True),
+    or None if it is missing or if the rows have changed since the merge
+    (subset, reordered or concatenated): the positions would be stale
+    '''
+    columns = ['row'] + [f'{r}_row' for r in relations]
+    if not all([c in keys.columns for c in columns]):
+        return(None)
+    if not np.array_equal(np.asarray(keys['row']), np.arange(n_rows)):
+        return(None)
+    return(pd.DataFrame({r: keys[f'{r}_row'].values for r in relations}, index = keys.index))
+
+def attach_related(data, keys, relation='mother', columns=None, target=None, target_keys=None, links=None):
+    '''
+    Add to each row the values of the indicators of a related person
+    (e.g. the education of the mother), gathering the rows by their position
+    in the link index instead of joining on the string keys.
+
+    E.g.:
+        data, keys = merge_questionnaires(dataset, links=True)
+        data = attach_related(data, keys, ['mother', 'father'], ['ED4A'])
+        #columns mother_ED4A and father_ED4A
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        The data
+    keys : pandas.DataFrame
+        The keys of the data
+    relation : str or list of str, optional
+        'mother', 'father', 'caretaker' or 'child', or a list of them.
+        Default 'mother'
+    columns : list of str, optional
+        Columns of the target to be added. Default None = all the columns
+    target : pandas.DataFrame, optional
+        The data where the related persons are (e.g. the hl questionnaire
+        for the caretakers of the ch questionnaire).
+        Default None = data
+    target_keys : pandas.DataFrame, optional
+        The keys of target. Default None = keys
+    links : pandas.DataFrame, optional
+        The link index (see build_links), for the current rows of data and 
+        target. Default None = the columns {relation}_row of keys (see 
+        merge_questionnaires) if target is None and the rows are still those
+        of the merge, otherwise it is built from the HLIDs of the keys
+
+    Returns
+    -------
+    pandas.DataFrame
+        The data with the new columns {relation}_{column}
+    '''
+    relations = [relation] if isinstance(relation, str) else list(relation)
+
+    if target is None:
+        target = data
+        target_keys = keys
+        if links is None:
+            links = _get_cached_links(keys, relations, data.shape[0])
+    elif target_keys is None:
+        raise ValueError('target_keys is required with target')
+
+    if links is None:
+        links = build_links(keys, target_keys, relations)
+
+    if columns is None:
+        columns = list(target.columns)
+
+    related = {}
+    for r in relations:
+        positions = np.asarray(links[r], dtype = np.int64)
+        if positions.shape[0] != data.shape[0] or (positions >= target.shape[0]).any():
+            raise ValueError('the links do not match the rows of data and target')
+        for c in columns:
+            related[f'{r}_{c}'] = _take(target[c], positions)
+
+    related = pd.DataFrame(related, index = data.index)
+    return(pd.concat([data, related], axis=1))
@@ -1,11 +1,24 @@
 import numpy as np
 import pandas as pd
 import pyreadstat
-from .utils import get_countryname, indicators2key, drop_duplicated_indices
-from .swap_indicators import merge_swap_indicators
+from .utils import get_countryname, get_country_codes, indicators2key, drop_duplicated_indices, compact_dtypes, _sparse_array
+from .cache import read_sav, read_meta, _is_cached
+from .recode import apply_recoding
+from .arrow import to_arrow_dtypes
+from .links import build_links
 from . import get_rootdir
+from . import instrument
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from queue import Queue, Full, Empty
+import threading
 import os
 
+#number of rows read at once when filtering the rows of a file
+FILTER_CHUNKSIZE = 100000
+
+#size of the blocks read when prefetching a file
+PREFETCH_BLOCKSIZE = 1 << 20
+
 def _get_key_cols(questionnaire, micsround):
     '''
     Define the keys that are computed for each questionnaire,
@@ -101,7 +114,7 @@ def _get_key_cols(questionnaire, micsround):
             
     return(keys_dict)
 
-def _compute_keys(questionnaire, df, micsround, prefix = ''):
+def _compute_keys(questionnaire, df, micsround, prefix = '', key_format = 'str', country_code = 0):
     '''
     Compute the keys of a datframe, given the questionnaire, micsround and country
     
@@ -117,6 +130,10 @@ def _compute_keys(questionnaire, df, micsround, prefix = ''):
     prefix : string
         Prefix to be used at the beginning of the key;
         typically: MICSROUND_COUNTRY
+    key_format : str
+        'str' or 'int', see mics_library.utils.indicators2key
+    country_code : int
+        Code of the country, used if key_format = 'int'
     
     Returns
     -------
@@ -133,7 +150,7 @@ def _compute_keys(questionnaire, df, micsround, prefix = ''):
         columns_key = key_cols_quest[key_name]
         df_keys = df.reindex(columns = columns_key)
 
-        keys[key_name] = indicators2key(df_keys, prefix)
+        keys[key_name] = indicators2key(df_keys, prefix, key_format, micsround, country_code)
     
     if questionnaire == 'hh':
         keys['index'] = keys['HHID']
@@ -150,7 +167,74 @@ def _compute_keys(questionnaire, df, micsround, prefix = ''):
    
     return(keys)
 
-def load_sav(datafile, indicators, swap_indicators = {}, ignorecase=True):
+def resolve_columns(column_names, indicators, swap_indicators = {}, ignorecase=True):
+    '''
+    Resolve the selected indicators to the exact columns of a .sav file,
+    managing the swap indicators and the case of the acronyms 
+    (see load_sav), so that only existing columns are read.
+    
+    Parameters
+    ----------
+    column_names : list of str
+        Names of the columns of the file (e.g. meta.column_names)
+    indicators : list of str
+        Acronyms of the indicators to be loaded
+    swap_indicators : dict
+        { correct_acronym : acronym_in_country }
+    ignorecase : bool, optional
+        Whether to ignore cases of characters of acronyms. Default True
+    
+    Returns
+    -------
+    list
+        Names of the columns to be read, in the order of the file
+    dict
+        { name in the file : name of the indicator after loading }
+    list
+        Indicators that are not in the file
+    '''
+    normalize = (lambda x: x.upper()) if ignorecase else (lambda x: x)
+    
+    #name in the file -> name of the indicator
+    wanted = {}
+    for x in indicators:
+        wanted[normalize(swap_indicators[x] if x in swap_indicators else x)] = normalize(x)
+    
+    usecols = []
+    renames = {}
+    found = set()
+    for c in column_names:
+        name = wanted.get(normalize(c))
+        #the same column in upper and lower case is read once
+        if name is not None and name not in found:
+            usecols.append(c)
+            renames[c] = name
+            found.add(name)
+    
+    missing = [x for x in indicators if normalize(x) not in found]
+    
+    return(usecols, renames, missing)
+
+def _get_labelled_columns(meta, swap_indicators = {}, ignorecase=True):
+    '''
+    Obtain the columns with value labels in the .sav file:
+    { name in the loaded dataframe : list of the labelled values }
+    '''
+    swap_indicators_inv = {v: k for k, v in swap_indicators.items()}
+    if ignorecase:
+        swap_indicators_inv = {v.upper(): k.upper() for v, k in swap_indicators_inv.items()}
+    
+    labelled_columns = {}
+    for c, value_label_set in meta.variable_to_label.items():
+        labelled_values = list(meta.value_labels[value_label_set].keys()) if value_label_set in meta.value_labels else []
+        if ignorecase:
+            c = c.upper()
+        if c in swap_indicators_inv:
+            c = swap_indicators_inv[c]
+        labelled_columns[c] = labelled_values
+    return(labelled_columns)
+
+def load_sav(datafile, indicators, swap_indicators = {}, ignorecase=True, compact=False):
     '''
     Load a .sav file containing MICS data (as downloaded from UNICEF).
     Load only the selected indicators, 
@@ -176,6 +260,16 @@ def load_sav(datafile, indicators, swap_indicators = {}, ignorecase=True):
     ignorecase : bool, optional
         Whether to ignore cases of characters of acronyms. Default True
     
+    compact : bool, optional
+        Whether to convert the columns to the narrowest dtype 
+        (see mics_library.utils.compact_dtypes); columns whose values all 
+        have value labels are converted to pandas.Categorical. The memory saved is reported 
+        by the 'compact' event (see mics_library.instrument). Default False
+    
+    If a cache directory has been set with mics_library.set_cachedir, 
+    the decoded columns are stored there and later loads of the same file
+    only read the requested columns from the cache.
+    
     Returns
     -------
     pandas.DataFrame : df
@@ -183,35 +277,56 @@ def load_sav(datafile, indicators, swap_indicators = {}, ignorecase=True):
     pandas.DataFrame : meta
         Dataframe with the metadata
     '''
+    #only the columns in the file are read
+    usecols, renames, missing = resolve_columns(read_meta(datafile).column_names, indicators, swap_indicators, ignorecase)
     
-    #manage swap indicators - BEFORE
-    #add wrong indicators to the list of columns to load
-    for k,v in swap_indicators.items():
-        if k in indicators:
-            indicators.append(v)
-            indicators.remove(k)
+    #read through the column cache, if enabled
+    df, meta = read_sav(datafile, usecols = usecols)
     
-    #manage upper-lowercase indicators
-    if ignorecase:
-        indicators_upper = [x.upper() for x in indicators]
-        indicators_lower = [x.lower() for x in indicators]
-
-        indicators = indicators_upper + indicators_lower
+    df.rename(columns = renames, inplace=True)
     
-    df, meta = pyreadstat.read_sav(datafile, usecols = indicators)
+    if compact:
+        with instrument.stage(None, None, 'compact') as event:
+            df, event['bytes_saved'] = compact_dtypes(df, _get_labelled_columns(meta, swap_indicators, ignorecase))
+            event['datafile'] = datafile
+            event['rows'], event['columns'] = df.shape
+            event['bytes'] = int(df.memory_usage(index=False).sum())
     
-    #manage swap indicators - AFTER
-    #assign the correct names to the columns
-    swap_indicators_inv = {v: k for k, v in swap_indicators.items()} #get inverse dict
-    df.rename(swap_indicators_inv, axis='columns', inplace=True) #rename columns
+    return(df, meta)
+
+def iter_sav(datafile, indicators, swap_indicators = {}, ignorecase=True, chunksize=100000):
+    '''
+    Load a .sav file containing MICS data (as downloaded from UNICEF)
+    in chunks of rows, so that the whole file is never in memory.
+    Indicators are selected and renamed as in load_sav.
     
-    #all indicators to uppercase
-    if ignorecase:
-        df.columns = [x.upper() for x in df.columns]
-        #CHECK: should I process meta too?
-        #so far it is used only in get_dict and ignore_case is managed there
+    Parameters
+    ----------
+    datafile : str
+        Path to the .sav datafile from which to load the indicatora
+    indicators : list of str
+        Acronyms of the indicators to be loaded
+    swap_indicators : dict
+        See load_sav
+    ignorecase : bool, optional
+        Whether to ignore cases of characters of acronyms. Default True
+    chunksize : int, optional
+        Number of rows in each chunk. Default 100000
     
-    return(df, meta)
+    Yields
+    ------
+    pandas.DataFrame : df
+        Dataframe with the loaded data of the chunk
+    pandas.DataFrame : meta
+        Dataframe with the metadata
+    '''
+    usecols, renames, missing = resolve_columns(read_meta(datafile).column_names, indicators, swap_indicators, ignorecase)
+    
+    reader = pyreadstat.read_file_in_chunks(pyreadstat.read_sav, datafile, 
+                                            chunksize=chunksize, usecols=usecols)
+    for df, meta in reader:
+        df.rename(columns = renames, inplace=True)
+        yield(df, meta)
 
 def get_dict(meta, ignorecase=False):
     '''
@@ -254,7 +369,516 @@ def get_dict(meta, ignorecase=False):
             df_dict[variable] = variable_dict
     return(df_dict)
 
-def import_dataset(micsround, indicators, recoding_dictionary={}, swap_indicators = {}, ignorecase=True):
+def _filter_rows(df, filters):
+    '''
+    Select the rows of df with the values of the indicators in a range
+    
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Dataframe to process
+    filters : dict
+        { indicator : (low, high) }
+        Rows with low <= indicator <= high are selected; 
+        None means no limit. Rows with nan values (or without the 
+        indicator) are excluded.
+    
+    Returns
+    -------
+    pandas.DataFrame
+        The selected rows
+    '''
+    mask = np.ones(df.shape[0], dtype=bool)
+    for indicator, (low, high) in filters.items():
+        if indicator not in df.columns:
+            mask[:] = False
+            continue
+        values = df[indicator]
+        if low is not None:
+            mask &= (values >= low).fillna(False).values
+        if high is not None:
+            mask &= (values <= high).fillna(False).values
+    return(df.loc[mask].copy())
+
+def _process_country(df, micsround, questionnaire, countryname, indicators_questionnaire, 
+                     keys_columns, recoding_country, 
+                     key_format='str', country_code=0, labelled_columns=None, filters=None):
+    '''
+    Recode the values and compute the keys of the data loaded from one 
+    questionnaire of one country (or from a chunk of it)
+    
+    Parameters
+    ----------
+    keys_columns : list of str
+        Columns loaded to compute the keys (or to filter the rows),
+        removed if not in indicators_questionnaire
+    recoding_country : dict
+        { indicator : compiled recoding } 
+        (see mics_library.recode.compile_recoding_dict)
+    filters : dict, optional
+        If specified, only the rows within the ranges are kept,
+        after the recoding (see _filter_rows)
+    labelled_columns : dict, optional
+        If specified, the dtypes of the data are compacted and the columns
+        whose values are all labelled are converted to pandas.Categorical
+        ({ column : labelled values }, see mics_library.utils.compact_dtypes)
+    
+    Returns
+    -------
+    list
+        [data, keys]
+    dict
+        Information about the processing, reported by import_dataset
+    '''
+    info = {'unmapped': {}}
+    
+    #recode values
+    with instrument.stage(questionnaire, countryname, 'recode') as event:
+        for indicator, compiled in recoding_country.items():
+            if indicator in df.columns:
+                df[indicator], n_unmapped = apply_recoding(df[indicator], compiled)
+                if n_unmapped > 0:
+                    info['unmapped'][indicator] = n_unmapped
+        event['rows'], event['columns'] = df.shape
+    
+    #select rows
+    if filters is not None:
+        with instrument.stage(questionnaire, countryname, 'filter') as event:
+            df = _filter_rows(df, filters)
+            event['rows'], event['columns'] = df.shape
+
+    #compute keys                    
+    with instrument.stage(questionnaire, countryname, 'keys') as event:
+        keys = _compute_keys(questionnaire, df, micsround, f'{micsround}_{countryname}', 
+                             key_format, country_code)
+        event['rows'], event['columns'] = df.shape[0], len(keys)
+    
+    with instrument.stage(questionnaire, countryname, 'index') as event:
+        #add index to df
+        df.index = keys['index']
+        
+        #create dataframe with computed keys
+        keys = pd.DataFrame(keys)
+        keys.index = keys.pop('index')
+                        
+        #remove columns used to compute keys but not selected
+        col_to_remove = []
+        for c in keys_columns:
+            if (c not in indicators_questionnaire) and (c in df.columns):
+                col_to_remove.append(c)
+        
+        df.drop(col_to_remove, axis=1, inplace=True)
+        
+        # add country information to keys
+        keys['country'] = np.repeat(countryname, df.shape[0])
+        event['rows'], event['columns'] = df.shape
+        event['bytes'] = int(df.memory_usage(index=False).sum())
+    
+    #compact dtypes, after recoding and the computation of the keys
+    if labelled_columns is not None:
+        with instrument.stage(questionnaire, countryname, 'compact') as event:
+            df, info['bytes_saved'] = compact_dtypes(df, labelled_columns)
+            event['bytes_saved'] = info['bytes_saved']
+            event['rows'], event['columns'] = df.shape
+            event['bytes'] = int(df.memory_usage(index=False).sum())
+    
+    return([df, keys], info)
+
+def _load_country(micsround, questionnaire, country, indicators_questionnaire, 
+                  keys_columns, recoding_country, 
+                  swap_indicators_country, ignorecase, 
+                  key_format='str', country_code=0, compact=False, filters=None,
+                  usecols=None, renames=None, labelled_columns=None, chunksize=None,
+                  dtype_backend='numpy'):
+    '''
+    Load, recode and compute the keys of one questionnaire of one country.
+    This is the unit of work of mics_library.loaders.import_dataset.
+    
+    Parameters
+    ----------
+    micsround : int
+        The round of the mics
+    questionnaire : str
+        The questionnaire to be loaded
+    country : str
+        Name of the folder of the country
+    indicators_questionnaire : list of str
+        Acronyms of the indicators to be loaded
+    keys_columns : list of str
+        Additional indicators needed to compute the keys
+    recoding_country : dict
+        { indicator : compiled recoding }, the recodings of the country
+        (see mics_library.recode.compile_recoding_dict)
+    swap_indicators_country : dict
+        { new_name_indic1 : name_indic1, ...}
+    ignorecase : bool
+        Whether to ignore cases of characters of acronyms.
+    key_format : str
+        'str' or 'int', see mics_library.utils.indicators2key
+    country_code : int
+        Code of the country, used if key_format = 'int'
+    compact : bool
+        Whether to compact the dtypes of the data
+    filters : dict, optional
+        { indicator : (low, high) } ranges of values of the rows to be kept.
+        The file is read in chunks and each chunk is filtered, so that the 
+        whole file is never in memory. The chunks are read from the file,
+        not from the column cache (see mics_library.cache), which stores 
+        whole columns.
+    usecols : list of str, optional
+        Exact names of the columns to be read from the file, 
+        resolved by the harmonization plan (see mics_library.plan.get_plan).
+        Default None = resolve the columns when the file is read (see load_sav)
+    renames : dict, optional
+        { name in the file : name of the indicator }, used with usecols
+    labelled_columns : dict, optional
+        Columns with value labels ({ column : labelled values }), used with usecols
+    chunksize : int, optional
+        If specified, return a generator of ([data, keys], info) of chunks of 
+        chunksize rows (see iter_sav)
+    dtype_backend : str, optional
+        'numpy' or 'pyarrow', see import_dataset
+    
+    Returns
+    -------
+    list or None
+        [data, keys] of the country, None if the datafile is not found
+    dict
+        Information about the processing, reported by import_dataset
+    '''
+    MICS_ROOTDIR = get_rootdir()
+    countryname = get_countryname(micsround, country)
+    
+    #get datafile
+    datafile = os.path.join(MICS_ROOTDIR, f'MICS{micsround}', country, f'{questionnaire}.sav')
+    
+    #events kept by a worker process for a previous unit that failed
+    instrument.collect()
+    
+    if not os.path.exists(datafile): #file not found
+        instrument.notice(questionnaire, countryname, 'not_found', datafile = datafile)
+        return(None, {'events': instrument.collect()})
+    
+    #columns to be loaded are the selected + needed for the keys (and filters)
+    if filters is not None:
+        keys_columns = keys_columns + [c for c in filters.keys() if c not in keys_columns]
+    cols_to_be_loaded = indicators_questionnaire + keys_columns
+    
+    if usecols is not None:
+        #exact columns and names resolved by the harmonization plan
+        read_args = (usecols, {}, False)
+    else:
+        read_args = (cols_to_be_loaded, swap_indicators_country, ignorecase)
+        renames = {}
+    
+    process_args = (micsround, questionnaire, countryname, indicators_questionnaire, 
+                    keys_columns, recoding_country, key_format, country_code)
+    
+    if chunksize is not None:
+        chunks = _read_chunks(datafile, read_args, renames, chunksize, questionnaire, countryname)
+        return((_process_country(df, *process_args, _get_labelled(meta, swap_indicators_country, ignorecase, labelled_columns) if compact else None, filters) 
+                for df, meta in chunks))
+    
+    if filters is not None:
+        #filter the rows chunk by chunk (bypassing the column cache)
+        meta = read_meta(datafile)
+        results = []
+        info = {'unmapped': {}}
+        for df, _ in _read_chunks(datafile, read_args, renames, FILTER_CHUNKSIZE, questionnaire, countryname):
+            result, info_chunk = _process_country(df, *process_args, None, filters)
+            results.append(result)
+            for indicator, n_unmapped in info_chunk['unmapped'].items():
+                info['unmapped'][indicator] = info['unmapped'].get(indicator, 0) + n_unmapped
+        
+        if len(results) == 0:
+            #no rows in the file, so no chunks: the empty file is read whole, for the columns
+            df, _ = read_sav(datafile, usecols = usecols) if usecols is not None else load_sav(datafile, *read_args)
+            df.rename(columns = renames, inplace=True)
+            results.append(_process_country(df, *process_args, None, filters)[0])
+        
+        with instrument.stage(questionnaire, countryname, 'concat') as event:
+            df = pd.concat([x[0] for x in results], axis=0)
+            keys = pd.concat([x[1] for x in results], axis=0)
+            event['rows'], event['columns'] = df.shape
+        
+        if compact:
+            with instrument.stage(questionnaire, countryname, 'compact') as event:
+                df, info['bytes_saved'] = compact_dtypes(df, _get_labelled(meta, swap_indicators_country, ignorecase, labelled_columns))
+                event['bytes_saved'] = info['bytes_saved']
+                event['rows'], event['columns'] = df.shape
+                event['bytes'] = int(df.memory_usage(index=False).sum())
+        
+        result = _convert_backend([df, keys], dtype_backend, questionnaire, countryname)
+        info['events'] = instrument.collect()
+        return(result, info)
+    
+    #load selected columns
+    with instrument.stage(questionnaire, countryname, 'read') as event:
+        if usecols is not None:
+            df, meta = read_sav(datafile, usecols = usecols)
+        else:
+            df, meta = load_sav(datafile, *read_args)
+        df.rename(columns = renames, inplace=True)
+        event['rows'], event['columns'] = df.shape
+        event['bytes'] = os.path.getsize(datafile)
+    
+    labelled_columns = _get_labelled(meta, swap_indicators_country, ignorecase, labelled_columns) if compact else None
+    
+    result, info = _process_country(df, *process_args, labelled_columns)
+    result = _convert_backend(result, dtype_backend, questionnaire, countryname)
+    info['events'] = instrument.collect()
+    return(result, info)
+
+def _convert_backend(result, dtype_backend, questionnaire=None, countryname=None):
+    '''
+    Convert the [data, keys] of a country to arrow-backed columns, 
+    if dtype_backend is 'pyarrow' (see mics_library.arrow.to_arrow_dtypes)
+    '''
+    assert dtype_backend in ['numpy', 'pyarrow'], "dtype_backend must be 'numpy' or 'pyarrow'"
+    if dtype_backend == 'numpy':
+        return(result)
+    
+    with instrument.stage(questionnaire, countryname, 'arrow') as event:
+        data, keys = result
+        result = [to_arrow_dtypes(data, []), to_arrow_dtypes(keys)]
+        event['rows'], event['columns'] = data.shape
+    return(result)
+
+def _read_chunks(datafile, read_args, renames, chunksize, questionnaire=None, countryname=None):
+    '''
+    Read a file in chunks with iter_sav, renaming the columns
+    '''
+    chunks = iter_sav(datafile, *read_args, chunksize)
+    while True:
+        with instrument.stage(questionnaire, countryname, 'read') as event:
+            chunk = next(chunks, None)
+            if chunk is not None:
+                df, meta = chunk
+                df.rename(columns = renames, inplace=True)
+                event['rows'], event['columns'] = df.shape
+        if chunk is None:
+            return
+        yield(df, meta)
+
+def _get_labelled(meta, swap_indicators, ignorecase, labelled_columns=None):
+    '''
+    Columns with value labels: resolved by the harmonization plan, 
+    or from the metadata
+    '''
+    if labelled_columns is not None:
+        return(labelled_columns)
+    return(_get_labelled_columns(meta, swap_indicators, ignorecase))
+
+def _prefetch(datafiles, prefetched, stop):
+    '''
+    Read the files, so that they are in the page cache when loaded,
+    and put their names in the prefetched queue.
+    The queue is bounded: the reading waits when the queue is full.
+    An error stops the prefetching and is put in the queue, 
+    to be raised by the consumer (see _wait_prefetched).
+    '''
+    try:
+        for datafile in datafiles:
+            if stop.is_set():
+                return
+            
+            with instrument.stage(None, None, 'prefetch') as event:
+                event['datafile'] = datafile
+                event['bytes'] = 0
+                try:
+                    with open(datafile, 'rb') as f:
+                        while True:
+                            block = f.read(PREFETCH_BLOCKSIZE)
+                            if len(block) == 0:
+                                break
+                            event['bytes'] += len(block)
+                except OSError: #not found: reported by _load_country
+                    pass
+            
+            _put_prefetched(prefetched, datafile, stop)
+    except Exception as e:
+        _put_prefetched(prefetched, e, stop)
+
+def _put_prefetched(prefetched, item, stop):
+    '''
+    Put an item in the prefetched queue, unless the consumer has stopped
+    '''
+    while not stop.is_set():
+        try:
+            prefetched.put(item, timeout=0.1)
+            break
+        except Full:
+            continue
+
+def _wait_prefetched(prefetched, thread):
+    '''
+    Wait for the next file read by the prefetch thread, 
+    raising the error that stopped the thread, if any
+    '''
+    while True:
+        try:
+            item = prefetched.get(timeout=0.1)
+            break
+        except Empty:
+            #the thread may put an item just before ending: check the queue again
+            if not thread.is_alive() and prefetched.empty():
+                raise RuntimeError('the prefetch thread stopped before reading all the files')
+    if isinstance(item, Exception):
+        raise item
+    return(item)
+
+def _served_by_cache(unit, datafile):
+    '''
+    Whether the columns of a unit are all in the column cache 
+    (see mics_library.cache), so that the file is not read by _load_country.
+    The filters read the file in chunks, without the cache.
+    '''
+    return(unit['filters'] is None and unit['usecols'] is not None and _is_cached(datafile, unit['usecols']))
+
+def _get_units(micsround, indicators, recoding_dictionary={}, swap_indicators = {}, ignorecase=True, key_format='str', compact=False, countries=None, filters={}, dtype_backend='numpy', country_codes=None):
+    '''
+    Define the units of work of import_dataset: 
+    one for each country of each questionnaire
+    (country_codes: the codes of the int keys already assigned, 
+    see mics_library.utils.get_country_codes)
+    
+    Returns
+    -------
+    list
+        List of dictionaries with the arguments of _load_country
+    '''
+    from .plan import get_plan #the plan module depends on this module
+    
+    MICS_ROOTDIR = get_rootdir()
+    DATADIR = f'{MICS_ROOTDIR}/MICS{micsround}'
+    
+    #select the folders of the countries
+    folders = sorted(os.listdir(DATADIR))
+    if countries is not None:
+        folders = [x for x in folders if get_countryname(micsround, x) in countries]
+    
+    questionnaires = list(indicators.keys())
+    
+    #swap indicators, recodings and key columns of each unit
+    plan = get_plan(micsround, indicators, recoding_dictionary, swap_indicators, ignorecase, filters, countries)
+    
+    country_codes = get_country_codes(micsround, country_codes)
+    
+    #filters on the names of the loaded columns (see resolve_columns)
+    normalize = (lambda x: x.upper()) if ignorecase else (lambda x: x)
+    filters = {q: {normalize(x): v for x, v in f.items()} for q, f in filters.items()}
+    
+    units = []
+    for questionnaire in questionnaires:
+        for country in folders:
+            plan_unit = plan[(questionnaire, country)]
+            
+            #none of the indicators in the file: it is not read
+            missing = plan_unit['missing']
+            if missing is not None and len(indicators[questionnaire]) > 0 and len(missing) == len(indicators[questionnaire]):
+                instrument.notice(questionnaire, get_countryname(micsround, country), 'skipped', 
+                                  datafile = plan_unit['datafile'], missing = missing)
+                continue
+            
+            units.append({'micsround': micsround, 
+                          'questionnaire': questionnaire, 
+                          'country': country, 
+                          'indicators_questionnaire': indicators[questionnaire],
+                          'keys_columns': plan_unit['keys_columns'], 
+                          'recoding_country': plan_unit['recoding_country'], 
+                          'swap_indicators_country': plan_unit['swap_indicators_country'], 
+                          'ignorecase': ignorecase, 
+                          'key_format': key_format,
+                          'compact': compact,
+                          'filters': filters[questionnaire] if questionnaire in filters else None,
+                          'usecols': plan_unit['usecols'],
+                          'renames': plan_unit['renames'],
+                          'labelled_columns': plan_unit['labelled_columns'],
+                          'dtype_backend': dtype_backend,
+                          'country_code': country_codes[get_countryname(micsround, country)]})
+    return(units)
+
+def _run_units(units, n_jobs = None, prefetch = 0):
+    '''
+    Process the units of work (see _get_units), sequentially or in parallel
+    
+    Returns
+    -------
+    list
+        The ([data, keys], info) of each unit, in the order of the units
+    '''
+    if n_jobs is None and prefetch > 0:
+        #files read in background, at most prefetch files ahead
+        #(except those whose columns are all in the column cache)
+        datafiles = [os.path.join(get_rootdir(), f"MICS{unit['micsround']}", unit['country'], f"{unit['questionnaire']}.sav") for unit in units]
+        to_prefetch = [not _served_by_cache(unit, datafile) for unit, datafile in zip(units, datafiles)]
+        prefetched = Queue(maxsize = prefetch)
+        stop = threading.Event()
+        thread = threading.Thread(target = _prefetch, args = ([x for x, p in zip(datafiles, to_prefetch) if p], prefetched, stop), daemon = True)
+        thread.start()
+        try:
+            results = []
+            for unit, p in zip(units, to_prefetch):
+                if p:
+                    _wait_prefetched(prefetched, thread) #wait for the file of the unit
+                results.append(_load_country(**unit))
+        finally:
+            stop.set()
+            thread.join()
+    elif n_jobs is None:
+        results = [_load_country(**unit) for unit in units]
+    else:
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        
+        #workers inherit the environment, so MICS_ROOTDIR is available to them
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=instrument.defer) as executor:
+            futures = [executor.submit(_load_country, **unit) for unit in units]
+            
+            #collect in submission order, to obtain a deterministic result
+            results = []
+            for unit, future in zip(units, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    instrument.notice(unit['questionnaire'], get_countryname(unit['micsround'], unit['country']), 'failed', error = f'{type(e).__name__}: {e}')
+                    results.append((None, {}))
+                
+                #events of the workers are emitted by the main process
+                instrument.emit(results[-1][1].pop('events', []))
+    
+    return(results)
+
+def _collect_results(questionnaires, units, results, compact = False, by_round = False):
+    '''
+    Arrange the results of the units by questionnaire and country 
+    (or (round, country) if by_round), and report the values not recoded 
+    and the memory saved
+    '''
+    data_all = {}
+    for questionnaire in questionnaires:
+        data_all[questionnaire] = {}
+    
+    bytes_saved = 0
+    for unit, (result, info) in zip(units, results):
+        countryname = get_countryname(unit['micsround'], unit['country'])
+        if result is not None:
+            data_all[unit['questionnaire']][(unit['micsround'], countryname) if by_round else countryname] = result
+        
+        #values that are not in the recoding dictionary
+        if 'unmapped' in info:
+            for indicator, n_unmapped in info['unmapped'].items():
+                instrument.notice(unit['questionnaire'], countryname, 'unmapped', indicator = indicator, n_unmapped = n_unmapped)
+        
+        if 'bytes_saved' in info:
+            bytes_saved += info['bytes_saved']
+    
+    if compact:
+        instrument.notice(None, None, 'compacted', bytes_saved = bytes_saved)
+        
+    return(data_all)
+
+def import_dataset(micsround, indicators, recoding_dictionary={}, swap_indicators = {}, ignorecase=True, n_jobs=None, key_format='str', compact=False, countries=None, filters={}, prefetch=0, dtype_backend='numpy'):
     '''
     Parameters
     ----------
@@ -267,7 +891,7 @@ def import_dataset(micsround, indicators, recoding_dictionary={}, swap_indicator
             value: list of indicators
             e.g.:  {'hh': ['HH1', 'HH2'], 
                     'hl': [HL10, HL12]}
-    recoding_dictionary : dict
+    recoding_dictionary : dict or str
         { questionnaire : { country : { indicator : recoding, ...}}}
         Dictionary used to define how some indicator values should be recoded 
         (based on recoding, a dictionary) to obtain consistent information.
@@ -275,14 +899,67 @@ def import_dataset(micsround, indicators, recoding_dictionary={}, swap_indicator
         properly created csv file, using the 
         ```mics_library.utils.create_encoding_indicator(csvfile)```
         function.
+        The recodings are compiled once in lookup arrays 
+        (see mics_library.recode.compile_recoding). Values that are not in
+        the recoding of a country are left unchanged and reported.
+        If a str, the path to the folder with the recoding csv files 
+        (see mics_library.recode.create_recoding_dict).
+        If a cache directory has been set with mics_library.set_cachedir,
+        the compiled recodings, the swap indicators and the exact columns to
+        be read from each file are stored there and reused by the next
+        imports (see mics_library.plan.get_plan).
     swap_indicators : dict
         { questionnaire : { country : { new_name_indic1 : name_indic1, ...}}}
         Dictionary used to define how some indicator names of some countries
         should be changed to comply with the names used in the majority of the
         countries.
+        The names of the indicators are resolved against the columns of 
+        each file before reading it (from the catalog, if up to date): 
+        the files without any of the indicators of a questionnaire are 
+        skipped (see mics_library.plan.get_missing_indicators)
     ignorecase: boolean, optional
         Whether to consider uppercase and lowercase acronyms the same. 
         Default True
+    n_jobs : int, optional
+        Number of worker processes used to load the (questionnaire, country)
+        files in parallel. -1 uses all the available CPUs.
+        Default None = load the files sequentially
+    key_format : str, optional
+        'str' to create the keys as strings: MICSROUND_COUNTRY_HH1_HH2[_LN]
+        'int' to pack the keys in int64 values, which use less memory and are
+        faster to join. Use mics_library.utils.decode_keys with the codes from
+        mics_library.utils.get_country_codes to obtain the string version.
+        Default 'str'
+    compact : bool, optional
+        Whether to convert the data of each country to the narrowest dtypes
+        (see mics_library.utils.compact_dtypes), after the recoding. 
+        Indicators with value labels are converted to pandas.Categorical.
+        The memory saved is reported at the end of the import.
+        Default False
+    countries : list, optional
+        Names of the countries to be imported (as returned by 
+        mics_library.utils.get_countryname).
+        Default None = all available countries
+    filters : dict, optional
+        { questionnaire : { indicator : (low, high) }}
+        Select only the rows with low <= indicator <= high (None means 
+        no limit), after the recoding. Files are read in chunks and each 
+        chunk is filtered while reading. 
+        E.g. {'hl': {'HL6': (5, 17)}}
+        Default {} = all rows
+    prefetch : int, optional
+        If n_jobs is None, number of the next files read in background 
+        by a thread while the current file is processed, so that they are
+        in the page cache of the operating system when they are loaded.
+        Useful when the MICS_ROOTDIR is on a slow or network disk.
+        Default 0 = no prefetching
+    dtype_backend : str, optional
+        'numpy' or 'pyarrow'. With 'pyarrow' (requires pyarrow) the data
+        and the keys of each country are converted to arrow-backed 
+        columns (pandas.ArrowDtype): categoricals, HHID and country are 
+        dictionary-encoded. They can be passed to polars or DuckDB without 
+        copies with mics_library.arrow.to_arrow.
+        Default 'numpy'
     
     Returns
     -------
@@ -293,101 +970,538 @@ def import_dataset(micsround, indicators, recoding_dictionary={}, swap_indicator
         for each country.
     '''
     
-    MICS_ROOTDIR = get_rootdir()
-    DATADIR = f'{MICS_ROOTDIR}/MICS{micsround}'
-    countries = os.listdir(DATADIR)
+    questionnaires = list(indicators.keys())
+    
+    #DEFINE THE WORK UNITS: ALL COUNTRIES OF ALL QUESTIONNAIRES
+    units = _get_units(micsround, indicators, recoding_dictionary, swap_indicators, ignorecase, key_format, compact, countries, filters, dtype_backend)
+    
+    #PROCESS ALL UNITS
+    results = _run_units(units, n_jobs, prefetch)
+    
+    #COLLECT THE RESULTS BY QUESTIONNAIRE AND COUNTRY
+    return(_collect_results(questionnaires, units, results, compact))
+
+def iter_dataset(micsround, indicators, recoding_dictionary={}, swap_indicators = {}, ignorecase=True, key_format='str', compact=False, countries=None, filters={}, chunksize=100000):
+    '''
+    Import a MICS dataset in chunks of rows, so that memory usage is bounded
+    by the size of the chunks. Each chunk is loaded, recoded and keyed 
+    as in import_dataset.
     
+    Parameters
+    ----------
+    miscround : int
+        The round of the mics
+    indicators : dict
+        See import_dataset
+    recoding_dictionary : dict
+        See import_dataset
+    swap_indicators : dict
+        See import_dataset
+    ignorecase: boolean, optional
+        Whether to consider uppercase and lowercase acronyms the same. 
+        Default True
+    key_format : str, optional
+        'str' or 'int', see import_dataset.
+        Default 'str'
+    compact : bool, optional
+        Whether to compact the dtypes of each chunk, see import_dataset.
+        Default False
+    countries : list, optional
+        See import_dataset
+    filters : dict, optional
+        See import_dataset
+    chunksize : int, optional
+        Number of rows in each chunk. Default 100000
+    
+    Yields
+    ------
+    str : questionnaire
+        The questionnaire of the chunk
+    str : country
+        The country of the chunk
+    pandas.DataFrame : data
+        Dataframe with the value of the indicators
+    pandas.DataFrame : keys
+        Dataframe with the keys
+    '''
+    units = _get_units(micsround, indicators, recoding_dictionary, swap_indicators, ignorecase, key_format, compact, countries, filters)
+    
+    for unit in units:
+        chunks = _load_country(**unit, chunksize=chunksize)
+        if isinstance(chunks, tuple): #datafile not found
+            continue
+        
+        countryname = get_countryname(micsround, unit['country'])
+        for (df, keys), _ in chunks:
+            yield(unit['questionnaire'], countryname, df, keys)
+
+def import_rounds(micsrounds, indicators, recoding_dictionary={}, swap_indicators={}, ignorecase=True, n_jobs=None, key_format='str', compact=False, countries=None, filters={}, prefetch=0):
+    '''
+    Import the same indicators from several MICS rounds at once.
+    
+    The names of the indicators are aligned across rounds by the swap 
+    indicators of each round, the (questionnaire, country) files of all 
+    the rounds are processed together (in parallel if n_jobs), and the 
+    countries of all the rounds are stacked in one dataframe for each 
+    questionnaire. The keys include the round (see import_dataset), 
+    so they are unique across rounds, and a 'round' column is added to the
+    keys.
+    
+    Parameters
+    ----------
+    micsrounds : list of int
+        The rounds of the mics
+    indicators : dict
+        { questionnaire : list of indicators }, see import_dataset
+    recoding_dictionary : dict, optional
+        { micsround : recoding_dictionary } (see import_dataset)
+        Default {} = no recoding
+    swap_indicators : dict, optional
+        { micsround : swap_indicators } (see import_dataset), in addition to 
+        the swap indicators of the mics_library.
+        Default {}
+    ignorecase : bool, optional
+        See import_dataset
+    n_jobs : int, optional
+        Number of worker processes, shared by all the rounds. See import_dataset
+    key_format : str, optional
+        See import_dataset
+    compact : bool, optional
+        See import_dataset
+    countries : list of str, optional
+        See import_dataset
+    filters : dict, optional
+        See import_dataset
+    prefetch : int, optional
+        See import_dataset
+    
+    Returns
+    -------
+    dictionary
+        Dictionary like {'questionnaire': [data, keys]}, 
+        with the data and the keys of all the rounds and countries.
+        To merge the questionnaires use:
+            merge_questionnaires({q: {'all': v} for q, v in dataset.items()})
+    '''
     questionnaires = list(indicators.keys())
     
-    #join custom and default swap_indicators
-    swap_indicators = merge_swap_indicators(micsround, swap_indicators)
+    units = []
+    for micsround in micsrounds:
+        recoding_dictionary_round = recoding_dictionary[micsround] if micsround in recoding_dictionary else {}
+        swap_indicators_round = swap_indicators[micsround] if micsround in swap_indicators else {}
+        units += _get_units(micsround, indicators, recoding_dictionary_round, swap_indicators_round, 
+                            ignorecase, key_format, compact, countries, filters)
     
-    #PROCESS ALL QUESTIONNAIRES
-    data_all = {}
+    results = _run_units(units, n_jobs, prefetch)
+    data_all = _collect_results(questionnaires, units, results, compact, by_round = True)
+    
+    dataset = {}
     for questionnaire in questionnaires:
-        # print(questionnaire)
-        
-        #get indicators of the questionnaire to process
-        indicators_questionnaire = indicators[questionnaire]
+        frames = list(data_all[questionnaire].items())
+        for (micsround, countryname), (data, keys) in frames:
+            keys['round'] = np.repeat(micsround, keys.shape[0])
         
-        #get recoding dict for this questionnaire
-        recoding_dict_questionnaire = recoding_dictionary[questionnaire] if questionnaire in recoding_dictionary else {}
+        #columns are written in preallocated arrays, instead of concatenating the frames
+        data = _stack_frames([v[0] for k, v in frames])
+        keys = _stack_frames([v[1] for k, v in frames])
+        dataset[questionnaire] = [data, keys]
+    
+    return(dataset)
+
+def _stack_column(series, n_rows, offsets):
+    '''
+    Write the values of a column of some of the stacked frames 
+    in a preallocated array.
+    
+    Parameters
+    ----------
+    series : list
+        [(position of the frame, values of the column)]
+    n_rows : int
+        Total number of rows
+    offsets : numpy.array
+        First row of each frame
+    
+    Returns
+    -------
+    array-like
+        The column, with nans in the rows of the frames without it
+    '''
+    dtypes = [x.dtype for i, x in series]
+    complete = len(series) == len(offsets) - 1
+    
+    #categorical: codes of the union of the categories
+    if all([isinstance(d, pd.CategoricalDtype) for d in dtypes]):
+        categories = dtypes[0].categories
+        for d in dtypes[1:]:
+            categories = categories.union(d.categories)
+        codes = np.full(n_rows, -1, dtype=np.int32)
+        for i, x in series:
+            mapping = categories.get_indexer(x.cat.categories)
+            codes_frame = x.cat.codes.values
+            codes[offsets[i]:offsets[i+1]] = np.where(codes_frame >= 0, mapping[codes_frame], -1)
+        return(pd.Categorical.from_codes(codes, categories = categories))
+    
+    #nullable integers and floats: values and mask
+    if all([isinstance(d, pd.api.extensions.ExtensionDtype) and hasattr(d, 'numpy_dtype') and d.kind in 'iuf' for d in dtypes]):
+        numpy_dtype = np.result_type(*[d.numpy_dtype for d in dtypes])
+        values = np.zeros(n_rows, dtype = numpy_dtype)
+        mask = np.ones(n_rows, dtype = bool)
+        for i, x in series:
+            values[offsets[i]:offsets[i+1]] = x.to_numpy(dtype = numpy_dtype, na_value = 0)
+            mask[offsets[i]:offsets[i+1]] = x.isna().values
+        if numpy_dtype.kind == 'f':
+            return(pd.arrays.FloatingArray(values, mask))
+        return(pd.arrays.IntegerArray(values, mask))
+    
+    #numpy dtypes
+    if not any([isinstance(d, pd.api.extensions.ExtensionDtype) for d in dtypes]):
+        numpy_dtype = np.result_type(*dtypes)
+        if complete:
+            values = np.empty(n_rows, dtype = numpy_dtype)
+        else:
+            if numpy_dtype.kind in 'iub':
+                numpy_dtype = np.dtype(float)
+            values = np.full(n_rows, np.nan, dtype = numpy_dtype)
+        for i, x in series:
+            values[offsets[i]:offsets[i+1]] = x.values
+        return(values)
+    
+    #mixed dtypes: let pandas find the common dtype
+    pieces = dict(series)
+    return(pd.concat([pieces[i].reset_index(drop=True) if i in pieces else pd.Series(np.nan, index=range(offsets[i+1] - offsets[i]))
+                      for i in range(len(offsets) - 1)], axis=0).values)
+
+def _stack_frames(frames):
+    '''
+    Stack dataframes with (possibly) different columns, like 
+    pandas.concat(frames, axis=0), writing each column once in a 
+    preallocated array
+    '''
+    if len(frames) == 0:
+        return(pd.DataFrame())
+    
+    offsets = np.cumsum([0] + [df.shape[0] for df in frames])
+    n_rows = offsets[-1]
+    
+    data = {}
+    for c in _unique_columns(frames):
+        series = [(i, df[c]) for i, df in enumerate(frames) if c in df.columns]
+        data[c] = _stack_column(series, n_rows, offsets)
+    
+    index = _stack_column([(i, pd.Series(df.index)) for i, df in enumerate(frames)], n_rows, offsets)
+    index = pd.Index(index, name = frames[0].index.name)
+    
+    return(pd.DataFrame(data, index = index, columns = _unique_columns(frames)))
+
+def _concat_countries(frames):
+    '''
+    Concatenate the dataframes of different countries, 
+    keeping categorical columns as categorical 
+    (pandas.concat converts them when the categories differ)
+    '''
+    categories = {}
+    for df in frames:
+        for c in df.columns:
+            if isinstance(df[c].dtype, pd.CategoricalDtype):
+                categories[c] = df[c].cat.categories.union(categories[c]) if c in categories else df[c].cat.categories
+    
+    if len(categories) > 0:
+        #values of countries where the column is not categorical
+        for df in frames:
+            for c in categories.keys():
+                if (c in df.columns) and not isinstance(df[c].dtype, pd.CategoricalDtype):
+                    categories[c] = categories[c].union(df[c].dropna().unique().astype(categories[c].dtype))
         
-        #get swap indicators for this questionnaire
-        swap_indicators_questionnaire = swap_indicators[questionnaire] if questionnaire in swap_indicators else {}
+        frames_uniform = []
+        for df in frames:
+            df = df.copy(deep=False)
+            for c in categories.keys():
+                if c in df.columns:
+                    df[c] = pd.Categorical(df[c], categories = categories[c])
+            frames_uniform.append(df)
+        frames = frames_uniform
+    
+    return(pd.concat(frames, axis=0))
+
+def _join_frames(frames, duplicates = 'first'):
+    '''
+    Outer join of dataframes with unique indices, aligned in a single pass
+    on the union of the indices.
+    
+    Parameters
+    ----------
+    frames : list of pandas.DataFrame
+        The dataframes to join, in order of precedence
+    duplicates : str
+        How to resolve columns present in more than one dataframe:
+            'first': keep the column of the first dataframe
+            'last': keep the column of the last dataframe
+            'combine': keep the values of the first dataframe, 
+                       filling its nans with the values of the next ones
+    
+    Returns
+    -------
+    pandas.DataFrame
+        The joined dataframe
+    '''
+    assert duplicates in ['first', 'last', 'combine'], "duplicates should be 'first', 'last' or 'combine'"
+    
+    if duplicates == 'last':
+        return(_join_frames(frames[::-1], 'first')[_unique_columns(frames)])
+    
+    seen = set()
+    frames_unique = []
+    frames_duplicated = []
+    for df in frames:
+        is_duplicated = df.columns.isin(list(seen))
+        frames_unique.append(df.loc[:, ~is_duplicated])
+        if is_duplicated.any():
+            frames_duplicated.append(df.loc[:, is_duplicated])
+        seen.update(df.columns)
+    
+    joined = pd.concat(frames_unique, axis=1, join='outer', sort=False)
+    
+    if duplicates == 'combine':
+        for df in frames_duplicated:
+            df = df.reindex(joined.index)
+            for c in df.columns:
+                if isinstance(joined[c].dtype, pd.SparseDtype) or isinstance(df[c].dtype, pd.SparseDtype):
+                    #fillna does not accept sparse values: combined dense, stored sparse again
+                    combined = _to_dense(joined[c]).fillna(_to_dense(df[c]))
+                    if isinstance(joined[c].dtype, pd.SparseDtype):
+                        combined = pd.arrays.SparseArray(combined.values, fill_value = np.nan)
+                    joined[c] = combined
+                    continue
+                
+                joined[c] = joined[c].fillna(df[c])
+                
+                #restore integer dtypes (e.g. integer keys) if no nan is left
+                if (df[c].dtype.kind in 'iu') and joined[c].notna().all():
+                    joined[c] = joined[c].astype(df[c].dtype)
+    
+    return(joined)
+
+def _to_dense(series):
+    if isinstance(series.dtype, pd.SparseDtype):
+        return(series.sparse.to_dense())
+    return(series)
+
+def _unique_columns(frames):
+    '''
+    Columns of the dataframes, without repetitions, in order of appearance
+    '''
+    columns = []
+    for df in frames:
+        columns += [c for c in df.columns if c not in columns]
+    return(columns)
+
+def _sparse_frame(df, rows, positions, index):
+    '''
+    Place the rows of df at the positions of a dataframe with the given
+    index, storing only the values that are not nan (pandas.SparseDtype 
+    with nan as fill value): the memory is proportional to the observed 
+    values and the indices of the values are the missingness mask.
+    Categorical columns are kept dense (only their codes are stored).
+    
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The data of a questionnaire
+    rows : numpy.array
+        Positions of the rows of df to be placed
+    positions : numpy.array
+        Positions of these rows in the new dataframe
+    index : pandas.Index
+        Index of the new dataframe
+    '''
+    #the indices of the sparse values must be sorted
+    order = np.argsort(positions, kind='stable')
+    rows = np.asarray(rows)[order]
+    positions = np.asarray(positions)[order]
+    
+    n_rows = len(index)
+    columns = {}
+    for i, c in enumerate(df.columns):
+        values = df.iloc[rows, i]
         
-        #get additional columns needed to compute keys, and their swap dictionary
-        key_cols_questionnaire = _get_key_cols(questionnaire, micsround)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = np.full(n_rows, -1, dtype = values.cat.codes.dtype)
+            codes[positions] = values.cat.codes.values
+            columns[c] = pd.Categorical.from_codes(codes, dtype = values.dtype)
+            continue
         
-        keys_columns = []
-        for k,v in key_cols_questionnaire.items():
-            keys_columns += v
-        keys_columns = list(np.unique(keys_columns)) #additional needed columns
+        observed = values.notna().values
+        if isinstance(values.dtype, pd.api.extensions.ExtensionDtype) and hasattr(values.dtype, 'numpy_dtype'):
+            subtype = values.dtype.numpy_dtype
+        else:
+            subtype = values.dtype
+        if subtype.kind in 'iub':
+            #the missing values of integers are nan
+            subtype = np.promote_types(subtype, np.float32)
         
-        #PROCESS ALL COUNTRIES
-        data_questionnaire = {}
-        for country in countries:
-            countryname = get_countryname(micsround, country)
-            # print(countryname)
-            
-            #get datafile
-            datafile = os.path.join(MICS_ROOTDIR, f'MICS{micsround}', country, f'{questionnaire}.sav')
-            
-            if not os.path.exists(datafile): #file not found
-                print(f'>>>>>>>>>>>>>>>>>> {datafile}  NOT FOUND')
-            else:
-                #get swap_indicators of this country
-                swap_indicators_country = swap_indicators_questionnaire[countryname] if countryname in swap_indicators_questionnaire else {}
-                
-                #columns to be loaded are the selected + needed for the keys
-                cols_to_be_loaded = indicators_questionnaire + keys_columns
-                
-                #load selected columns
-                df, _ = load_sav(datafile, cols_to_be_loaded, swap_indicators_country, ignorecase)
-                
-                #recode values
-                for indicator, indicator_dict in recoding_dict_questionnaire.items():
-                    if (indicator in df.columns) and (countryname in indicator_dict):
-                        indicator_dict_country = indicator_dict[countryname]
-                        df[indicator].replace(indicator_dict_country, inplace=True)
-    
-                #compute keys                    
-                keys = _compute_keys(questionnaire, df, micsround, f'{micsround}_{countryname}')
-                
-                #add index to df
-                df.index = keys['index']
-                
-                #create dataframe with computed keys
-                keys = pd.DataFrame(keys)
-                keys.index = keys.pop('index')
-                                
-                #remove columns used to compute keys but not selected
-                col_to_remove = []
-                for c in keys_columns:
-                    if (c not in indicators_questionnaire) and (c in df.columns):
-                        col_to_remove.append(c)
-                
-                df.drop(col_to_remove, axis=1, inplace=True)
-                
-                # add country information to keys
-                keys['country'] = np.repeat(countryname, df.shape[0])
+        sp_values = values[observed].to_numpy(dtype = subtype)
+        columns[c] = _sparse_array(sp_values, positions[observed], n_rows, pd.SparseDtype(subtype, np.nan))
+    return(pd.DataFrame(columns, index = index, columns = df.columns))
+
+def _merge_partition(data_all, keys_all, drop_na_index = True, duplicates = 'first', sparse = False):
+    '''
+    Merge the (deduplicated) data and keys of multiple questionnaires.
     
-                #add dataframe to the questionnaire dict
-                data_questionnaire[countryname] = [df, keys]
-                
-            #CONTINUE WITH NEXT COUNTRY
+    The questionnaires at the individual level are joined on their index
+    (HLID) in a single pass; the data of the 'hh' questionnaire are then
+    gathered for each individual based on the HHID.
+    
+    Parameters
+    ----------
+    data_all : dict
+        {questionnaire : data}
+    keys_all : dict
+        {questionnaire : keys}
+    drop_na_index : bool
+        See merge_questionnaires
+    duplicates : str
+        See merge_questionnaires
+    sparse : bool
+        See merge_questionnaires
+    
+    Returns
+    -------
+    pandas.Dataframe
+        The dataframe containing the merged data
+    pandas.Dataframe
+        The dataframe containing the merged keys
+    '''
+    data_all = dict(data_all)
+    keys_all = dict(keys_all)
+    
+    data_hh = data_all.pop('hh', None)
+    keys_hh = keys_all.pop('hh', None)
+    questionnaires = list(data_all.keys())
+    
+    #join the individual questionnaires;
+    #the keys are combined, so that they are available for all the rows
+    keys = _join_frames([keys_all[q] for q in questionnaires], 'combine')
+    if sparse:
+        #only the observed values of each questionnaire are stored
+        frames = [_sparse_frame(data_all[q], np.arange(data_all[q].shape[0]), 
+                                keys.index.get_indexer(data_all[q].index), keys.index) for q in questionnaires]
+    else:
+        frames = [data_all[q].reindex(keys.index) for q in questionnaires]
+    
+    #if the hh questionaire is present,
+    #we gather the data of the household of each individual, based on HHID
+    if data_hh is not None:
+        if sparse:
+            rows_hh = data_hh.index.get_indexer(keys['HHID'].values)
+            is_matched = rows_hh >= 0
+            data_hh_individuals = _sparse_frame(data_hh, rows_hh[is_matched], np.where(is_matched)[0], keys.index)
+        else:
+            data_hh_individuals = data_hh.reindex(keys['HHID'].values)
+            data_hh_individuals.index = keys.index
         
-        data_all[questionnaire] = data_questionnaire
+        keys_hh_individuals = keys_hh.reindex(keys['HHID'].values)
+        keys_hh_individuals.index = keys.index
+        keys = _join_frames([keys, keys_hh_individuals], 'combine')
         
-        #CONTINUE WITH NEXT QUESTIONNAIRE
+        #same order of the columns of the chained merge:
+        #first questionnaire, hh, other questionnaires
+        frames.insert(1, data_hh_individuals)
+    
+    data = _join_frames(frames, duplicates)
+    
+    #households without any individual have a nan index
+    if (data_hh is not None) and (not drop_na_index):
+        hhids = keys['HHID']
+        if isinstance(data_hh.index.dtype, pd.ArrowDtype) and hhids.dtype != data_hh.index.dtype:
+            #e.g. dictionary-encoded HHIDs in the keys, plain strings in the index
+            hhids = hhids.astype(data_hh.index.dtype)
+        is_unmatched = ~data_hh.index.isin(hhids.values)
+    else:
+        is_unmatched = []
+    
+    if np.any(is_unmatched):
+        data_hh_unmatched = data_hh.loc[is_unmatched]
+        data_hh_unmatched.index = np.repeat(np.nan, data_hh_unmatched.shape[0])
+        if sparse:
+            rows_unmatched = np.arange(data_hh_unmatched.shape[0])
+            data_hh_unmatched = _sparse_frame(data_hh_unmatched, rows_unmatched, rows_unmatched, data_hh_unmatched.index)
+        keys_hh_unmatched = keys_hh.loc[is_unmatched]
+        keys_hh_unmatched.index = data_hh_unmatched.index
         
-    return(data_all)
+        data = pd.concat([data, data_hh_unmatched], axis=0)
+        keys = pd.concat([keys, keys_hh_unmatched], axis=0)
+    
+    keys.index=keys['HLID']
+    
+    #TODO: remove indices ending with '-1'    
+    return(data, keys)
 
-def merge_questionnaires(dataset, drop_na_index = True):
+def _merge_country(dataset, country, drop_na_index = True, duplicates = 'first', sparse = False):
+    '''
+    Deduplicate and merge the questionnaires of a single country
+    
+    Returns
+    -------
+    pandas.Dataframe or None
+        The dataframe containing the merged data of the country
+        (None if the country has only the 'hh' questionnaire
+        and drop_na_index is True)
+    pandas.Dataframe or None
+        The dataframe containing the merged keys of the country
+    '''
+    data_all = {}
+    keys_all = {}
+    for quest in dataset.keys():
+        if country in dataset[quest]:
+            data_quest, keys_quest = dataset[quest][country]
+            with instrument.stage(quest, country, 'deduplicate') as event:
+                data_quest, dupl_indices = drop_duplicated_indices(data_quest, 'mode')
+                keys_quest = drop_duplicated_indices(keys_quest, 'mode', dupl_indices)
+                event['rows'], event['columns'] = data_quest.shape
+            data_all[quest] = data_quest
+            keys_all[quest] = keys_quest
+    
+    #only households: no individual to merge them with
+    if list(data_all.keys()) == ['hh']:
+        if drop_na_index:
+            return(None, None)
+        data = data_all['hh'].copy()
+        keys = keys_all['hh'].copy()
+        data.index = np.repeat(np.nan, data.shape[0])
+        keys.index = np.repeat(np.nan, keys.shape[0])
+        return(data, keys)
+    
+    with instrument.stage(None, country, 'join') as event:
+        data, keys = _merge_partition(data_all, keys_all, drop_na_index, duplicates, sparse)
+        event['rows'], event['columns'] = data.shape
+    return(data, keys)
+
+def _finalize_merge(data, keys, dtype_backend = None, links = False):
+    '''
+    Add the link index to the merged keys and convert the dtypes
+    (see merge_questionnaires)
+    '''
+    if links:
+        with instrument.stage(None, None, 'links') as event:
+            links_index = build_links(keys)
+            for relation in links_index.columns:
+                keys[f'{relation}_row'] = links_index[relation].values
+            #position of each row, to detect later subsets of the rows
+            keys['row'] = np.arange(keys.shape[0])
+            event['rows'], event['columns'] = links_index.shape
+    
+    if dtype_backend is not None:
+        data, keys = _convert_backend([data, keys], dtype_backend)
+    return(data, keys)
+
+def merge_questionnaires(dataset, drop_na_index = True, by_country = False, n_jobs = None, duplicates = 'first', dtype_backend = None, sparse = False, links = False):
     '''
     Merge dataframe of multiple countries and multiple questionnaires 
     into a unique pandas.DataFrame. All merge operations are attempted with an
     'outer' join (see pandas.merge for more information).
+    The questionnaires are aligned on the HLID in a single pass, and the data
+    of the 'hh' questionnaire are added to each individual based on the HHID.
     
     Parameters
     ----------
@@ -396,6 +1510,45 @@ def merge_questionnaires(dataset, drop_na_index = True):
     drop_na_index : bool (default True)
         Whether to drop rows that result with a nan as index value after a
         join operation between 'hh' and another questionnaire.
+    by_country : bool (default False)
+        Whether to merge the questionnaires of each country independently
+        and concatenate the results at the end. Keys never match across
+        countries, so the result is the same, but the intermediate frames
+        are as large as a single country instead of the whole round.
+    n_jobs : int, optional
+        If by_country, number of threads used to merge the countries 
+        in parallel. Default None = merge the countries sequentially
+    duplicates : str (default 'first')
+        How to resolve indicators present in more than one questionnaire:
+            'first': keep the values of the first questionnaire
+            'last': keep the values of the last questionnaire
+            'combine': keep the values of the first questionnaire, 
+                       filling its nans with the values of the next ones
+        The order of the questionnaires is the order in the dataset, 
+        with 'hh' after the first questionnaire.
+        The keys are always combined.
+    dtype_backend : str, optional
+        'pyarrow' to convert the merged data and keys to arrow-backed 
+        columns (see import_dataset). If by_country, each country is 
+        converted before the concatenation.
+        Default None = keep the dtypes of the dataset
+    sparse : bool (default False)
+        Whether to store only the observed values of the merged data
+        (pandas.SparseDtype with nan as fill value), instead of a dense 
+        frame where most cells are nan (e.g. the 'ch' indicators of 
+        the adults). The data of each questionnaire are placed in the 
+        sparse columns directly, without the dense intermediate frames. 
+        Categorical columns are kept dense. 
+        mics_library.utils.get_rows_all_nan and remove_rows_all_nan use 
+        the indices of the sparse values, without densifying the columns.
+    links : bool (default False)
+        Whether to add to the keys the link index of the related persons:
+        the columns mother_row, father_row, caretaker_row and child_row 
+        with the position in the merged data of the row of the mother, 
+        father, caretaker and child (-1 if not available), and the column
+        row with the position of each row. mics_library.links.attach_related
+        uses them while the rows are those of the merge, otherwise the 
+        related persons are found again by their HLIDs
     
     Returns
     -------
@@ -408,103 +1561,56 @@ def merge_questionnaires(dataset, drop_na_index = True):
     # if only one questionnaire, just concat countries
     if len(dataset.keys()) == 1:
         quest = list(dataset.keys())[0]
-        data = pd.concat([v[0] for k,v in dataset[quest].items()], axis=0)
+        data = _concat_countries([v[0] for k,v in dataset[quest].items()])
         keys = pd.concat([v[1] for k,v in dataset[quest].items()], axis=0)
-        return(data, keys)
+        return(_finalize_merge(data, keys, dtype_backend, links))
     
     # if more than one questionnaire:
     
+    if by_country:
+        #countries in order of appearance in the questionnaires
+        countries = []
+        for quest in dataset.keys():
+            countries += [c for c in dataset[quest].keys() if c not in countries]
+        
+        if n_jobs is None:
+            results = [_merge_country(dataset, c, drop_na_index, duplicates, sparse) for c in countries]
+        else:
+            if n_jobs == -1:
+                n_jobs = os.cpu_count()
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                results = list(executor.map(lambda c: _merge_country(dataset, c, drop_na_index, duplicates, sparse), countries))
+        
+        results = [x for x in results if x[0] is not None]
+        if dtype_backend is not None and not links:
+            #each country is converted before the concatenation
+            results = [_convert_backend(list(x), dtype_backend) for x in results]
+        data = _concat_countries([x[0] for x in results])
+        keys = pd.concat([x[1] for x in results], axis=0)
+        return(_finalize_merge(data, keys, dtype_backend if links else None, links))
+    
     #concatenate countries, by questionnaire
     data_all = {}
     keys_all = {}
     for quest in dataset.keys():
         #merge all countries
-        data_quest = pd.concat([v[0] for k,v in dataset[quest].items()], axis=0)
-        keys_quest = pd.concat([v[1] for k,v in dataset[quest].items()], axis=0)
+        with instrument.stage(quest, None, 'concat') as event:
+            data_quest = _concat_countries([v[0] for k,v in dataset[quest].items()])
+            keys_quest = pd.concat([v[1] for k,v in dataset[quest].items()], axis=0)
+            event['rows'], event['columns'] = data_quest.shape
         
-        data_quest, dupl_indices = drop_duplicated_indices(data_quest, 'mode')
-        keys_quest = drop_duplicated_indices(keys_quest, 'mode', dupl_indices)
+        with instrument.stage(quest, None, 'deduplicate') as event:
+            data_quest, dupl_indices = drop_duplicated_indices(data_quest, 'mode')
+            keys_quest = drop_duplicated_indices(keys_quest, 'mode', dupl_indices)
+            event['rows'], event['columns'] = data_quest.shape
         data_all[quest] = data_quest
         keys_all[quest] = keys_quest
     
-    #if the hh questionaire is present,
-    #we need to perform a separate merge, based on HHID
-    if 'hh' in dataset.keys():
-        
-        #save hh quest data and keys
-        data_hh = data_all['hh']
-        keys_hh = keys_all['hh']
-        del data_all['hh']
-        del keys_all['hh']
-        
-        #get the next non-hh questionnaire
-        next_questionnaire = list(data_all.keys())[0]
-        data_next = data_all[next_questionnaire]
-        keys_next = keys_all[next_questionnaire]
-        del data_all[next_questionnaire]
-        del keys_all[next_questionnaire]
-        
-        #merge based on HHID
-        data_next['HHID'] = keys_next['HHID']
-        data = pd.merge(data_next, data_hh, left_on='HHID', right_index=True, 
-                        how='outer', suffixes=['', '_right'])
-        
-        keys = pd.merge(keys_next, keys_hh, left_on='HHID', right_index=True, 
-                        how='outer', suffixes=['', '_right'])
-        
-        data.drop(['HHID'], axis=1, inplace=True)
-        
-        if drop_na_index:
-            indices = np.where(~data.index.isna())[0]
-            data = data.iloc[indices, :]
-            keys = keys.iloc[indices, :]
-    
-    #if hh is not present, we initialize the data and keys with the
-    #data and keys of the first questionnaire
-    else:
-        next_questionnaire = list(data_all.keys())[0]
-        data = data_all[next_questionnaire]
-        keys = keys_all[next_questionnaire]
-        del data_all[next_questionnaire]
-        del keys_all[next_questionnaire]
-        
-    #merge the remaining questionnaires based on HLID
-    next_questionnaires = list(data_all.keys())
-    for quest in next_questionnaires:
-        data_next = data_all[quest]
-        keys_next = keys_all[quest]
-        
-        data = pd.merge(data, data_next, 
-                        left_index=True, right_index=True, 
-                        how='outer', suffixes = ('', '_right'))
-        
-        keys = pd.merge(keys, keys_next, 
-                        left_index=True, right_index=True, 
-                        how='outer', suffixes = ('', '_right'))
-    
-    #fix indices and columns not anymore needed
-    # data.index = data['HLID']
-    # data.drop(['HLID'], axis=1, inplace=True)
-    
-    keys.index=keys['HLID']
-    
-    #remove duplicate cols
-    cols_to_be_removed = []
-    for C in data.columns:
-        if C.endswith('_right'):
-            cols_to_be_removed.append(C)
+    with instrument.stage(None, None, 'join') as event:
+        data, keys = _merge_partition(data_all, keys_all, drop_na_index, duplicates, sparse)
+        event['rows'], event['columns'] = data.shape
     
-    data.drop(cols_to_be_removed, axis=1, inplace = True)
-    
-    cols_to_be_removed = []
-    for C in keys.columns:
-        if C.endswith('_right'):
-            cols_to_be_removed.append(C)
-    
-    keys.drop(cols_to_be_removed, axis=1, inplace = True)
-    
-    #TODO: remove indices ending with '-1'    
-    return(data, keys)
+    return(_finalize_merge(data, keys, dtype_backend, links))
 
 def merge_questionnaires_manual(df1, df2, key1, key2=None):
     '''
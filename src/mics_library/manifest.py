@@ -0,0 +1,238 @@
+import pickle
+import shutil
+from .loaders import _get_units, _run_units, _collect_results, _merge_country, _concat_countries
+from .plan import _hash, _get_source, _get_recoding_fingerprint
+from .utils import get_countryname, get_country_codes
+from .cache import _atomic_save
+from . import get_rootdir
+from . import instrument
+import pandas as pd
+import os
+
+MANIFEST_FILENAME = 'manifest.pkl'
+
+#bump when the layout of the stored datasets changes
+MANIFEST_VERSION = 2
+
+def get_manifest(storedir):
+    '''
+    Read the manifest of a dataset stored by update_dataset
+
+    Parameters
+    ----------
+    storedir : str
+        Folder of the stored dataset
+
+    Returns
+    -------
+    dict or None
+        {'version', 'micsround', 'settings': the hash of the arguments of
+         the import, 'units': { (questionnaire, country_folder) :
+         {'source': (size, mtime_ns) of the file, 'countryname', 'file'}},
+         'merged': { country_folder : {'merge_id': the hash of the
+         arguments of the merge and of the sources of the files, 'file'}},
+         'country_codes': {countryname : code} of the integer keys}
+        None if there is no dataset in storedir
+    '''
+    manifestfile = os.path.join(storedir, MANIFEST_FILENAME)
+    if not os.path.exists(manifestfile):
+        return(None)
+    with open(manifestfile, 'rb') as f:
+        manifest = pickle.load(f)
+    if manifest['version'] != MANIFEST_VERSION:
+        return(None)
+    return(manifest)
+
+def update_dataset(storedir, micsround, indicators, recoding_dictionary={}, swap_indicators={}, ignorecase=True, n_jobs=None, key_format='str', compact=False, countries=None, filters={}, merge=False, merge_kwargs={}):
+    '''
+    Import a dataset like mics_library.loaders.import_dataset, storing the
+    result of each (questionnaire, country) file in storedir together with
+    a manifest of the imported files.
+
+    The next calls with the same arguments read again only the files that
+    are new or changed since the previous call (e.g. a new release of a
+    country) and reuse the stored results of the others. Files removed from
+    the MICS_ROOTDIR are removed from the dataset. If merge, the
+    questionnaires are merged country by country and the merged countries
+    are stored too: only the countries with a new or changed file are
+    deduplicated and merged again.
+
+    A change of the indicators, the recodings, the swap indicators or
+    the other arguments of the import discards the stored dataset.
+    The country codes of the integer keys are stored in the manifest and
+    kept by the next calls: new countries get new codes, so the stored
+    keys never collide with the keys of the new files.
+
+    Parameters
+    ----------
+    storedir : str
+        Folder where the dataset is stored (created if missing)
+    micsround : int
+        The round of the mics
+    indicators : dict
+        See mics_library.loaders.import_dataset
+    recoding_dictionary : dict or str, optional
+        See mics_library.loaders.import_dataset.
+        If a path, changes to the recoding csv files are detected.
+    swap_indicators : dict, optional
+        See mics_library.loaders.import_dataset
+    ignorecase : bool, optional
+        See mics_library.loaders.import_dataset
+    n_jobs : int, optional
+        See mics_library.loaders.import_dataset
+    key_format : str, optional
+        See mics_library.loaders.import_dataset
+    compact : bool, optional
+        See mics_library.loaders.import_dataset
+    countries : list, optional
+        See mics_library.loaders.import_dataset
+    filters : dict, optional
+        See mics_library.loaders.import_dataset
+    merge : bool, optional
+        Whether to return the merged questionnaires. Default False
+    merge_kwargs : dict, optional
+        drop_na_index and duplicates of
+        mics_library.loaders.merge_questionnaires.
+        The countries are always merged independently (by_country=True)
+
+    Returns
+    -------
+    dict or tuple
+        The dataset, as returned by import_dataset, or the merged
+        (data, keys) dataframes if merge
+    '''
+    recoding_id = recoding_dictionary
+    if isinstance(recoding_dictionary, str):
+        recoding_id = (os.path.abspath(recoding_dictionary), _get_recoding_fingerprint(recoding_dictionary))
+    settings = _hash((micsround, indicators, recoding_id, swap_indicators, ignorecase,
+                      key_format, compact, filters))
+
+    manifest = get_manifest(storedir)
+    if manifest is None or manifest['settings'] != settings:
+        #nothing can be reused
+        for folder in ['units', 'merged']:
+            shutil.rmtree(os.path.join(storedir, folder), ignore_errors=True)
+        manifest = {'version': MANIFEST_VERSION, 'micsround': micsround, 'settings': settings,
+                    'units': {}, 'merged': {}, 'country_codes': {}}
+
+    #codes of the stored keys are kept, new countries get new codes
+    manifest['country_codes'] = get_country_codes(micsround, manifest['country_codes'])
+
+    units = _get_units(micsround, indicators, recoding_dictionary, swap_indicators,
+                       ignorecase, key_format, compact, countries, filters,
+                       country_codes=manifest['country_codes'])
+
+    #new and changed files
+    sources = {}
+    for unit in units:
+        datafile = os.path.join(get_rootdir(), f'MICS{micsround}', unit['country'], f"{unit['questionnaire']}.sav")
+        sources[(unit['questionnaire'], unit['country'])] = _get_source(datafile)
+    stale = [u for u in units if (u['questionnaire'], u['country']) not in manifest['units']
+             or manifest['units'][(u['questionnaire'], u['country'])]['source'] != sources[(u['questionnaire'], u['country'])]]
+
+    #files no longer in the MICS_ROOTDIR (or countries not selected)
+    removed = [u for u in manifest['units'].keys() if u not in sources]
+
+    instrument.notice(None, None, 'manifest', stale = len(stale), removed = len(removed), unchanged = len(units) - len(stale))
+
+    #files removed only after the manifest is updated
+    obsolete = [manifest['units'].pop(u)['file'] for u in removed]
+
+    #import the new and changed files
+    results = []
+    if len(stale) > 0:
+        results = _run_units(stale, n_jobs)
+        _collect_results(list(indicators.keys()), stale, results, compact)
+
+    for unit, (result, info) in zip(stale, results):
+        unit_id = (unit['questionnaire'], unit['country'])
+        if unit_id in manifest['units']:
+            obsolete.append(manifest['units'].pop(unit_id)['file'])
+
+        if result is None and sources[unit_id] is not None:
+            #failed: not recorded, so that it is imported again next time
+            continue
+
+        filename = None
+        if result is not None:
+            filename = os.path.join('units', unit['questionnaire'], f"{unit['country']}.pkl")
+            _save(storedir, filename, result)
+        manifest['units'][unit_id] = {'source': sources[unit_id],
+                                      'countryname': get_countryname(micsround, unit['country']),
+                                      'file': filename}
+
+    if not merge:
+        _save_manifest(storedir, manifest, obsolete)
+        return(_load_dataset(storedir, manifest, indicators))
+
+    #merge again the countries whose files have changed since they were merged
+    #(or merged with other arguments)
+    folders = []
+    for questionnaire in indicators.keys():
+        folders += [c for (q, c), unit in sorted(manifest['units'].items())
+                    if q == questionnaire and unit['file'] is not None and c not in folders]
+    merge_ids = {}
+    for country in folders:
+        merge_ids[country] = _hash((merge_kwargs, sorted([(q, unit['source']) for (q, c), unit in manifest['units'].items() if c == country])))
+    for country in list(manifest['merged'].keys()):
+        if country not in folders or manifest['merged'][country]['merge_id'] != merge_ids[country]:
+            obsolete.append(manifest['merged'].pop(country)['file'])
+
+    to_merge = [c for c in folders if c not in manifest['merged']]
+    if len(to_merge) > 0:
+        dataset = _load_dataset(storedir, manifest, indicators, to_merge)
+        for country in to_merge:
+            data, keys = _merge_country(dataset, get_countryname(micsround, country), **merge_kwargs)
+            filename = None
+            if data is not None:
+                filename = os.path.join('merged', f'{country}.pkl')
+                _save(storedir, filename, (data, keys))
+            manifest['merged'][country] = {'merge_id': merge_ids[country], 'file': filename}
+
+    _save_manifest(storedir, manifest, obsolete)
+
+    merged = [_load(storedir, manifest['merged'][c]['file']) for c in folders if manifest['merged'][c]['file'] is not None]
+    data = _concat_countries([x[0] for x in merged])
+    keys = pd.concat([x[1] for x in merged], axis=0)
+    return(data, keys)
+
+def _load_dataset(storedir, manifest, indicators, folders=None):
+    '''
+    Read the stored results of the units, as returned by import_dataset
+    (only of the countries in folders, if not None)
+    '''
+    dataset = {}
+    for questionnaire in indicators.keys():
+        dataset[questionnaire] = {}
+        for (q, country), unit in sorted(manifest['units'].items()):
+            if q != questionnaire or unit['file'] is None:
+                continue
+            if folders is None or country in folders:
+                dataset[questionnaire][unit['countryname']] = _load(storedir, unit['file'])
+    return(dataset)
+
+def _save(storedir, filename, obj):
+    filename = os.path.join(storedir, filename)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    _atomic_save(filename, lambda f: pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+def _load(storedir, filename):
+    with open(os.path.join(storedir, filename), 'rb') as f:
+        return(pickle.load(f))
+
+def _remove_file(storedir, filename):
+    if filename is not None and os.path.exists(os.path.join(storedir, filename)):
+        os.remove(os.path.join(storedir, filename))
+
+def _save_manifest(storedir, manifest, obsolete=[]):
+    '''
+    The manifest is written after the stored files it lists, and the files
+    it does not list anymore are removed after it
+    '''
+    os.makedirs(storedir, exist_ok=True)
+    _atomic_save(os.path.join(storedir, MANIFEST_FILENAME), lambda f: pickle.dump(manifest, f))
+
+    listed = [u['file'] for u in manifest['units'].values()] + [m['file'] for m in manifest['merged'].values()]
+    for filename in obsolete:
+        if filename not in listed:
+            _remove_file(storedir, filename)
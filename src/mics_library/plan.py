@@ -0,0 +1,284 @@
+import numpy as np
+import hashlib
+import pickle
+from .loaders import _get_key_cols, resolve_columns, _get_labelled_columns
+from .swap_indicators import merge_swap_indicators
+from .recode import create_recoding_dict, compile_recoding_dict
+from .utils import get_countryname
+from .cache import _atomic_save, _evict, read_meta, PLANS_DIRNAME
+from .catalog import get_catalogfile, get_meta
+from . import get_rootdir, get_cachedir
+import os
+
+#bump when the content of the plans changes
+PLAN_VERSION = 3
+
+def get_plan(micsround, indicators, recoding_dictionary={}, swap_indicators={}, ignorecase=True, filters={}, countries=None):
+    '''
+    Obtain the harmonization plan of an import: for each questionnaire of
+    each country, everything that does not depend on the data
+    (the key columns, the swap dictionary, the compiled recodings,
+    the exact columns to be read from the file, their final names, the
+    columns with value labels and the indicators missing in the file).
+
+    The columns of the files are taken from the catalog 
+    (see mics_library.catalog.update_catalog) when it is up to date, 
+    so that the files are not opened, otherwise from their metadata.
+
+    If a cache directory has been set with mics_library.set_cachedir, the
+    plan is stored there and reused by the next imports with the same
+    indicators (the plans count in the maximum size of the cache, and the
+    least recently used are removed with the cached columns). Units whose source file has changed are resolved again,
+    and all the recodings are compiled again if the recoding csv files
+    have changed. A change of the swap dictionaries creates a new plan.
+
+    Parameters
+    ----------
+    micsround : int
+        The round of the mics
+    indicators : dict
+        See mics_library.loaders.import_dataset
+    recoding_dictionary : dict or str
+        The recoding dictionary (see mics_library.loaders.import_dataset),
+        or the path to the folder with the recoding csv files
+        (see mics_library.recode.create_recoding_dict)
+    swap_indicators : dict
+        See mics_library.loaders.import_dataset
+    ignorecase : bool
+        Whether to ignore cases of characters of acronyms
+    filters : dict
+        See mics_library.loaders.import_dataset.
+        Only the names of the indicators are used.
+    countries : list of str, optional
+        Names of the countries to be planned (the files of the other
+        countries are not opened). Default None = all the countries
+
+    Returns
+    -------
+    dict
+        { (questionnaire, country_folder) : plan of the unit }
+    '''
+    #join custom and default swap_indicators
+    swap_indicators = merge_swap_indicators(micsround, swap_indicators)
+
+    columns = _get_columns(micsround, indicators, filters)
+
+    if get_cachedir() is None:
+        recoding_dictionary, _ = _get_recoding(recoding_dictionary)
+        return(_build_units(micsround, columns, recoding_dictionary, swap_indicators, ignorecase, countries))
+
+    #the plan is identified by everything that is not checked on the files
+    recoding_id = os.path.abspath(recoding_dictionary) if isinstance(recoding_dictionary, str) else recoding_dictionary
+    countries_id = None if countries is None else sorted(countries)
+    plan_id = _hash((PLAN_VERSION, micsround, columns, recoding_id, swap_indicators, ignorecase, countries_id))
+    planfile = os.path.join(get_cachedir(), PLANS_DIRNAME, f'{plan_id}.pkl')
+
+    plan = None
+    if os.path.exists(planfile):
+        with open(planfile, 'rb') as f:
+            plan = pickle.load(f)
+
+    changed = False
+    recoding = None
+    if plan is None or plan['recoding_fingerprint'] != _get_recoding_fingerprint(recoding_dictionary):
+        #compile all the recodings again
+        recoding, recoding_fingerprint = _get_recoding(recoding_dictionary)
+        units = {} if plan is None else plan['units']
+        plan = {'recoding_fingerprint': recoding_fingerprint, 'units': units}
+        for (questionnaire, country), unit in units.items():
+            unit['recoding_country'] = _compile_unit_recoding(recoding, micsround, questionnaire, country)
+        changed = True
+
+    #resolve the new and changed files
+    current = _build_units(micsround, columns, None, swap_indicators, ignorecase, countries, resolve=False)
+    stale = [u for u in current.keys() if (u not in plan['units']) or (plan['units'][u]['source'] != current[u]['source'])]
+    if len(stale) > 0:
+        if recoding is None:
+            recoding, _ = _get_recoding(recoding_dictionary)
+        for questionnaire, country in stale:
+            unit = current[(questionnaire, country)]
+            unit['recoding_country'] = _compile_unit_recoding(recoding, micsround, questionnaire, country)
+            _resolve_unit(unit, micsround, questionnaire, country, columns[questionnaire], ignorecase)
+            plan['units'][(questionnaire, country)] = unit
+        changed = True
+
+    #remove the files that are not anymore in the MICS_ROOTDIR
+    for u in [u for u in plan['units'].keys() if u not in current]:
+        plan['units'].pop(u)
+        changed = True
+
+    if changed:
+        os.makedirs(os.path.dirname(planfile), exist_ok=True)
+        _atomic_save(planfile, lambda f: pickle.dump(plan, f))
+        _evict(keep = planfile)
+    else:
+        #mark as recently used
+        os.utime(planfile)
+
+    return(plan['units'])
+
+def _hash(obj):
+    return(hashlib.sha1(pickle.dumps(obj)).hexdigest())
+
+def _get_columns(micsround, indicators, filters):
+    '''
+    Names of the columns to be read for each questionnaire:
+    the indicators, then the columns needed for the keys and the filters
+    '''
+    columns = {}
+    for questionnaire, indicators_questionnaire in indicators.items():
+        key_cols_questionnaire = _get_key_cols(questionnaire, micsround)
+
+        keys_columns = []
+        for k,v in key_cols_questionnaire.items():
+            keys_columns += v
+        keys_columns = list(np.unique(keys_columns))
+
+        filters_columns = list(filters[questionnaire].keys()) if questionnaire in filters else []
+
+        columns[questionnaire] = {'indicators': list(indicators_questionnaire),
+                                  'keys_columns': keys_columns,
+                                  'filters_columns': filters_columns}
+    return(columns)
+
+def _get_recoding_fingerprint(recoding_dictionary):
+    '''
+    Size and modification time of the recoding csv files
+    '''
+    if not isinstance(recoding_dictionary, str):
+        return(None)
+
+    fingerprint = {}
+    for dirpath, dirnames, filenames in os.walk(recoding_dictionary):
+        for filename in filenames:
+            stat = os.stat(os.path.join(dirpath, filename))
+            fingerprint[os.path.relpath(os.path.join(dirpath, filename), recoding_dictionary)] = (stat.st_size, stat.st_mtime_ns)
+    return(fingerprint)
+
+def _get_recoding(recoding_dictionary):
+    '''
+    Recoding dictionary (read from the csv files if a path)
+    and its fingerprint
+    '''
+    fingerprint = _get_recoding_fingerprint(recoding_dictionary)
+    if isinstance(recoding_dictionary, str):
+        recoding_dictionary = create_recoding_dict(recoding_dictionary)
+    return(recoding_dictionary, fingerprint)
+
+def _compile_unit_recoding(recoding_dictionary, micsround, questionnaire, country):
+    recoding_dict_questionnaire = recoding_dictionary[questionnaire] if questionnaire in recoding_dictionary else {}
+    return(compile_recoding_dict(recoding_dict_questionnaire, get_countryname(micsround, country)))
+
+def _get_source(datafile):
+    if not os.path.exists(datafile):
+        return(None)
+    stat = os.stat(datafile)
+    return((stat.st_size, stat.st_mtime_ns))
+
+def _build_units(micsround, columns, recoding_dictionary, swap_indicators, ignorecase, countries=None, resolve=True):
+    '''
+    Plan of all the units (of the selected countries, if not None).
+    If resolve, the metadata of each file are read to find the columns 
+    to be read (see _resolve_unit)
+    '''
+    MICS_ROOTDIR = get_rootdir()
+    DATADIR = os.path.join(MICS_ROOTDIR, f'MICS{micsround}')
+
+    folders = sorted(os.listdir(DATADIR))
+    if countries is not None:
+        folders = [x for x in folders if get_countryname(micsround, x) in countries]
+
+    units = {}
+    for questionnaire, columns_questionnaire in columns.items():
+        swap_indicators_questionnaire = swap_indicators[questionnaire] if questionnaire in swap_indicators else {}
+
+        for country in folders:
+            countryname = get_countryname(micsround, country)
+            datafile = os.path.join(DATADIR, country, f'{questionnaire}.sav')
+
+            unit = {'datafile': datafile,
+                    'source': _get_source(datafile),
+                    'keys_columns': columns_questionnaire['keys_columns'],
+                    'swap_indicators_country': swap_indicators_questionnaire[countryname] if countryname in swap_indicators_questionnaire else {},
+                    'usecols': None,
+                    'renames': None,
+                    'labelled_columns': None,
+                    'missing': None}
+
+            if recoding_dictionary is not None:
+                unit['recoding_country'] = _compile_unit_recoding(recoding_dictionary, micsround, questionnaire, country)
+
+            if resolve:
+                _resolve_unit(unit, micsround, questionnaire, country, columns_questionnaire, ignorecase)
+
+            units[(questionnaire, country)] = unit
+    return(units)
+
+def _read_unit_meta(unit, micsround, questionnaire, country):
+    '''
+    Metadata of the file of a unit: from the catalog if it exists and
+    the file has not changed since it was catalogued, otherwise
+    from the file (or the column cache)
+    '''
+    if os.path.exists(get_catalogfile()):
+        meta = get_meta(micsround, country, questionnaire)
+        if meta is not None and meta.source == unit['source']:
+            return(meta)
+    return(read_meta(unit['datafile']))
+
+def _resolve_unit(unit, micsround, questionnaire, country, columns_questionnaire, ignorecase):
+    '''
+    Find the names of the columns of the file to be read (instead of all
+    the possible names, with the swap indicators and in upper and lower case),
+    their names after the loading, the columns with value labels and
+    the indicators that are not in the file
+    '''
+    if unit['source'] is None:
+        return
+
+    meta = _read_unit_meta(unit, micsround, questionnaire, country)
+
+    cols_to_be_loaded = columns_questionnaire['indicators'] + columns_questionnaire['keys_columns']
+    cols_to_be_loaded += [c for c in columns_questionnaire['filters_columns'] if c not in cols_to_be_loaded]
+
+    swap_indicators_country = unit['swap_indicators_country']
+    usecols, renames, missing = resolve_columns(meta.column_names, cols_to_be_loaded, swap_indicators_country, ignorecase)
+
+    unit['usecols'] = usecols
+    unit['renames'] = renames
+    unit['labelled_columns'] = _get_labelled_columns(meta, swap_indicators_country, ignorecase)
+    unit['missing'] = [x for x in columns_questionnaire['indicators'] if x in missing]
+
+def get_missing_indicators(micsround, indicators, swap_indicators={}, ignorecase=True):
+    '''
+    Report the indicators that are not in the file of each country,
+    after the swap indicators and the case of the acronyms are resolved.
+    Only the metadata are used (from the catalog, if up to date).
+
+    Parameters
+    ----------
+    micsround : int
+        The round of the mics
+    indicators : dict
+        See mics_library.loaders.import_dataset
+    swap_indicators : dict, optional
+        See mics_library.loaders.import_dataset
+    ignorecase : bool, optional
+        Whether to ignore cases of characters of acronyms. Default True
+
+    Returns
+    -------
+    dict
+        { questionnaire : { country : list of missing indicators }},
+        only for the countries with missing indicators.
+        Files lacking all the indicators are skipped by import_dataset.
+    '''
+    plan = get_plan(micsround, indicators, {}, swap_indicators, ignorecase)
+
+    missing = {}
+    for questionnaire in indicators.keys():
+        missing[questionnaire] = {}
+    for (questionnaire, country), unit in plan.items():
+        if unit['missing'] is not None and len(unit['missing']) > 0:
+            missing[questionnaire][get_countryname(micsround, country)] = unit['missing']
+    return(missing)
@@ -4,10 +4,11 @@ import os
 from .utils import get_countryname
 from .loaders import get_dict
 from .swap_indicators import merge_swap_indicators
+from .catalog import update_catalog, get_metas
 from . import get_rootdir
 import numpy as np
 
-def screen(micsround, countries=None, questionnaires=None, ignorecase=True):
+def screen(micsround, countries=None, questionnaires=None, ignorecase=True, use_catalog=False):
     '''
     Get a quick summary of the data available in a MICS's round.
     
@@ -21,7 +22,8 @@ def screen(micsround, countries=None, questionnaires=None, ignorecase=True):
     miscround : int
         the round of the mics
     countries: list, optional
-        List of countries to consider (not implemented yet).
+        Names of the countries to consider (as returned by 
+        mics_library.utils.get_countryname).
         Default None = all available countries
     questionnaires: list, optional
         Which questionnaires to consider
@@ -30,6 +32,12 @@ def screen(micsround, countries=None, questionnaires=None, ignorecase=True):
     ignorecase: boolean, optional
         Whether to consider uppercase and lowercase acronyms the same. 
         Default True
+    use_catalog: boolean, optional
+        Whether to obtain the metadata from the catalog stored in the 
+        MICS_ROOTDIR (see mics_library.catalog), instead of opening each file.
+        The catalog is created, or refreshed for new and changed files, 
+        before being used.
+        Default False
     
     Returns
     -------
@@ -40,11 +48,16 @@ def screen(micsround, countries=None, questionnaires=None, ignorecase=True):
     MICS_ROOTDIR = get_rootdir()
     DATADIR = f'{MICS_ROOTDIR}/MICS{micsround}'
     
-    assert countries is None, "Country selection not implemented yet"
-    countries = os.listdir(DATADIR)
+    folders = os.listdir(DATADIR)
+    if countries is not None:
+        folders = [x for x in folders if get_countryname(micsround, x) in countries]
+    countries = folders
     
     if questionnaires is None:
         questionnaires = ['hh', 'hl', 'ch', 'wm', 'mn', 'bh']
+    
+    if use_catalog:
+        update_catalog(micsround, questionnaires)
         
     questionnaire_dict = {}
     
@@ -53,13 +66,21 @@ def screen(micsround, countries=None, questionnaires=None, ignorecase=True):
         #this dict will contain the info for each indicator in any country
         indicators_dict = {}
         
+        #metadata of the questionnaire, for all countries
+        metas = get_metas(micsround, questionnaire) if use_catalog else None
+        
         #open the questionnaire for all countries
         for country in countries:
             countryname = get_countryname(micsround, country)
             
-            if f'{questionnaire}.sav' in os.listdir(f'{DATADIR}/{country}'):
+            if use_catalog:
+                meta = metas[country] if country in metas else None
+            elif f'{questionnaire}.sav' in os.listdir(f'{DATADIR}/{country}'):
                 _, meta = pyreadstat.read_sav(f'{DATADIR}/{country}/{questionnaire}.sav', metadataonly=True)
+            else:
+                meta = None
                 
+            if meta is not None:
                 #get the dictionary of label and values of all indicators in the questionnaire
                 dict_quest = get_dict(meta)
                 
@@ -107,7 +128,43 @@ def screen(micsround, countries=None, questionnaires=None, ignorecase=True):
 
     return(questionnaire_dict)
     
-def check_values(micsround, indicators, swap_indicators = {}, countries=None, ignorecase=True):
+def _count_values(datafile, columns, chunksize=100000):
+    '''
+    Count the occurrences of each value of the selected columns of a .sav 
+    file, reading the data in a single pass, chunk by chunk
+    
+    Parameters
+    ----------
+    datafile : str
+        Path to the .sav datafile
+    columns : list of str
+        Columns for which the values are counted
+    chunksize : int
+        Number of rows read at once
+    
+    Returns
+    -------
+    dict
+        {column : pandas.Series with the count of each (non-nan) value}
+    '''
+    counts = {}
+    for c in columns:
+        counts[c] = pd.Series(dtype=int)
+    
+    if len(columns) == 0:
+        return(counts)
+        
+    reader = pyreadstat.read_file_in_chunks(pyreadstat.read_sav, datafile, 
+                                            chunksize=chunksize, usecols=columns)
+    for df_chunk, _ in reader:
+        for c in columns:
+            counts[c] = counts[c].add(df_chunk[c].value_counts(), fill_value=0)
+    
+    for c in columns:
+        counts[c] = counts[c].astype(int).sort_index().rename_axis(None)
+    return(counts)
+
+def check_values(micsround, indicators, swap_indicators = {}, countries=None, ignorecase=True, use_catalog=False, counts=False):
     '''
     Check the label and values of target indicators for each country
     
@@ -128,11 +185,22 @@ def check_values(micsround, indicators, swap_indicators = {}, countries=None, ig
         should be changed to comply with the names used in the majority of the
         countries.
     countries: list, optional
-        List of countries to consider (not implemented yet).
+        Names of the countries to consider (as returned by 
+        mics_library.utils.get_countryname).
         Default None = all available countries
     ignorecase: boolean, optional
         Whether to consider uppercase and lowercase acronyms the same. 
         Default True
+    use_catalog: boolean, optional
+        Whether to obtain the metadata from the catalog stored in the 
+        MICS_ROOTDIR (see mics_library.catalog), instead of opening each file.
+        Default False
+    counts: boolean, optional
+        Whether to also count the occurrences of each value of the indicators
+        in each country. This requires reading the data of the indicators.
+        Default False
+    
+    Only the metadata of the files are read, unless counts=True.
     
     Returns
     -------
@@ -140,24 +208,38 @@ def check_values(micsround, indicators, swap_indicators = {}, countries=None, ig
         Dictionary like {'questionnaire': {'indicator_name': dataframe, ...}
         where dataframe is a pandas' dataframe with the description and 
         values of the indicators for each country.
+    dictionary
+        Only if counts=True.
+        Dictionary like {'questionnaire': {'indicator_name': dataframe, ...}
+        where dataframe is a pandas' dataframe with the number of occurrences
+        of each value of the indicators for each country.
     '''
     MICS_ROOTDIR = get_rootdir()
     DATADIR = os.path.join(MICS_ROOTDIR, f'MICS{micsround}')
     
-    assert countries is None, "Country selection not implemented yet"
-    countries = os.listdir(DATADIR)
+    folders = os.listdir(DATADIR)
+    if countries is not None:
+        folders = [x for x in folders if get_countryname(micsround, x) in countries]
+    countries = folders
     
     questionnaires = list(indicators.keys())
     
     swap_indicators = merge_swap_indicators(micsround, swap_indicators)
     
+    if use_catalog:
+        update_catalog(micsround, questionnaires)
+    
     questionnaire_dict = {}
+    counts_dict = {}
     
     for questionnaire in questionnaires:
         
         #get indicators of the questionnaire to process
         indicators_questionnaire = indicators[questionnaire]
         
+        #metadata of the questionnaire, for all countries
+        metas = get_metas(micsround, questionnaire) if use_catalog else None
+        
         #get swap indicators for this questionnaire
         swap_indicators_questionnaire = swap_indicators[questionnaire] if questionnaire in swap_indicators else {}  
 
@@ -188,12 +270,31 @@ def check_values(micsround, indicators, swap_indicators = {}, countries=None, ig
                 else:
                     indicators_to_be_used.append(ind_target)
             
-            if f'{questionnaire}.sav' in os.listdir(os.path.join(DATADIR, country)):
+            if use_catalog:
+                meta = metas[country] if country in metas else None
+            elif f'{questionnaire}.sav' in os.listdir(os.path.join(DATADIR, country)):
+                #read only the metadata, the data of the indicators are not needed
                 _, meta = pyreadstat.read_sav(os.path.join(DATADIR, country, f'{questionnaire}.sav'), 
-                                              usecols = indicators_to_be_used)
+                                              metadataonly=True)
+            else:
+                meta = None
+            
+            if meta is not None:
+                #get the dictionary of label and values of the used indicators
+                #(the metadata include all the indicators of the file)
+                dict_quest = {}
+                for ind_used, info in get_dict(meta).items():
+                    if ind_used in indicators_to_be_used:
+                        if ignorecase:
+                            ind_used = ind_used.upper()
+                        dict_quest[ind_used] = info
                 
-                #get the dictionary of label and values of all indicators in the questionnaire
-                dict_quest = get_dict(meta, ignorecase)
+                if counts:
+                    columns_used = [c for c in meta.column_names if c in indicators_to_be_used]
+                    counts_country = _count_values(os.path.join(DATADIR, country, f'{questionnaire}.sav'), 
+                                                   columns_used)
+                    if ignorecase:
+                        counts_country = dict([(k.upper(), v) for (k,v) in counts_country.items()])
                 
                 #create a reverse swap dictionary to obtain the original target indicators
                 swap_indicators_country_reverse = dict([(v,k) for (k,v) in swap_indicators_country.items()])
@@ -213,9 +314,13 @@ def check_values(micsround, indicators, swap_indicators = {}, countries=None, ig
                         indicators_info[ind_target] = {countryname: {'info': dict_quest[ind_used], 'used_indicator': ind_used}} 
                     else:
                         indicators_info[ind_target][countryname] = {'info': dict_quest[ind_used], 'used_indicator': ind_used}
+                    
+                    if counts:
+                        indicators_info[ind_target][countryname]['counts'] = counts_country[ind_used]
         
         #process indicator_info and create a dataframe
         dataframe_dict = {}
+        dataframe_counts_dict = {}
         
         for indicator in indicators_info.keys():
             
@@ -243,7 +348,17 @@ def check_values(micsround, indicators, swap_indicators = {}, countries=None, ig
             else:
                 df_indicator = labels
             dataframe_dict[indicator] = df_indicator
+            
+            if counts:
+                counts_indicator = {}
+                for country in data_indicator.keys():
+                    counts_indicator[country] = data_indicator[country]['counts']
+                dataframe_counts_dict[indicator] = pd.DataFrame(counts_indicator).transpose()
         
         questionnaire_dict[questionnaire] = dataframe_dict
-
-    return(questionnaire_dict)
\ No newline at end of file
+        counts_dict[questionnaire] = dataframe_counts_dict
+    
+    if counts:
+        return(questionnaire_dict, counts_dict)
+    else:
+        return(questionnaire_dict)
\ No newline at end of file
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import os
 
@@ -114,18 +115,109 @@ def _create_encoding_indicator(csvfile):
     
     data_csv.drop(['label', 'used_indicator'], axis = 1, inplace=True)
     
-    encoding_dictionary_indicator = {}
-    for country in data_csv.index:
-        data_country = data_csv.loc[[country],:]
-#        data_country.dropna(axis=1, inplace=True)
-        
-        dict_country = {}
-        for x in data_country.columns:
-            try:
-                dict_country[float(x)] = data_country.loc[:,x].values[0]
-            except:
-                dict_country[x] = data_country.loc[:,x].values[0]
-                 
-        encoding_dictionary_indicator[country] = dict_country
-    
-    return({acronym: encoding_dictionary_indicator})
\ No newline at end of file
+    #the first row of each country is used
+    data_csv = data_csv.loc[~data_csv.index.duplicated()]
+    
+    #old values, as float if possible
+    old_values = []
+    for x in data_csv.columns:
+        try:
+            old_values.append(float(x))
+        except:
+            old_values.append(x)
+    
+    #new values, one column at a time
+    encoding_dictionary_indicator = {country: {} for country in data_csv.index}
+    for old_value, x in zip(old_values, data_csv.columns):
+        new_values = data_csv[x].values
+        for country, new_value in zip(data_csv.index, new_values):
+            encoding_dictionary_indicator[country][old_value] = new_value
+    
+    return({acronym: encoding_dictionary_indicator})
+
+def compile_recoding(recoding):
+    '''
+    Compile the recoding of an indicator in a country into lookup arrays,
+    so that it can be applied as a vectorized gather (see apply_recoding).
+    
+    Parameters
+    ----------
+    recoding : dict
+        { old_value1 : new_value1, ...}, as created by create_recoding_dict
+    
+    Returns
+    -------
+    tuple or dict
+        (old_values, new_values) numpy arrays, with old_values sorted.
+        If the old or the new values are not all numeric, or a nan 
+        is recoded, the recoding dict is returned unchanged.
+    '''
+    try:
+        old_values = np.array(list(recoding.keys()), dtype=float)
+        new_values = np.array(list(recoding.values()), dtype=float)
+    except (TypeError, ValueError): #not numeric
+        return(recoding)
+    
+    if (len(old_values) == 0) or np.any(np.isnan(old_values)):
+        return(recoding)
+    
+    order = np.argsort(old_values)
+    return((old_values[order], new_values[order]))
+
+def apply_recoding(series, compiled):
+    '''
+    Recode the values of an indicator. 
+    Values not in the recoding are left unchanged, and counted.
+    
+    Parameters
+    ----------
+    series : pandas.Series
+        The values of the indicator
+    compiled : tuple or dict
+        The recoding, as returned by compile_recoding
+    
+    Returns
+    -------
+    pandas.Series
+        The recoded values
+    int
+        Number of (non nan) values not in the recoding
+    '''
+    if isinstance(compiled, dict) or (series.dtype.kind not in 'fiu'):
+        recoding = compiled if isinstance(compiled, dict) else dict(zip(*compiled))
+        unmapped = ~series.isin(list(recoding.keys())) & series.notna()
+        return(series.replace(recoding), int(unmapped.sum()))
+    
+    old_values, new_values = compiled
+    values = series.to_numpy(dtype=float, na_value=np.nan)
+    
+    #position of each value in the sorted old values
+    positions = np.searchsorted(old_values, values)
+    positions[positions == len(old_values)] = 0
+    mapped = old_values[positions] == values
+    
+    recoded = np.where(mapped, new_values[positions], values)
+    unmapped = ~mapped & ~np.isnan(values)
+    return(pd.Series(recoded, index = series.index, name = series.name), int(unmapped.sum()))
+
+def compile_recoding_dict(recoding_dict_questionnaire, country):
+    '''
+    Compile the recodings of the indicators of a questionnaire for a country
+    
+    Parameters
+    ----------
+    recoding_dict_questionnaire : dict
+        { indicator : { country : { old_value : new_value, ...}}}
+    country : str
+        Name of the country
+    
+    Returns
+    -------
+    dict
+        { indicator : compiled recoding } (see compile_recoding)
+    '''
+    compiled = {}
+    for indicator, indicator_dict in recoding_dict_questionnaire.items():
+        if country in indicator_dict:
+            compiled[indicator] = compile_recoding(indicator_dict[country])
+    return(compiled)
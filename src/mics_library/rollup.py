@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from . import instrument
+import os
+
+#reductions supported by rollup
+AGGREGATIONS = ['size', 'count', 'sum', 'mean', 'min', 'max', 'any']
+
+def rollup(data, keys=None, by='HHID', aggs=None, n_jobs=None):
+    '''
+    Aggregate the records of the members (e.g. of the hl, wm or ch
+    questionnaires) at the household level, or at the level of any other
+    key. The groups are identified by integer codes (factorized once for
+    each country) and the reductions are vectorized over all the groups,
+    instead of a python function for each group.
+
+    E.g. number of members, highest education and number of under-fives:
+        dataset = import_dataset(5, {'hh': ['HH48'], 'hl': ['HL6', 'ED4A']})
+        hl_hh = rollup(dataset['hl'], aggs={'members': (None, 'size'),
+                                            'max_education': ('ED4A', 'max'),
+                                            'under5': (lambda d: d['HL6'] < 5, 'sum')})
+        for country, (data, keys) in dataset['hh'].items():
+            data = data.join(hl_hh[country])
+
+    Parameters
+    ----------
+    data : pandas.DataFrame or dict
+        The data of a questionnaire, or the dictionary of the countries of
+        a questionnaire, as returned by import_dataset
+        (e.g. dataset['hl'] = {'country': [data, keys], ...})
+    keys : pandas.DataFrame, optional
+        The keys of the data (same rows). Not needed if data is a dictionary
+    by : str, optional
+        Column of the keys (or of the data) identifying the groups.
+        Default 'HHID'
+    aggs : dict, optional
+        Dictionary like {'name': (column, reduction), ...}, where column is
+        a column of the data, a function returning the values from the data
+        (e.g. lambda d: d['HL6'] < 5), or None for 'size', and reduction is
+        one of:
+            'size': number of rows
+            'count': number of non-nan values
+            'sum', 'mean', 'min', 'max': of the non-nan values
+                (nan if the group has none, 0 for 'sum')
+            'any': whether the group has a non-zero value
+        Default None = {'members': (None, 'size')}
+    n_jobs : int, optional
+        Number of threads used to process the countries in parallel
+        (-1 = number of CPUs). If data is a dataframe, it is split by the
+        country column of the keys.
+        Default None = all the rows together, without splitting
+
+    Returns
+    -------
+    pandas.DataFrame or dict
+        Dataframe indexed by the values of by (e.g. the HHIDs, as the
+        index of the hh data), with a column for each aggregation, or a
+        dictionary of dataframes by country if data is a dictionary
+    '''
+    if aggs is None:
+        aggs = {'members': (None, 'size')}
+    for name, (column, reduction) in aggs.items():
+        assert reduction in AGGREGATIONS, f'{name}: reduction must be one of {AGGREGATIONS}'
+        assert column is not None or reduction == 'size', f'{name}: a column is required for {reduction}'
+
+    if isinstance(data, dict):
+        partitions = {country: tuple(v) for country, v in data.items()}
+    elif keys is None:
+        raise ValueError('keys is required if data is a dataframe')
+    elif n_jobs is not None and 'country' in keys.columns:
+        #keys never match across countries: each country is a partition
+        positions = keys.reset_index(drop=True).groupby('country', sort=False).indices
+        partitions = {country: (data.iloc[rows], keys.iloc[rows]) for country, rows in positions.items()}
+    else:
+        partitions = {None: (data, keys)}
+
+    countries = list(partitions.keys())
+    run = lambda c: _rollup_partition(partitions[c][0], partitions[c][1], by, aggs, c)
+    if n_jobs is None:
+        results = [run(c) for c in countries]
+    else:
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            results = list(executor.map(run, countries))
+
+    if isinstance(data, dict):
+        return(dict(zip(countries, results)))
+    if len(results) == 1:
+        return(results[0])
+    return(pd.concat(results, axis=0))
+
+def _get_values(data, column):
+    '''
+    Values of a column (or of a function of the data) as float64, nan if missing
+    '''
+    values = column(data) if callable(column) else data[column]
+    values = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(values.cat.categories.dtype)
+    return(values.to_numpy(dtype=np.float64, na_value=np.nan))
+
+def _reduce(ufunc, codes, values, n_groups):
+    '''
+    ufunc of the non-nan values of each group, with codes sorted
+    (nan for the groups without values)
+    '''
+    valid = ~np.isnan(values)
+    codes, values = codes[valid], values[valid]
+    result = np.full(n_groups, np.nan)
+    if codes.shape[0] == 0:
+        return(result)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    result[codes[starts]] = ufunc.reduceat(values, starts)
+    return(result)
+
+def _rollup_partition(data, keys, by, aggs, country=None):
+    '''
+    Aggregations of a partition (a country, or all the rows)
+    '''
+    with instrument.stage(None, country, 'rollup') as event:
+        group_ids = keys[by] if keys is not None and by in keys.columns else data[by]
+        assert data.shape[0] == group_ids.shape[0], 'data and keys must have the same rows'
+        codes, groups = pd.factorize(group_ids)
+        n_groups = len(groups)
+
+        #rows without group (nan) are dropped, the others sorted by group once
+        order = np.flatnonzero(codes >= 0)
+        order = order[np.argsort(codes[order], kind='stable')]
+        codes = codes[order]
+
+        result = {}
+        for name, (column, reduction) in aggs.items():
+            if reduction == 'size':
+                result[name] = np.bincount(codes, minlength=n_groups)
+                continue
+
+            values = _get_values(data, column)[order]
+            valid = ~np.isnan(values)
+            if reduction == 'count':
+                result[name] = np.bincount(codes[valid], minlength=n_groups)
+            elif reduction == 'sum':
+                result[name] = np.bincount(codes[valid], weights=values[valid], minlength=n_groups)
+            elif reduction == 'mean':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result[name] = np.bincount(codes[valid], weights=values[valid], minlength=n_groups) / np.bincount(codes[valid], minlength=n_groups)
+            elif reduction == 'min':
+                result[name] = _reduce(np.minimum, codes, values, n_groups)
+            elif reduction == 'max':
+                result[name] = _reduce(np.maximum, codes, values, n_groups)
+            elif reduction == 'any':
+                result[name] = np.bincount(codes[valid & (values != 0)], minlength=n_groups) > 0
+
+        index = pd.Index(groups, name = by)
+        result = pd.DataFrame(result, index = index, columns = list(aggs.keys()))
+        
+        #the uniques of dictionary-encoded keys may include values without rows
+        sizes = np.bincount(codes, minlength=n_groups)
+        if (sizes == 0).any():
+            result = result[sizes > 0]
+        event['rows'], event['columns'] = result.shape
+    return(result)
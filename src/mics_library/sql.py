@@ -0,0 +1,143 @@
+import pandas as pd
+import sqlite3
+from .arrow import to_arrow
+from .loaders import _concat_countries
+
+#DuckDB is optional: SQLite is used if it is not installed
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+#columns used to join the questionnaires, indexed in SQLite
+KEY_COLUMNS = ['HHID', 'HLID', 'mother_HLID', 'father_HLID', 'caretaker_HLID', 'child_HLID', 'country']
+
+def connect(dataset, engine='auto', database=':memory:'):
+    '''
+    Create a local SQL database with a table for each questionnaire of a
+    dataset, with the columns of the keys and of the data of all the
+    countries, to filter, aggregate and join the questionnaires with SQL
+    instead of merging them first.
+
+    With DuckDB the tables are registered as arrow tables (if pyarrow is
+    installed, see mics_library.arrow.to_arrow) and the queries are 
+    vectorized and multi-threaded. Numeric and arrow-backed columns share
+    their buffers with the arrow tables; object columns (e.g. strings and 
+    the str keys) are converted, so they are copied, as are the columns 
+    whose types differ across the countries. The string columns read from
+    a store (mics_library.store.open_dataset) are already copies, being 
+    converted back to objects. With SQLite all the data are copied in the
+    database and the key columns are indexed.
+
+    E.g. the education of the mother of each child, by country:
+        con = connect(dataset)
+        query(con, """SELECT ch.country, hl.ED4A, COUNT(*) AS n
+                      FROM ch JOIN hl ON ch.caretaker_HLID = hl.HLID
+                      GROUP BY ch.country, hl.ED4A""")
+
+    Parameters
+    ----------
+    dataset : dict or tuple
+        The result of mics_library.loaders.import_dataset (or
+        mics_library.store.open_dataset), of
+        mics_library.loaders.import_rounds, or the (data, keys) of
+        mics_library.loaders.merge_questionnaires (table 'merged')
+    engine : str, optional
+        'duckdb', 'sqlite' or 'auto'.
+        Default 'auto' = DuckDB if installed, otherwise SQLite
+    database : str, optional
+        Path of the database file. Default ':memory:'
+
+    Returns
+    -------
+    duckdb.DuckDBPyConnection or sqlite3.Connection
+        The connection, to be used with query
+    '''
+    if engine == 'auto':
+        engine = 'sqlite' if duckdb is None else 'duckdb'
+    assert engine in ['duckdb', 'sqlite'], "engine must be 'duckdb', 'sqlite' or 'auto'"
+    if engine == 'duckdb' and duckdb is None:
+        raise ImportError('duckdb is required for the duckdb engine: pip install mics_library[sql]')
+
+    tables = _get_tables(dataset)
+
+    if engine == 'duckdb':
+        con = duckdb.connect(database)
+        for name, partitions in tables.items():
+            con.register(name, _get_arrow_table(partitions))
+        return(con)
+
+    con = sqlite3.connect(database)
+    for name, partitions in tables.items():
+        frame = _concat_countries([_get_frame(data, keys) for data, keys in partitions])
+        frame.to_sql(name, con, if_exists='replace', index=False)
+        for c in KEY_COLUMNS:
+            if c in frame.columns:
+                con.execute(f'CREATE INDEX "{name}_{c}" ON "{name}" ("{c}")')
+    con.commit()
+    return(con)
+
+def query(con, sql, params=None):
+    '''
+    Run a query on a database created with connect
+
+    Parameters
+    ----------
+    con : duckdb.DuckDBPyConnection or sqlite3.Connection
+        The connection returned by connect
+    sql : str
+        The query
+    params : list, optional
+        Values of the parameters of the query (? in the query)
+
+    Returns
+    -------
+    pandas.DataFrame
+        The result of the query
+    '''
+    if duckdb is not None and isinstance(con, duckdb.DuckDBPyConnection):
+        return(con.execute(sql, params).df())
+    return(pd.read_sql_query(sql, con, params=params))
+
+def _get_tables(dataset):
+    '''
+    { table name : list of (data, keys) }
+    '''
+    if isinstance(dataset, tuple):
+        #merged questionnaires
+        return({'merged': [dataset]})
+
+    tables = {}
+    for questionnaire, dataset_questionnaire in dataset.items():
+        if isinstance(dataset_questionnaire, dict):
+            #by country
+            tables[questionnaire] = [tuple(v) for v in dataset_questionnaire.values()]
+        else:
+            tables[questionnaire] = [tuple(dataset_questionnaire)]
+    return(tables)
+
+def _get_arrow_table(partitions):
+    '''
+    Arrow table of the countries of a questionnaire (the keys identify
+    the rows, so the index is not included)
+    '''
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return(_concat_countries([_get_frame(data, keys) for data, keys in partitions]))
+
+    tables = []
+    for data, keys in partitions:
+        table = to_arrow(data, keys)
+        tables.append(table.drop_columns(['index']) if 'index' in table.column_names else table)
+    #countries with different columns or dtypes
+    return(pa.concat_tables(tables, promote_options='permissive'))
+
+def _get_frame(data, keys):
+    '''
+    The keys and the data of a questionnaire in one dataframe
+    '''
+    keys = keys.reset_index(drop=True)
+    data = data.reset_index(drop=True)
+    data = data[[c for c in data.columns if c not in keys.columns]]
+    return(pd.concat([keys, data], axis=1))
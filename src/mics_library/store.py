@@ -0,0 +1,280 @@
+import numpy as np
+import pandas as pd
+import pickle
+import shutil
+from .cache import _atomic_save
+from .arrow import pa
+from .utils import _sparse_array
+import os
+
+#bump when the layout of the stores changes
+STORE_VERSION = 1
+
+#name of the questionnaire of merged datasets (see merge_questionnaires)
+MERGED = 'merged'
+
+def export_dataset(dataset, storedir, micsround=None):
+    '''
+    Write a dataset in a folder, partitioned by round, questionnaire and
+    country, with one .npy file for each column of the data and of the keys.
+    The dataset can be opened (also by other processes) with open_dataset,
+    which maps the files in memory instead of reading them.
+    Partitions already in the store are replaced.
+
+    Parameters
+    ----------
+    dataset : dict or tuple
+        The result of mics_library.loaders.import_dataset
+        (micsround is required), of mics_library.loaders.import_rounds,
+        or the (data, keys) of mics_library.loaders.merge_questionnaires,
+        which is stored as the questionnaire 'merged' (with the rows
+        grouped by country)
+    storedir : str
+        Folder of the store (created if missing)
+    micsround : int, optional
+        The round of the dataset. Not needed if the keys have
+        a 'round' column (see import_rounds)
+
+    Returns
+    -------
+    int
+        Number of partitions written
+    '''
+    partitions = _get_partitions(dataset, micsround)
+
+    for (micsround_partition, questionnaire, country), (data, keys) in partitions.items():
+        folder = os.path.join(storedir, str(micsround_partition), questionnaire, country)
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder)
+
+        meta = {'version': STORE_VERSION,
+                'data': _write_frame(data, os.path.join(folder, 'data')),
+                'keys': _write_frame(keys, os.path.join(folder, 'keys'))}
+
+        #the meta is written last: it marks the partition as complete
+        _atomic_save(os.path.join(folder, 'meta.pkl'), lambda f: pickle.dump(meta, f))
+
+    return(len(partitions))
+
+def open_dataset(storedir, micsround=None, questionnaires=None, countries=None, columns=None, keys=True):
+    '''
+    Open a dataset written by export_dataset.
+    The columns are mapped in memory (copy-on-write): only the pages
+    that are used are read from the disk, and they are shared by all the
+    processes that open the same store.
+
+    Parameters
+    ----------
+    storedir : str
+        Folder of the store
+    micsround : int, optional
+        The round to be opened.
+        Default None = the only round in the store
+    questionnaires : list of str, optional
+        Questionnaires to be opened (use 'merged' for a merged dataset).
+        Default None = all
+    countries : list of str, optional
+        Countries to be opened. Default None = all
+    columns : list of str, optional
+        Columns of the data to be opened. Default None = all
+    keys : bool, optional
+        Whether to open the keys. Default True
+
+    Returns
+    -------
+    dictionary
+        Dictionary like {'questionnaire': {'country': [data, keys], ...}},
+        as returned by import_dataset (keys is None if not keys).
+        A merged dataset is returned as {'merged': {'country': [data, keys]}};
+        use merge_questionnaires to concatenate the countries.
+    '''
+    if micsround is None:
+        rounds = list_partitions(storedir)['round'].unique()
+        assert len(rounds) == 1, f'The store has more than one round: {list(rounds)}, select one with micsround'
+        micsround = rounds[0]
+
+    DATADIR = os.path.join(storedir, str(micsround))
+
+    dataset = {}
+    for questionnaire in sorted(os.listdir(DATADIR)):
+        if questionnaires is not None and questionnaire not in questionnaires:
+            continue
+        dataset[questionnaire] = {}
+        for country in sorted(os.listdir(os.path.join(DATADIR, questionnaire))):
+            if countries is not None and country not in countries:
+                continue
+            folder = os.path.join(DATADIR, questionnaire, country)
+            if not os.path.exists(os.path.join(folder, 'meta.pkl')): #incomplete partition
+                continue
+            with open(os.path.join(folder, 'meta.pkl'), 'rb') as f:
+                meta = pickle.load(f)
+
+            data = _read_frame(meta['data'], os.path.join(folder, 'data'), columns)
+            keys_country = _read_frame(meta['keys'], os.path.join(folder, 'keys')) if keys else None
+            dataset[questionnaire][country] = [data, keys_country]
+    return(dataset)
+
+def list_partitions(storedir):
+    '''
+    List the partitions of a store
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row for each (round, questionnaire, country), with the number
+        of rows and the columns of the data
+    '''
+    partitions = []
+    for micsround in sorted(os.listdir(storedir)):
+        for questionnaire in sorted(os.listdir(os.path.join(storedir, micsround))):
+            for country in sorted(os.listdir(os.path.join(storedir, micsround, questionnaire))):
+                metafile = os.path.join(storedir, micsround, questionnaire, country, 'meta.pkl')
+                if not os.path.exists(metafile):
+                    continue
+                with open(metafile, 'rb') as f:
+                    meta = pickle.load(f)
+                partitions.append({'round': int(micsround), 'questionnaire': questionnaire, 'country': country,
+                                   'rows': meta['data']['rows'], 'columns': list(meta['data']['columns'].keys())})
+    return(pd.DataFrame(partitions, columns = ['round', 'questionnaire', 'country', 'rows', 'columns']))
+
+def _get_partitions(dataset, micsround):
+    '''
+    Split a dataset in { (round, questionnaire, country) : (data, keys) }
+    '''
+    if isinstance(dataset, tuple):
+        #merged questionnaires
+        dataset = {MERGED: list(dataset)}
+
+    partitions = {}
+    for questionnaire, dataset_questionnaire in dataset.items():
+        if isinstance(dataset_questionnaire, dict):
+            #import_dataset: already by country
+            assert micsround is not None, 'micsround is required to export the result of import_dataset'
+            for country, (data, keys) in dataset_questionnaire.items():
+                partitions[(micsround, questionnaire, country)] = (data, keys)
+            continue
+
+        #all the countries (and rounds) in one dataframe
+        data, keys = dataset_questionnaire
+        by = ['round', 'country'] if 'round' in keys.columns else ['country']
+        positions = keys.reset_index(drop=True).groupby(by, sort=False).indices
+        for group, rows in positions.items():
+            micsround_group, country = group if len(by) == 2 else (micsround, group)
+            assert micsround_group is not None, 'micsround is required if the keys have no round column'
+            partitions[(int(micsround_group), questionnaire, country)] = (data.iloc[rows], keys.iloc[rows])
+    return(partitions)
+
+def _write_frame(df, folder):
+    '''
+    Write each column (and the index) of a dataframe in a .npy file
+
+    Returns
+    -------
+    dict
+        How to read the columns again (see _read_frame)
+    '''
+    os.makedirs(folder)
+
+    meta = {'rows': df.shape[0], 'index_name': df.index.name, 'columns': {}}
+    for i, c in enumerate(list(df.columns) + [None]):
+        values = df.index if c is None else df.iloc[:, i]
+        filename = os.path.join(folder, 'index' if c is None else f'col_{i}')
+        column = _write_column(values, filename)
+        if c is None:
+            meta['index'] = column
+        else:
+            meta['columns'][c] = column
+    return(meta)
+
+def _write_column(values, filename):
+    '''
+    Write the values of a column in .npy files, in a format that can be
+    mapped in memory: categoricals as codes, nullable and arrow dtypes as
+    values and mask, sparse dtypes as the positions and the values stored,
+    strings as fixed width unicode
+    '''
+    dtype = values.dtype
+    column = {'file': os.path.basename(filename), 'dtype': dtype}
+
+    def save(suffix, array):
+        _atomic_save(f'{filename}{suffix}.npy', lambda f: np.save(f, array, allow_pickle=True))
+
+    if isinstance(dtype, pd.CategoricalDtype):
+        column['kind'] = 'categorical'
+        save('', np.asarray(values.codes if isinstance(values, pd.CategoricalIndex) else values.cat.codes))
+    elif isinstance(dtype, pd.SparseDtype):
+        #the fill value is in the dtype
+        column['kind'] = 'sparse'
+        column['length'] = len(values)
+        array = values.array
+        save('', array.sp_values)
+        save('_positions', array.sp_index.to_int_index().indices)
+    elif isinstance(dtype, pd.ArrowDtype):
+        #nulls are stored in the mask (and as 0 or '' in the values)
+        column['kind'] = 'arrow'
+        mask = np.asarray(pd.isna(values))
+        if pa.types.is_dictionary(dtype.pyarrow_dtype) or pa.types.is_string(dtype.pyarrow_dtype):
+            save('', np.where(mask, '', np.asarray(values, dtype=object)).astype(str))
+        else:
+            save('', values.to_numpy(dtype=dtype.numpy_dtype, na_value=0))
+        save('_mask', mask)
+    elif isinstance(dtype, pd.api.extensions.ExtensionDtype) and hasattr(dtype, 'numpy_dtype'):
+        column['kind'] = 'masked'
+        array = values.array
+        save('', array._data)
+        save('_mask', array._mask)
+    elif dtype == object and pd.api.types.infer_dtype(values, skipna=False) == 'string':
+        column['kind'] = 'string'
+        save('', np.asarray(values, dtype=str))
+    else:
+        #numpy dtypes (other objects are pickled and cannot be mapped)
+        column['kind'] = 'numpy'
+        save('', np.asarray(values))
+    return(column)
+
+def _load(filename):
+    try:
+        #a plain array, still backed by the mapped file
+        return(np.load(filename, mmap_mode='c').view(np.ndarray))
+    except ValueError: #pickled objects
+        return(np.load(filename, allow_pickle=True))
+
+def _read_column(column, folder):
+    filename = os.path.join(folder, column['file'])
+    values = _load(f'{filename}.npy')
+
+    if column['kind'] == 'categorical':
+        return(pd.Categorical.from_codes(values, dtype = column['dtype']))
+    if column['kind'] == 'masked':
+        return(column['dtype'].construct_array_type()(values, _load(f'{filename}_mask.npy')))
+    if column['kind'] == 'sparse':
+        return(_sparse_array(values, _load(f'{filename}_positions.npy'), column['length'], column['dtype']))
+    if column['kind'] == 'arrow':
+        pyarrow_dtype = column['dtype'].pyarrow_dtype
+        is_dictionary = pa.types.is_dictionary(pyarrow_dtype)
+        array = pa.array(values, mask = _load(f'{filename}_mask.npy'),
+                         type = pyarrow_dtype.value_type if is_dictionary else pyarrow_dtype)
+        if is_dictionary:
+            array = array.dictionary_encode().cast(pyarrow_dtype)
+        return(pd.arrays.ArrowExtensionArray(array))
+    if column['kind'] == 'string':
+        #strings are converted back to objects
+        return(values.astype(object))
+    return(values)
+
+def _read_frame(meta, folder, columns=None):
+    '''
+    Open the columns of a dataframe written by _write_frame
+    '''
+    if columns is None:
+        columns = list(meta['columns'].keys())
+    else:
+        columns = [c for c in meta['columns'].keys() if c in columns]
+
+    data = {}
+    for c in columns:
+        data[c] = _read_column(meta['columns'][c], folder)
+    index = pd.Index(_read_column(meta['index'], folder), name = meta['index_name'])
+
+    #no copy of the mapped arrays
+    return(pd.DataFrame(data, index = index, columns = columns, copy = False))
@@ -5,7 +5,13 @@ from . import get_rootdir
 import os
 from .country2ISO import country2ISO
 
-def indicators2key(df_key, prefix=''):
+#bit layout of the integer keys (from the least significant bit):
+#line number (8 bits), HH2 (13 bits), HH1 (20 bits), country (9 bits), round (3 bits)
+#53 bits in total, so that keys are exactly represented also as float64
+#(e.g. after an outer join introduces nans)
+_KEY_FIELDS = [('LN', 8), ('HH2', 13), ('HH1', 20), ('country', 9), ('round', 3)]
+
+def indicators2key(df_key, prefix='', key_format='str', micsround=0, country_code=0):
     '''
     Concatenate the values in df_key to create a key
     
@@ -15,15 +21,28 @@ def indicators2key(df_key, prefix=''):
         dataframe where each column is a component of a key
     prefix : str
         prefix to be used at the beginning of the key (typically the countryname)
+    key_format : str, optional
+        'str' to create keys as strings: PREFIX_HH1_HH2[_LN]
+        'int' to pack round, country, HH1, HH2 (and line number)
+        in a single int64 (see decode_keys to obtain the string version).
+        Default 'str'
+    micsround : int, optional
+        The round of the mics, used only if key_format = 'int'
+    country_code : int, optional
+        The code of the country (see get_country_codes), 
+        used only if key_format = 'int'
     
     Returns
     -------
-    list
-        List of the created keys
+    list or numpy.array
+        List of the created keys (numpy.array of int64 if key_format = 'int')
     '''
     #we cannot substitute -1 with na as some will be used as indexes!
     df_key.fillna(-1, inplace=True)
     
+    if key_format == 'int':
+        return(_pack_key(df_key.values.astype(np.int64), micsround, country_code))
+    
     df_key = df_key.values.astype(int).astype(str)
     if prefix == '':
         key = ['_'.join(x) for x in df_key]
@@ -32,6 +51,118 @@ def indicators2key(df_key, prefix=''):
         
     return(key)
 
+def _pack_key(values, micsround, country_code):
+    '''
+    Pack the components of the keys (columns of values: HH1, HH2 and 
+    optionally the line number) in int64 keys
+    '''
+    n_components = values.shape[1]
+    assert n_components in [2, 3], "only keys with 2 or 3 components can be packed"
+    
+    #shift the components so that -1 (missing) is stored as 0;
+    #for the line number, 0 means that the key has only 2 components
+    components = {'HH1': values[:, 0] + 1,
+                  'HH2': values[:, 1] + 1,
+                  'LN': values[:, 2] + 2 if n_components == 3 else np.zeros(values.shape[0], dtype=np.int64),
+                  'country': np.full(values.shape[0], country_code, dtype=np.int64),
+                  'round': np.full(values.shape[0], micsround, dtype=np.int64)}
+    
+    key = np.zeros(values.shape[0], dtype=np.int64)
+    shift = 0
+    for name, bits in _KEY_FIELDS:
+        component = components[name]
+        if (component < 0).any() or (component >= 2**bits).any():
+            raise ValueError(f"{name} values out of the range of integer keys, use key_format='str'")
+        key |= component << shift
+        shift += bits
+    return(key)
+
+def decode_keys(keys, country_codes):
+    '''
+    Convert integer keys (see indicators2key) to the string format:
+    MICSROUND_COUNTRY_HH1_HH2[_LN]
+    
+    Parameters
+    ----------
+    keys : array-like of int
+        The integer keys. nan values are returned as nan.
+    country_codes : dict
+        {countryname : code}, as returned by get_country_codes
+    
+    Returns
+    -------
+    list
+        List of the keys as strings
+    '''
+    codes2country = dict([(v, k) for (k, v) in country_codes.items()])
+    
+    keys = pd.Series(keys)
+    is_na = keys.isna().values
+    keys = keys.fillna(0).values.astype(np.int64)
+    
+    components = {}
+    shift = 0
+    for name, bits in _KEY_FIELDS:
+        components[name] = (keys >> shift) & (2**bits - 1)
+        shift += bits
+    
+    key_str = []
+    for i in range(len(keys)):
+        if is_na[i]:
+            key_str.append(np.nan)
+            continue
+        key = f"{components['round'][i]}_{codes2country[components['country'][i]]}_{components['HH1'][i] - 1}_{components['HH2'][i] - 1}"
+        if components['LN'][i] > 0:
+            key = f"{key}_{components['LN'][i] - 2}"
+        key_str.append(key)
+    return(key_str)
+
+def get_country_codes(micsround, country_codes=None):
+    '''
+    Assign an integer code to each country of a MICS's round,
+    to be used in the integer keys. The code of a country is its position
+    in the country2ISO dictionary of the mics_library (starting from 1),
+    so it does not depend on the other countries in the round folder.
+    Countries not in country2ISO get the next free codes, in alphabetical
+    order: these codes change if other unknown countries are added, so 
+    the table should be stored with the integer keys and passed again 
+    as country_codes (as done by mics_library.manifest.update_dataset).
+    
+    Parameters
+    ----------
+    micsround : int
+        Round of the MICS
+    country_codes : dict, optional
+        {countryname : code} assigned previously: these codes are kept,
+        and only the new countries get a code. Default None
+    
+    Returns
+    -------
+    dict
+        {countryname : code}
+    '''
+    MICS_ROOTDIR = get_rootdir()
+    countries = os.listdir(os.path.join(MICS_ROOTDIR, f'MICS{micsround}'))
+    countrynames = sorted(set([get_countryname(micsround, x) for x in countries]))
+    
+    #fixed codes: the positions in country2ISO (new names must be appended)
+    fixed_codes = dict([(k, code + 1) for code, k in enumerate(country2ISO.keys())])
+    
+    country_codes = {} if country_codes is None else dict(country_codes)
+    next_code = max([len(fixed_codes)] + list(country_codes.values())) + 1
+    for countryname in countrynames:
+        if countryname in country_codes:
+            continue
+        if countryname in fixed_codes:
+            country_codes[countryname] = fixed_codes[countryname]
+        else:
+            country_codes[countryname] = next_code
+            next_code += 1
+    
+    if next_code > 2**dict(_KEY_FIELDS)['country']:
+        raise ValueError("too many countries for the integer keys, use key_format='str'")
+    return(country_codes)
+
 def sample_by_column(df, column, N=1, seed=1234):
     '''
     Sample N rows for each unique value in a column.
@@ -89,6 +220,80 @@ def recode_nans(df, column, nans = []):
     df[column].replace(recode_dict, inplace=True)
     return(df)
 
+def compact_dtypes(df, categorical_columns=[]):
+    '''
+    Convert the numerical columns of a dataframe to the narrowest dtype
+    that represents their values without loss:
+        - columns with integer values: nullable Int8, Int16 or Int32 
+          (pandas.Categorical if the column is in categorical_columns)
+        - other columns: float32, if no precision is lost
+    Categorical columns are not ordered: use numeric columns for 
+    comparisons and arithmetic.
+    
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Dataframe to process
+    categorical_columns : list of str or dict
+        Columns to be converted to pandas.Categorical, 
+        typically those with value labels in the .sav file.
+        If a dictionary { column : labelled values }, a column is converted
+        only if all its values are labelled: numerical indicators with 
+        labels only for some special codes (e.g. the ages, with 'DK' and 
+        'Missing') stay numeric
+    
+    Returns
+    -------
+    pandas.DataFrame
+        Processed dataframe
+    int
+        Memory saved, in bytes
+    '''
+    memory_before = df.memory_usage(deep=True).sum()
+    
+    for c in df.columns:
+        column = df[c]
+        
+        #only numpy numerical dtypes are compacted
+        if not (isinstance(column.dtype, np.dtype) and column.dtype.kind in 'fiu'):
+            continue
+        
+        values = column.values
+        if column.dtype.kind == 'f':
+            observed = values[~np.isnan(values)]
+        else:
+            observed = values
+        
+        if np.all(np.mod(observed, 1) == 0): #integer values
+            low = observed.min() if len(observed) > 0 else 0
+            high = observed.max() if len(observed) > 0 else 0
+            
+            if c in categorical_columns and _all_labelled(observed, categorical_columns, c):
+                df[c] = pd.Categorical(column.astype('Int64'))
+            else:
+                for dtype in ['Int8', 'Int16', 'Int32']:
+                    info = np.iinfo(dtype.lower())
+                    if (low >= info.min) and (high <= info.max):
+                        df[c] = column.astype(dtype)
+                        break
+                    
+        elif column.dtype == np.float64:
+            if np.array_equal(observed.astype(np.float32).astype(np.float64), observed):
+                df[c] = column.astype(np.float32)
+    
+    bytes_saved = memory_before - df.memory_usage(deep=True).sum()
+    return(df, bytes_saved)
+
+def _all_labelled(observed, categorical_columns, column):
+    '''
+    Whether all the observed values of a column have a value label
+    (always True if categorical_columns is a list)
+    '''
+    if not isinstance(categorical_columns, dict):
+        return(True)
+    labelled = [x for x in categorical_columns[column] if isinstance(x, (int, float, np.number))]
+    return(bool(np.isin(observed, np.asarray(labelled, dtype = float)).all()))
+
 def get_rows_all_nan(df):
     '''
     Obtain the (numerical) indices of rows in the df that contain all nans
@@ -103,9 +308,45 @@ def get_rows_all_nan(df):
     numpy.array :
         (Numerical) indices of rows with all nans
     '''
-    sum_nans = (df.isna()==True).sum(axis=1)
-    idx_all_nan = np.where(sum_nans == df.shape[1])[0]
+    idx_all_nan = np.where(_count_observed(df) == 0)[0]
     return(idx_all_nan)
+
+def _sparse_array(sp_values, positions, n_rows, dtype):
+    '''
+    pandas.arrays.SparseArray of n_rows with sp_values at the (sorted)
+    positions and the fill value of dtype (a pandas.SparseDtype) elsewhere
+    '''
+    try:
+        #private module of pandas: the array is built without a dense copy
+        from pandas.core.arrays.sparse import IntIndex
+    except ImportError:
+        dense = np.full(n_rows, dtype.fill_value, dtype = dtype.subtype)
+        dense[positions] = sp_values
+        return(pd.arrays.SparseArray(dense, dtype = dtype))
+    sp_index = IntIndex(n_rows, np.asarray(positions, dtype = np.int32))
+    return(pd.arrays.SparseArray(sp_values, sparse_index = sp_index, dtype = dtype))
+
+def _count_observed(df):
+    '''
+    Number of values that are not nan in each row.
+    Sparse columns (see merge_questionnaires) are counted on the indices 
+    of their values, without converting them to dense arrays
+    '''
+    counts = np.zeros(df.shape[0], dtype=np.int64)
+    for i in range(df.shape[1]):
+        column = df.iloc[:, i]
+        if isinstance(column.dtype, pd.SparseDtype):
+            array = column.array
+            indices = array.sp_index.indices
+            is_nan = pd.isna(array.sp_values)
+            if pd.isna(array.fill_value):
+                counts += np.bincount(indices[~is_nan], minlength=df.shape[0])
+            else:
+                counts += 1
+                counts -= np.bincount(indices[is_nan], minlength=df.shape[0])
+        else:
+            counts += column.notna().values
+    return(counts)
     
 def remove_rows_all_nan(df, return_indexes = False):
     '''
@@ -167,27 +408,104 @@ def get_countryname(micsround, country, get_ISO = False):
     else:
         return(countryname)
 
+def _groupby_mode(dataframe):
+    '''
+    Obtain the most frequent value of each column, for each unique index.
+    Equivalent to dataframe.groupby(dataframe.index).agg(mode), 
+    but vectorized: values are sorted and counted as integer codes.
+    nans are ignored, unless all the values of the group are nan.
+    If there are more values with the same count, the one that occurs first
+    is selected.
+    
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame
+        Dataframe to process
+    
+    Returns
+    -------
+    pandas.DataFrame
+        Dataframe with one row for each unique index, sorted by index.
+        The dtypes of the columns are preserved.
+    '''
+    groups, index_unique = pd.factorize(dataframe.index, sort=True)
+    
+    columns_mode = []
+    for j in range(dataframe.shape[1]):
+        #integer codes of the values, -1 for nans
+        values, values_unique = pd.factorize(dataframe.iloc[:, j])
+        
+        #code of each (group, value) pair
+        pairs = groups.astype(np.int64) * (len(values_unique) + 1) + (values + 1)
+        pairs_unique, first_position, counts = np.unique(pairs, return_index=True, return_counts=True)
+        
+        #nans are selected only if no other value is present in the group
+        counts[pairs_unique % (len(values_unique) + 1) == 0] = 0
+        
+        #for each group select the pair with highest count, then first position
+        groups_pairs = pairs_unique // (len(values_unique) + 1)
+        order = np.lexsort((first_position, -counts, groups_pairs))
+        _, idx_selected = np.unique(groups_pairs[order], return_index=True)
+        position_mode = first_position[order][idx_selected]
+        
+        columns_mode.append(dataframe.iloc[position_mode, [j]].reset_index(drop=True))
+    
+    if len(columns_mode) > 0:
+        dataframe_mode = pd.concat(columns_mode, axis=1)
+    else:
+        dataframe_mode = pd.DataFrame(index=np.arange(len(index_unique)))
+    dataframe_mode.index = pd.Index(index_unique, name=dataframe.index.name)
+    return(dataframe_mode)
+
 def drop_duplicated_indices(dataframe, how='first', dupl_indices=None):
+    '''
+    Merge the rows of dataframe that have the same index
     
-    def _mymode(x):
-        if x.isna().sum() == len(x):
-            return(np.nan)
-        else:
-            return(x.value_counts().index[0])
-            
+    Parameters
+    ----------
+    dataframe : pandas.DataFrame
+        Dataframe to process
+    how : str
+        How to obtain the values of the merged row:
+            'mean': mean of the values (categoricals with numeric 
+                    categories, see compact_dtypes, are converted back 
+                    to numbers)
+            'mode': most frequent value (see _groupby_mode)
+            'first': values of the first row
+            'last': values of the last row
+    dupl_indices : pandas.Index, optional
+        The duplicated indices to merge. 
+        Default None = detect them (and return them)
+    
+    Returns
+    -------
+    pandas.DataFrame
+        Processed dataframe
+    pandas.Index
+        The duplicated indices (only if dupl_indices is None)
+    '''
     return_indices = False
     
     if dupl_indices is None:
         return_indices = True
         dupl_indices = dataframe.index[np.where(dataframe.index.duplicated())[0]]
-        
-    dataframe_dupl = dataframe.loc[dupl_indices]
+    
+    if how == 'mean':
+        #the mean of the codes of labelled values is a number, not a category
+        numeric_categoricals = {}
+        for c, dtype in dataframe.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype) and pd.api.types.is_numeric_dtype(dtype.categories.dtype):
+                numeric_categoricals[c] = dtype.categories.dtype
+        dataframe = dataframe.astype(numeric_categoricals)
+    
+    #each duplicated index is selected once
+    dataframe_dupl = dataframe.loc[dupl_indices.unique()]
     dataframe_nodupl = dataframe.drop(dupl_indices, axis=0)
     
     if how == 'mean':
         dataframe_dupl = dataframe_dupl.groupby(dataframe_dupl.index).mean()
     elif how == 'mode':
-        dataframe_dupl = dataframe_dupl.groupby(dataframe_dupl.index).agg(lambda x: _mymode(x))
+        dataframe_dupl = _groupby_mode(dataframe_dupl)
     elif how == 'first':
         dataframe_dupl = dataframe_dupl[~dataframe_dupl.index.duplicated(keep='first')]
     elif how == 'last':
@@ -9,4 +9,7 @@ setup(name='mics_library',
           'numpy',
           'pandas',
           'pyreadstat'],
+      extras_require={
+          'arrow': ['pyarrow'],
+          'sql': ['duckdb', 'pyarrow']},
       zip_safe=False)
\ No newline at end of file
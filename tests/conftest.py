@@ -0,0 +1,36 @@
+'''
+Fixtures of the tests: a small synthetic MICS_ROOTDIR
+(see benchmarks/synthetic.py), created once for the session
+'''
+import os
+import sys
+import pytest
+
+REPODIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPODIR, 'src'))
+sys.path.insert(0, os.path.join(REPODIR, 'benchmarks'))
+
+@pytest.fixture(scope='session')
+def synthetic_rootdir(tmp_path_factory):
+    from synthetic import generate
+    rootdir = tmp_path_factory.mktemp('mics')
+    generate(str(rootdir), rounds=[3, 4, 5], n_countries=3, n_households=60, n_indicators=3)
+    return(str(rootdir))
+
+@pytest.fixture
+def rootdir(synthetic_rootdir, monkeypatch):
+    '''
+    MICS_ROOTDIR set to the synthetic data, without cache directory
+    '''
+    monkeypatch.setenv('MICS_ROOTDIR', synthetic_rootdir)
+    monkeypatch.delenv('MICS_CACHEDIR', raising=False)
+    monkeypatch.delenv('MICS_CACHE_MAXSIZE', raising=False)
+    return(synthetic_rootdir)
+
+@pytest.fixture
+def cachedir(rootdir, tmp_path, monkeypatch):
+    '''
+    Empty cache directory (see mics_library.set_cachedir)
+    '''
+    monkeypatch.setenv('MICS_CACHEDIR', str(tmp_path / 'cache'))
+    return(str(tmp_path / 'cache'))
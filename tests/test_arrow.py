@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+pa = pytest.importorskip('pyarrow')
+import mics_library.arrow
+from mics_library.arrow import to_arrow, to_arrow_dtypes
+from mics_library.loaders import import_dataset, merge_questionnaires
+
+INDICATORS = {'hh': ['HELEVEL'], 'hl': ['HL4', 'HL6']}
+
+def _to_numpy(df):
+    return(df.apply(lambda x: x.to_numpy(dtype=float, na_value=np.nan)))
+
+def test_to_arrow_dtypes():
+    df = pd.DataFrame({'x': [1., np.nan, 3.], 'HHID': ['a', 'a', 'b'], 'c': pd.Categorical([1, 2, 1])}, index = pd.Index(['a1', 'a2', 'b1'], name = 'HLID'))
+    result = to_arrow_dtypes(df)
+    assert all([isinstance(dtype, pd.ArrowDtype) for dtype in result.dtypes])
+    assert result['x'].isna().tolist() == [False, True, False]
+    assert pa.types.is_dictionary(result['HHID'].dtype.pyarrow_dtype)
+    assert pa.types.is_dictionary(result['c'].dtype.pyarrow_dtype)
+    assert result.index.name == 'HLID' and list(result.index) == list(df.index)
+
+def test_import_pyarrow_backend(rootdir):
+    dataset = import_dataset(5, INDICATORS)
+    dataset_arrow = import_dataset(5, INDICATORS, dtype_backend='pyarrow')
+    for country, (data, keys) in dataset['hl'].items():
+        data_arrow, keys_arrow = dataset_arrow['hl'][country]
+        assert all([isinstance(dtype, pd.ArrowDtype) for dtype in data_arrow.dtypes])
+        pd.testing.assert_frame_equal(_to_numpy(data_arrow), data, check_index_type=False)
+        assert list(keys_arrow['HHID'].astype(str)) == list(keys['HHID'])
+
+def test_to_arrow_no_copy(rootdir):
+    data, keys = import_dataset(5, INDICATORS, dtype_backend='pyarrow')['hl']['Ghana']
+    table = to_arrow(data, keys)
+    assert table.column_names == [data.index.name or 'index'] + list(data.columns) + [c for c in keys.columns if c not in data.columns]
+    assert table.num_rows == data.shape[0]
+    #the buffers of the arrow-backed columns are shared
+    array = pa.array(data['HL6'].array)
+    assert table.column('HL6').chunk(0).buffers()[1].address == array.buffers()[1].address
+
+@pytest.mark.parametrize('drop_na_index', [True, False])
+def test_merge_pyarrow_backend(rootdir, drop_na_index):
+    dataset = import_dataset(5, INDICATORS)
+    data, keys = merge_questionnaires(dataset, drop_na_index=drop_na_index)
+    data_arrow, keys_arrow = merge_questionnaires(dataset, drop_na_index=drop_na_index, dtype_backend='pyarrow')
+    assert all([isinstance(dtype, pd.ArrowDtype) for dtype in data_arrow.dtypes])
+    pd.testing.assert_frame_equal(_to_numpy(data_arrow), data, check_index_type=False)
+
+def test_missing_pyarrow(monkeypatch):
+    monkeypatch.setattr(mics_library.arrow, 'pa', None)
+    with pytest.raises(ImportError):
+        to_arrow(pd.DataFrame({'x': [1.]}))
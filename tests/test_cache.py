@@ -0,0 +1,51 @@
+import os
+import numpy as np
+import pandas as pd
+import pyreadstat
+from mics_library.cache import read_sav, read_meta, clear_cache, _get_entry
+
+def _get_datafile(rootdir, questionnaire='hl'):
+    country = sorted(os.listdir(os.path.join(rootdir, 'MICS5')))[0]
+    return(os.path.join(rootdir, 'MICS5', country, f'{questionnaire}.sav'))
+
+def test_read_sav_matches(rootdir, cachedir):
+    datafile = _get_datafile(rootdir)
+    expected, _ = pyreadstat.read_sav(datafile, usecols = ['HH1', 'HL4', 'HL6'])
+    _, meta = pyreadstat.read_sav(datafile, metadataonly = True)
+    df, meta_cached = read_sav(datafile, usecols = ['HH1', 'HL4', 'HL6', 'NOT_IN_FILE'])
+    pd.testing.assert_frame_equal(df, expected)
+    assert meta_cached.column_names == meta.column_names
+    
+    #read again, from the cached columns
+    df, _ = read_sav(datafile, usecols = ['HL6', 'HH1'])
+    pd.testing.assert_frame_equal(df, expected[['HH1', 'HL6']])
+    assert read_meta(datafile).variable_value_labels == meta.variable_value_labels
+
+def test_changed_file_invalidates(rootdir, cachedir, tmp_path):
+    datafile = str(tmp_path / 'hl.sav')
+    df, meta = pyreadstat.read_sav(_get_datafile(rootdir))
+    pyreadstat.write_sav(df, datafile)
+    read_sav(datafile, usecols = ['HL6'])
+    
+    df['HL6'] = df['HL6'] + 1
+    pyreadstat.write_sav(df, datafile)
+    os.utime(datafile, ns = (0, os.stat(datafile).st_mtime_ns + 10**9))
+    cached, _ = read_sav(datafile, usecols = ['HL6'])
+    assert np.array_equal(cached['HL6'].values, df['HL6'].values, equal_nan = True)
+
+def test_evict_and_clear(rootdir, cachedir, monkeypatch):
+    hl, hh = _get_datafile(rootdir, 'hl'), _get_datafile(rootdir, 'hh')
+    monkeypatch.setenv('MICS_CACHE_MAXSIZE', '1')
+    read_sav(hl)
+    read_sav(hh)
+    #only the entry used last is kept
+    assert not os.path.exists(_get_entry(hl))
+    assert os.path.exists(_get_entry(hh))
+    
+    clear_cache()
+    assert os.listdir(cachedir) == []
+
+def test_no_cachedir(rootdir):
+    datafile = _get_datafile(rootdir)
+    df, meta = read_sav(datafile, usecols = ['HL6'])
+    assert list(df.columns) == ['HL6']
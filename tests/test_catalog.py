@@ -0,0 +1,47 @@
+import os
+import shutil
+import pyreadstat
+import pytest
+from mics_library.catalog import update_catalog, get_meta, get_metas
+from mics_library.preview import screen
+
+@pytest.fixture
+def catalog_rootdir(rootdir, tmp_path, monkeypatch):
+    '''
+    Copy of the round 5, where the catalog can be written
+    '''
+    shutil.copytree(os.path.join(rootdir, 'MICS5'), tmp_path / 'MICS5')
+    monkeypatch.setenv('MICS_ROOTDIR', str(tmp_path))
+    return(str(tmp_path))
+
+def test_update_catalog(catalog_rootdir):
+    DATADIR = os.path.join(catalog_rootdir, 'MICS5')
+    countries = sorted(os.listdir(DATADIR))
+    n_files = sum([len(os.listdir(os.path.join(DATADIR, c))) for c in countries])
+    assert update_catalog(5) == n_files
+    assert update_catalog(5) == 0
+    
+    #changed and removed files
+    datafile = os.path.join(DATADIR, countries[0], 'hl.sav')
+    os.utime(datafile, ns = (0, os.stat(datafile).st_mtime_ns + 10**9))
+    os.remove(os.path.join(DATADIR, countries[1], 'hl.sav'))
+    assert update_catalog(5) == 1
+    assert sorted(get_metas(5, 'hl').keys()) == [countries[0], countries[2]]
+    assert get_meta(5, countries[1], 'hl') is None
+
+def test_catalog_meta_matches(catalog_rootdir):
+    update_catalog(5, ['hl'])
+    country = sorted(os.listdir(os.path.join(catalog_rootdir, 'MICS5')))[0]
+    _, expected = pyreadstat.read_sav(os.path.join(catalog_rootdir, 'MICS5', country, 'hl.sav'), metadataonly=True)
+    meta = get_meta(5, country, 'hl')
+    assert meta.column_names == expected.column_names
+    assert meta.column_labels == expected.column_labels
+    assert meta.variable_to_label == expected.variable_to_label
+    assert meta.value_labels == expected.value_labels
+    assert meta.number_rows == expected.number_rows
+
+def test_screen_with_catalog(catalog_rootdir):
+    expected = screen(5, questionnaires=['hh', 'hl'])
+    result = screen(5, questionnaires=['hh', 'hl'], use_catalog=True)
+    for questionnaire in ['hh', 'hl']:
+        assert result[questionnaire].equals(expected[questionnaire])
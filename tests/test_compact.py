@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+from mics_library.loaders import import_dataset
+from mics_library.utils import compact_dtypes, select_age, drop_duplicated_indices
+
+INDICATORS = {'hl': ['HL6', 'ED4A']}
+
+def test_compact_keeps_ages_numeric(rootdir):
+    dataset = import_dataset(5, INDICATORS)
+    compacted = import_dataset(5, INDICATORS, compact=True)
+    for country, (data, keys) in compacted['hl'].items():
+        #HL6 has value labels only for 'DK' and 'Missing'
+        assert not isinstance(data['HL6'].dtype, pd.CategoricalDtype)
+        assert pd.api.types.is_integer_dtype(data['HL6'].dtype)
+        assert isinstance(data['ED4A'].dtype, pd.CategoricalDtype)
+        
+        children = select_age(data, 'HL6', 5, 17)
+        expected = select_age(dataset['hl'][country][0], 'HL6', 5, 17)
+        assert children.index.equals(expected.index)
+        assert np.isclose(data['HL6'].mean(), dataset['hl'][country][0]['HL6'].mean())
+
+def test_compact_dtypes_labelled_values():
+    df = pd.DataFrame({'age': [1., 30., 98.], 'coded': [1., 2., 9.], 'other': [1., 2., 3.]})
+    labelled = {'age': [98., 99.], 'coded': [1., 2., 8., 9.]}
+    compacted, bytes_saved = compact_dtypes(df.copy(), labelled)
+    assert compacted['age'].dtype == 'Int8'
+    assert isinstance(compacted['coded'].dtype, pd.CategoricalDtype)
+    assert compacted['other'].dtype == 'Int8'
+    #a list of columns: always categorical
+    compacted, bytes_saved = compact_dtypes(df.copy(), ['age'])
+    assert isinstance(compacted['age'].dtype, pd.CategoricalDtype)
+
+def test_mean_of_compacted_duplicates():
+    df = pd.DataFrame({'coded': [1., 2., 2.], 'age': [10., 20., 30.]}, index = ['a', 'a', 'b'])
+    compacted, bytes_saved = compact_dtypes(df.copy(), {'coded': [1., 2.], 'age': []})
+    merged, dupl_indices = drop_duplicated_indices(compacted, 'mean')
+    assert merged.loc['a', 'coded'] == 1.5
+    assert merged.loc['a', 'age'] == 15
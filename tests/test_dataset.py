@@ -0,0 +1,39 @@
+import pandas as pd
+from mics_library.dataset import MICSDataset
+from mics_library.loaders import import_dataset, import_rounds
+
+def test_lazy_selections():
+    ds = MICSDataset(5).select('hl', ['HL4'])
+    ds_filtered = ds.select('hl', ['HL6', 'HL4']).countries(['Ghana', 'Nepal']).filter('hl', 'hl6', 5, 17)
+    #each method returns a new dataset
+    assert ds.indicators == {'hl': ['HL4']} and ds.country_names is None and ds.filters == {}
+    assert ds_filtered.indicators == {'hl': ['HL4', 'HL6']}
+    assert ds_filtered.countries(['Nepal', 'Mexico']).country_names == ['Nepal']
+    
+    #filters on the same indicator are intersected
+    ds_filtered = ds_filtered.filter('hl', 'HL6', 10, None).filter('hl', 'HL6', None, 15)
+    assert ds_filtered.filters == {'hl': {'HL6': (10, 15)}}
+
+def test_collect_matches_import(rootdir):
+    ds = MICSDataset(5).select('hl', ['HL4', 'HL6']).countries(['Ghana', 'Nepal']).filter('hl', 'HL6', 5, 17)
+    dataset = ds.collect()
+    expected = import_dataset(5, {'hl': ['HL4', 'HL6']}, countries=['Ghana', 'Nepal'])
+    assert sorted(dataset['hl'].keys()) == ['Ghana', 'Nepal']
+    for country, (data, keys) in dataset['hl'].items():
+        data_expected, keys_expected = expected['hl'][country]
+        rows = data_expected['HL6'].between(5, 17)
+        pd.testing.assert_frame_equal(data, data_expected[rows])
+        pd.testing.assert_frame_equal(keys, keys_expected[rows.values])
+
+def test_collect_rounds(rootdir):
+    ds = MICSDataset([4, 5]).select('hl', ['HL4', 'HL6']).filter('hl', 'HL6', 5, 17)
+    data, keys = ds.collect()['hl']
+    expected, _ = import_rounds([4, 5], {'hl': ['HL4', 'HL6']})['hl']
+    assert data.shape[0] == expected['HL6'].between(5, 17).sum()
+    assert sorted(keys['round'].unique()) == [4, 5]
+
+def test_collect_merge(rootdir):
+    ds = MICSDataset(5).select('hh', ['HELEVEL']).select('hl', ['HL6'])
+    data, keys = ds.collect(merge=True)
+    assert sorted(data.columns) == ['HELEVEL', 'HL6']
+    assert data.index.equals(keys.index)
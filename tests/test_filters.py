@@ -0,0 +1,43 @@
+import os
+import shutil
+import pyreadstat
+import pytest
+from mics_library.loaders import import_dataset
+
+INDICATORS = {'hl': ['HL4', 'HL6']}
+
+@pytest.fixture
+def empty_rootdir(rootdir, tmp_path, monkeypatch):
+    '''
+    Copy of the round 5, with an empty hl file (no rows) for the first country
+    '''
+    shutil.copytree(os.path.join(rootdir, 'MICS5'), tmp_path / 'MICS5')
+    monkeypatch.setenv('MICS_ROOTDIR', str(tmp_path))
+    country = sorted(os.listdir(tmp_path / 'MICS5'))[0]
+    datafile = str(tmp_path / 'MICS5' / country / 'hl.sav')
+    df, meta = pyreadstat.read_sav(datafile)
+    pyreadstat.write_sav(df.iloc[:0], datafile, column_labels = meta.column_labels, 
+                         variable_value_labels = meta.variable_value_labels)
+    return(str(tmp_path))
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_filters_exclude_all_rows(rootdir, compact):
+    dataset = import_dataset(5, INDICATORS, filters={'hl': {'HL6': (500, 600)}}, compact=compact)
+    assert len(dataset['hl']) == 3
+    for country, (data, keys) in dataset['hl'].items():
+        assert data.shape[0] == 0 and keys.shape[0] == 0
+        assert sorted(data.columns) == ['HL4', 'HL6']
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_filters_empty_file(empty_rootdir, compact):
+    dataset = import_dataset(5, INDICATORS, filters={'hl': {'HL6': (5, 17)}}, compact=compact)
+    data, keys = dataset['hl'][sorted(dataset['hl'].keys())[0]]
+    assert data.shape[0] == 0 and keys.shape[0] == 0
+    assert sorted(data.columns) == ['HL4', 'HL6']
+
+def test_filters_with_cache(rootdir, cachedir):
+    dataset = import_dataset(5, INDICATORS, filters={'hl': {'HL6': (5, 17)}})
+    dataset_cached = import_dataset(5, INDICATORS, filters={'hl': {'HL6': (5, 17)}})
+    for country, (data, keys) in dataset['hl'].items():
+        assert data['HL6'].between(5, 17).all()
+        assert data.equals(dataset_cached['hl'][country][0])
@@ -0,0 +1,43 @@
+from mics_library.loaders import import_dataset
+from mics_library.manifest import update_dataset
+from mics_library import instrument
+
+INDICATORS = {'hl': ['HL4', 'HL6']}
+
+def test_stages_recorded(rootdir):
+    with instrument.record() as recorder:
+        dataset = import_dataset(5, INDICATORS)
+    events = recorder.to_frame()
+    read = events[events['stage'] == 'read']
+    assert sorted(read['country']) == sorted(dataset['hl'].keys())
+    assert (read['rows'] == [dataset['hl'][c][0].shape[0] for c in read['country']]).all()
+    summary = recorder.summary()
+    assert 'read' in summary['stages'].index
+
+def test_unmapped_and_compacted_notices(rootdir, capsys):
+    #only the value 1 of HL4 is recoded in Ghana
+    recoding_dictionary = {'hl': {'HL4': {'Ghana': {1: 1}}}}
+    with instrument.record() as recorder:
+        dataset = import_dataset(5, INDICATORS, recoding_dictionary, compact=True)
+    unmapped = [e for e in recorder.events if e['stage'] == 'unmapped']
+    hl4 = dataset['hl']['Ghana'][0]['HL4'].astype(float)
+    n_unmapped = int((hl4.notna() & (hl4 != 1)).sum())
+    assert [(e['country'], e['indicator'], e['n_unmapped']) for e in unmapped] == [('Ghana', 'HL4', n_unmapped)]
+    compacted = [e for e in recorder.events if e['stage'] == 'compacted']
+    assert len(compacted) == 1 and compacted[0]['bytes_saved'] > 0
+    
+    #printed by the default listener
+    out = capsys.readouterr().out
+    assert f'>>>>>>>>>>>>>>>>>> hl: Ghana  HL4: {n_unmapped} values not in the recoding dictionary' in out
+    assert 'MB saved by compacting dtypes' in out
+
+def test_notices_silenced(rootdir, tmp_path, capsys):
+    instrument.remove_listener(instrument.print_notices)
+    try:
+        with instrument.record() as recorder:
+            update_dataset(str(tmp_path / 'store'), 5, INDICATORS, compact=True)
+    finally:
+        instrument.add_listener(instrument.print_notices)
+    assert capsys.readouterr().out == ''
+    manifest = [e for e in recorder.events if e['stage'] == 'manifest']
+    assert [(e['stale'], e['removed'], e['unchanged']) for e in manifest] == [(3, 0, 0)]
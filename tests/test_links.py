@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import warnings
+from mics_library.loaders import import_dataset, merge_questionnaires
+from mics_library.links import build_links, attach_related
+
+INDICATORS = {'hl': ['HL4', 'HL6', 'ED4A'], 'hh': ['HELEVEL']}
+
+def _expected(data, keys, column, key_column):
+    '''
+    Values of the related persons, joining on the string keys
+    '''
+    target = pd.DataFrame({'HLID': keys['HLID'].values, column: data[column].values})
+    target = target.dropna(subset=['HLID']).drop_duplicates('HLID')
+    related = pd.DataFrame({'HLID': keys[key_column].values}).merge(target, how='left', on='HLID')
+    return(related[column].values)
+
+def test_attach_related_matches_join(rootdir):
+    data, keys = merge_questionnaires(import_dataset(5, INDICATORS), links=True)
+    related = attach_related(data, keys, ['mother', 'father'], ['ED4A'])
+    for relation in ['mother', 'father']:
+        expected = _expected(data, keys, 'ED4A', f'{relation}_HLID')
+        assert np.allclose(related[f'{relation}_ED4A'].values, expected, equal_nan=True)
+    assert (keys['mother_row'] >= 0).sum() > 0
+
+def test_attach_related_after_subset(rootdir):
+    data, keys = merge_questionnaires(import_dataset(5, INDICATORS), links=True)
+    for rows in [np.arange(10, data.shape[0]), np.where(data['HL6'] < 18)[0]]:
+        data_subset, keys_subset = data.iloc[rows], keys.iloc[rows]
+        related = attach_related(data_subset, keys_subset, 'mother', ['ED4A'])
+        expected = _expected(data_subset, keys_subset, 'ED4A', 'mother_HLID')
+        assert np.allclose(related['mother_ED4A'].values, expected, equal_nan=True)
+
+def test_attach_related_target(rootdir):
+    dataset = import_dataset(5, {'hl': ['ED4A'], 'ch': ['AG2']})
+    data, keys = dataset['ch']['Ghana']
+    data_hl, keys_hl = dataset['hl']['Ghana']
+    related = attach_related(data, keys, 'caretaker', ['ED4A'], target=data_hl, target_keys=keys_hl)
+    target = pd.Series(data_hl['ED4A'].values, index=keys_hl['HLID'].values)
+    target = target[~target.index.duplicated()]
+    expected = target.reindex(keys['caretaker_HLID'].values).values
+    assert np.allclose(related['caretaker_ED4A'].values, expected, equal_nan=True)
+
+def test_take_no_warning(rootdir):
+    data, keys = merge_questionnaires(import_dataset(5, INDICATORS))
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', FutureWarning)
+        attach_related(data, keys, 'mother', ['HL6'])
@@ -0,0 +1,83 @@
+import os
+import shutil
+import pyreadstat
+import pandas as pd
+import pytest
+from mics_library.manifest import update_dataset, get_manifest
+from mics_library.loaders import import_dataset, merge_questionnaires
+from mics_library.utils import get_countryname
+from mics_library import instrument
+
+INDICATORS = {'hh': ['HELEVEL'], 'hl': ['HL4', 'HL6']}
+
+@pytest.fixture
+def copy_rootdir(rootdir, tmp_path, monkeypatch):
+    '''
+    Copy of the round 5, whose files can be changed
+    '''
+    shutil.copytree(os.path.join(rootdir, 'MICS5'), tmp_path / 'root' / 'MICS5')
+    monkeypatch.setenv('MICS_ROOTDIR', str(tmp_path / 'root'))
+    return(str(tmp_path / 'root'))
+
+def _update(storedir, **kwargs):
+    '''
+    update_dataset, with the numbers of files (stale, removed, unchanged)
+    '''
+    with instrument.record() as recorder:
+        result = update_dataset(storedir, 5, INDICATORS, **kwargs)
+    counts = [(e['stale'], e['removed'], e['unchanged']) for e in recorder.events if e['stage'] == 'manifest']
+    return(result, counts[0])
+
+def _assert_dataset_equal(dataset, expected):
+    for questionnaire in INDICATORS:
+        assert dataset[questionnaire].keys() == expected[questionnaire].keys()
+        for country, (data, keys) in expected[questionnaire].items():
+            pd.testing.assert_frame_equal(dataset[questionnaire][country][0], data)
+            pd.testing.assert_frame_equal(dataset[questionnaire][country][1], keys)
+
+def test_update_dataset(copy_rootdir, tmp_path):
+    storedir = str(tmp_path / 'store')
+    dataset, counts = _update(storedir)
+    assert counts == (6, 0, 0)
+    _assert_dataset_equal(dataset, import_dataset(5, INDICATORS))
+    
+    dataset, counts = _update(storedir)
+    assert counts == (0, 0, 6)
+    _assert_dataset_equal(dataset, import_dataset(5, INDICATORS))
+    
+    #a changed file and a removed file
+    countries = sorted(os.listdir(os.path.join(copy_rootdir, 'MICS5')))
+    datafile = os.path.join(copy_rootdir, 'MICS5', countries[0], 'hl.sav')
+    df, meta = pyreadstat.read_sav(datafile)
+    pyreadstat.write_sav(df.iloc[:10], datafile)
+    os.utime(datafile, ns = (0, os.stat(datafile).st_mtime_ns + 10**9))
+    os.remove(os.path.join(copy_rootdir, 'MICS5', countries[1], 'hl.sav'))
+    dataset, counts = _update(storedir)
+    assert counts == (2, 0, 4)
+    _assert_dataset_equal(dataset, import_dataset(5, INDICATORS))
+    
+    #countries not selected anymore
+    countrynames = [get_countryname(5, c) for c in countries]
+    dataset, counts = _update(storedir, countries=countrynames[1:])
+    assert counts == (0, 2, 4)
+    _assert_dataset_equal(dataset, import_dataset(5, INDICATORS, countries=countrynames[1:]))
+    
+    #other arguments: nothing is reused
+    dataset, counts = _update(storedir, compact=True)
+    assert counts == (6, 0, 0)
+
+def test_update_dataset_merged(copy_rootdir, tmp_path):
+    storedir = str(tmp_path / 'store')
+    merged, counts = _update(storedir, merge=True)
+    data, keys = merge_questionnaires(import_dataset(5, INDICATORS), by_country=True)
+    pd.testing.assert_frame_equal(merged[0].sort_index(), data.sort_index(), check_like=True)
+    merged, counts = _update(storedir, merge=True)
+    assert counts == (0, 0, 6)
+    assert len(get_manifest(storedir)['merged']) == 3
+
+def test_country_codes_kept(copy_rootdir, tmp_path):
+    storedir = str(tmp_path / 'store')
+    _update(storedir, key_format='int')
+    codes = get_manifest(storedir)['country_codes']
+    _update(storedir, key_format='int')
+    assert get_manifest(storedir)['country_codes'] == codes
@@ -0,0 +1,61 @@
+import os
+import pandas as pd
+import pytest
+import mics_library.plan
+from mics_library.plan import get_plan
+from mics_library.loaders import import_dataset
+
+INDICATORS = {'hh': ['HELEVEL'], 'hl': ['HL4', 'HL6']}
+
+@pytest.fixture
+def read_files(monkeypatch):
+    '''
+    Files whose metadata are read by the plan
+    '''
+    read_files = []
+    read_meta = mics_library.plan.read_meta
+    def read_meta_logged(datafile):
+        read_files.append(datafile)
+        return(read_meta(datafile))
+    monkeypatch.setattr(mics_library.plan, 'read_meta', read_meta_logged)
+    return(read_files)
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_countries_restrict_plan(rootdir, tmp_path, monkeypatch, read_files, cached):
+    if cached:
+        monkeypatch.setenv('MICS_CACHEDIR', str(tmp_path / 'cache'))
+    plan = get_plan(5, INDICATORS, countries=['Ghana'])
+    assert sorted(set([country for (questionnaire, country) in plan.keys()])) == ['Ghana MICS 2015']
+    assert len(read_files) == 2
+    assert all(['Ghana' in x for x in read_files])
+
+    dataset = import_dataset(5, INDICATORS, countries=['Ghana'])
+    assert list(dataset['hl'].keys()) == ['Ghana']
+    assert all(['Ghana' in x for x in read_files])
+
+def test_cached_plan_matches(rootdir, cachedir, read_files):
+    plan = get_plan(5, INDICATORS)
+    n_read = len(read_files)
+    plan_cached = get_plan(5, INDICATORS)
+    #the second plan does not open the files
+    assert len(read_files) == n_read
+    assert plan.keys() == plan_cached.keys()
+    for unit in plan:
+        assert plan[unit]['usecols'] == plan_cached[unit]['usecols']
+
+def test_plans_evicted(rootdir, cachedir, monkeypatch):
+    plansdir = os.path.join(cachedir, 'plans')
+    get_plan(5, INDICATORS)
+    get_plan(5, {'hl': ['HL4']})
+    assert len(os.listdir(plansdir)) == 2
+    
+    #the plans count in the size of the cache: only the last one is kept
+    monkeypatch.setenv('MICS_CACHE_MAXSIZE', '1')
+    plan = get_plan(5, {'hh': ['HELEVEL']})
+    assert len(os.listdir(plansdir)) == 1
+    assert plan.keys() == get_plan(5, {'hh': ['HELEVEL']}).keys()
+    planfile = os.listdir(plansdir)[0]
+    
+    #the plans are evicted with the cached columns
+    import_dataset(5, {'hl': ['HL4']})
+    assert planfile not in os.listdir(plansdir)
@@ -0,0 +1,49 @@
+import os
+import shutil
+import pytest
+import mics_library.loaders
+from mics_library.loaders import import_dataset
+from mics_library import instrument
+
+INDICATORS = {'hh': ['HELEVEL'], 'hl': ['HL4', 'HL6']}
+
+@pytest.fixture
+def prefetched(monkeypatch):
+    '''
+    Files read by the prefetch thread
+    '''
+    prefetched = []
+    listener = lambda event: prefetched.append(event['datafile']) if event['stage'] == 'prefetch' else None
+    instrument.add_listener(listener)
+    yield(prefetched)
+    instrument.remove_listener(listener)
+
+def test_prefetch_matches(rootdir, prefetched):
+    dataset = import_dataset(5, INDICATORS)
+    dataset_prefetched = import_dataset(5, INDICATORS, prefetch=2)
+    assert len(prefetched) == 6
+    for questionnaire in INDICATORS:
+        for country, (data, keys) in dataset[questionnaire].items():
+            assert data.equals(dataset_prefetched[questionnaire][country][0])
+
+def test_prefetch_skips_cached(rootdir, cachedir, prefetched):
+    import_dataset(5, INDICATORS, prefetch=2)
+    assert len(prefetched) == 6
+    #all the columns are in the cache
+    import_dataset(5, INDICATORS, prefetch=2)
+    assert len(prefetched) == 6
+
+def test_prefetch_error_raised(rootdir, monkeypatch):
+    #the prefetch thread fails: the error is raised instead of waiting forever
+    monkeypatch.setattr(mics_library.loaders, 'PREFETCH_BLOCKSIZE', 'x')
+    with pytest.raises(TypeError):
+        import_dataset(5, INDICATORS, prefetch=2)
+
+def test_prefetch_corrupt_file(rootdir, tmp_path, monkeypatch):
+    shutil.copytree(os.path.join(rootdir, 'MICS5'), tmp_path / 'MICS5')
+    monkeypatch.setenv('MICS_ROOTDIR', str(tmp_path))
+    country = sorted(os.listdir(tmp_path / 'MICS5'))[0]
+    with open(tmp_path / 'MICS5' / country / 'hl.sav', 'wb') as f:
+        f.write(b'not a sav file')
+    with pytest.raises(Exception):
+        import_dataset(5, {'hl': ['HL4']}, prefetch=1)
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+from mics_library.rollup import rollup
+from mics_library.loaders import import_dataset, merge_questionnaires
+
+INDICATORS = {'hh': ['HELEVEL'], 'hl': ['HL4', 'HL6', 'ED4A']}
+
+AGGS = {'members': (None, 'size'),
+        'n_education': ('ED4A', 'count'),
+        'total_age': ('HL6', 'sum'),
+        'mean_age': ('HL6', 'mean'),
+        'youngest': ('HL6', 'min'),
+        'max_education': ('ED4A', 'max'),
+        'under5': (lambda d: d['HL6'] < 5, 'sum'),
+        'any_under5': (lambda d: d['HL6'] < 5, 'any')}
+
+def _expected(data, keys):
+    '''
+    The aggregations with pandas groupby
+    '''
+    data = data.assign(HHID = keys['HHID'].values, under5 = (data['HL6'] < 5).astype(float))
+    grouped = data.groupby('HHID', sort=False)
+    return(pd.DataFrame({'members': grouped.size(),
+                         'n_education': grouped['ED4A'].count(),
+                         'total_age': grouped['HL6'].sum(),
+                         'mean_age': grouped['HL6'].mean(),
+                         'youngest': grouped['HL6'].min(),
+                         'max_education': grouped['ED4A'].max(),
+                         'under5': grouped['under5'].sum(),
+                         'any_under5': grouped['under5'].sum() > 0}))
+
+def _assert_rollup_equal(result, expected):
+    assert set(result.index) == set(expected.index)
+    result = result.loc[expected.index]
+    for c in expected.columns:
+        assert np.allclose(result[c].astype(float), expected[c].astype(float), equal_nan=True), c
+
+@pytest.mark.parametrize('kwargs', [{}, {'compact': True}, {'dtype_backend': 'pyarrow'}])
+def test_rollup_matches_groupby(rootdir, kwargs):
+    if 'dtype_backend' in kwargs:
+        pytest.importorskip('pyarrow')
+    dataset = import_dataset(5, INDICATORS, **kwargs)
+    result = rollup(dataset['hl'], aggs=AGGS)
+    expected = import_dataset(5, INDICATORS)
+    assert result.keys() == dataset['hl'].keys()
+    for country, (data, keys) in expected['hl'].items():
+        _assert_rollup_equal(result[country], _expected(data, keys))
+
+@pytest.mark.parametrize('n_jobs', [None, 2])
+def test_rollup_merged(rootdir, n_jobs):
+    dataset = import_dataset(5, INDICATORS)
+    data, keys = merge_questionnaires(dataset)
+    result = rollup(data, keys, aggs=AGGS, n_jobs=n_jobs)
+    expected = _expected(data, keys)
+    #the rows of the households without members (nan HL6) are counted too
+    _assert_rollup_equal(result, expected)
+    
+    #the households join the hh data
+    hh = pd.concat([x[0] for x in dataset['hh'].values()])
+    assert hh.join(result).shape[0] == hh.shape[0]
+
+def test_rollup_default_and_errors(rootdir):
+    data, keys = import_dataset(5, {'hl': ['HL6']})['hl']['Ghana']
+    result = rollup(data, keys)
+    assert list(result.columns) == ['members']
+    assert result['members'].sum() == data.shape[0]
+    with pytest.raises(ValueError):
+        rollup(data)
+    with pytest.raises(AssertionError):
+        rollup(data, keys, aggs={'x': ('HL6', 'median')})
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+import pytest
+from mics_library.loaders import import_dataset, merge_questionnaires
+from mics_library.utils import get_rows_all_nan, _sparse_array
+
+def _dense(df):
+    return(df.apply(lambda x: x.sparse.to_dense() if isinstance(x.dtype, pd.SparseDtype) else x))
+
+@pytest.mark.parametrize('duplicates', ['first', 'last', 'combine'])
+def test_sparse_merge_matches_dense(rootdir, duplicates):
+    #HH1 is in both questionnaires: combined according to duplicates
+    dataset = import_dataset(5, {'hh': ['HELEVEL', 'HH1'], 'hl': ['HL4', 'HH1'], 'ch': ['AG2']})
+    data, keys = merge_questionnaires(dataset, duplicates=duplicates)
+    data_sparse, keys_sparse = merge_questionnaires(dataset, duplicates=duplicates, sparse=True)
+    assert any([isinstance(dtype, pd.SparseDtype) for dtype in data_sparse.dtypes])
+    pd.testing.assert_frame_equal(_dense(data_sparse), data, check_dtype=False)
+    pd.testing.assert_frame_equal(keys_sparse, keys)
+    assert (get_rows_all_nan(data_sparse) == get_rows_all_nan(data)).all()
+
+def test_sparse_array():
+    dtype = pd.SparseDtype(np.float64, np.nan)
+    array = _sparse_array(np.array([1., 2.]), np.array([1, 3]), 5, dtype)
+    assert array.dtype == dtype
+    assert np.allclose(np.asarray(array), [np.nan, 1, np.nan, 2, np.nan], equal_nan=True)
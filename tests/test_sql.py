@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+import mics_library.sql
+from mics_library.sql import connect, query
+from mics_library.loaders import import_dataset, import_rounds, merge_questionnaires
+
+INDICATORS = {'hh': ['HELEVEL'], 'hl': ['HL4', 'HL6']}
+
+ENGINES = ['sqlite', pytest.param('duckdb', marks=pytest.mark.skipif(mics_library.sql.duckdb is None, reason='duckdb not installed'))]
+
+def _expected_counts(dataset):
+    '''
+    Number of members of each country aged 5-17, with pandas
+    '''
+    counts = {country: int(data['HL6'].between(5, 17).sum()) for country, (data, keys) in dataset['hl'].items()}
+    return(pd.Series(counts).sort_index())
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_query_dataset(rootdir, engine):
+    dataset = import_dataset(5, INDICATORS)
+    con = connect(dataset, engine)
+    result = query(con, 'SELECT country, COUNT(*) AS n FROM hl WHERE HL6 BETWEEN ? AND ? GROUP BY country ORDER BY country', [5, 17])
+    counts = result.set_index('country')['n']
+    assert counts.astype(int).to_dict() == _expected_counts(dataset).to_dict()
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_join_matches_merge(rootdir, engine):
+    dataset = import_dataset(5, INDICATORS)
+    con = connect(dataset, engine)
+    result = query(con, 'SELECT hl.HLID, hh.HELEVEL FROM hl JOIN hh ON hl.HHID = hh.HHID ORDER BY hl.HLID')
+    data, keys = merge_questionnaires(dataset)
+    expected = data['HELEVEL'].dropna().sort_index()
+    members = result.set_index('HLID')['HELEVEL'].dropna()
+    assert len(members) > 0 and members.index.isin(expected.index).all()
+    assert members.to_dict() == expected[expected.index.isin(members.index)].to_dict()
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_query_merged_and_rounds(rootdir, engine):
+    con = connect(merge_questionnaires(import_dataset(5, INDICATORS)), engine)
+    assert query(con, 'SELECT COUNT(*) AS n FROM merged')['n'][0] > 0
+    
+    dataset = import_rounds([4, 5], {'hl': ['HL6']})
+    con = connect(dataset, engine)
+    result = query(con, 'SELECT round, COUNT(*) AS n FROM hl GROUP BY round ORDER BY round')
+    assert list(result['round']) == [4, 5]
+    assert result['n'].sum() == dataset['hl'][0].shape[0]
+
+def test_missing_duckdb(rootdir, monkeypatch):
+    monkeypatch.setattr(mics_library.sql, 'duckdb', None)
+    dataset = import_dataset(5, {'hl': ['HL6']})
+    with pytest.raises(ImportError):
+        connect(dataset, 'duckdb')
+    #SQLite is used instead
+    con = connect(dataset)
+    assert query(con, 'SELECT COUNT(*) AS n FROM hl')['n'][0] == sum([x[0].shape[0] for x in dataset['hl'].values()])
@@ -0,0 +1,53 @@
+import pandas as pd
+import pytest
+from mics_library.store import export_dataset, open_dataset, list_partitions
+from mics_library.loaders import import_dataset, import_rounds, merge_questionnaires
+
+INDICATORS = {'hh': ['HELEVEL'], 'hl': ['HL4', 'HL6', 'ED4A']}
+
+def _assert_dataset_equal(dataset, expected):
+    assert dataset.keys() == expected.keys()
+    for questionnaire in expected:
+        assert sorted(dataset[questionnaire].keys()) == sorted(expected[questionnaire].keys())
+        for country, (data, keys) in expected[questionnaire].items():
+            pd.testing.assert_frame_equal(dataset[questionnaire][country][0], data)
+            pd.testing.assert_frame_equal(dataset[questionnaire][country][1], keys)
+
+@pytest.mark.parametrize('kwargs', [{}, {'compact': True}, {'key_format': 'int'}, {'dtype_backend': 'pyarrow'}])
+def test_export_open(rootdir, tmp_path, kwargs):
+    dataset = import_dataset(5, INDICATORS, **kwargs)
+    assert export_dataset(dataset, str(tmp_path), 5) == 6
+    _assert_dataset_equal(open_dataset(str(tmp_path)), dataset)
+    
+    partitions = list_partitions(str(tmp_path))
+    assert partitions.shape[0] == 6
+    assert (partitions['round'] == 5).all()
+
+def test_open_selection(rootdir, tmp_path):
+    dataset = import_dataset(5, INDICATORS)
+    export_dataset(dataset, str(tmp_path), 5)
+    opened = open_dataset(str(tmp_path), questionnaires=['hl'], countries=['Ghana'], columns=['HL6'], keys=False)
+    assert list(opened.keys()) == ['hl'] and list(opened['hl'].keys()) == ['Ghana']
+    data, keys = opened['hl']['Ghana']
+    assert keys is None
+    pd.testing.assert_frame_equal(data, dataset['hl']['Ghana'][0][['HL6']])
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_export_merged(rootdir, tmp_path, sparse):
+    data, keys = merge_questionnaires(import_dataset(5, INDICATORS), sparse=sparse)
+    export_dataset((data, keys), str(tmp_path), 5)
+    opened = open_dataset(str(tmp_path))
+    assert list(opened.keys()) == ['merged']
+    for country, (data_country, keys_country) in opened['merged'].items():
+        rows = (keys['country'] == country).values
+        pd.testing.assert_frame_equal(data_country, data[rows])
+        pd.testing.assert_frame_equal(keys_country, keys[rows])
+
+def test_export_rounds(rootdir, tmp_path):
+    data, keys = import_rounds([4, 5], {'hl': ['HL4', 'HL6']})['hl']
+    export_dataset({'hl': (data, keys)}, str(tmp_path))
+    assert sorted(list_partitions(str(tmp_path))['round'].unique()) == [4, 5]
+    with pytest.raises(AssertionError):
+        open_dataset(str(tmp_path))
+    opened = open_dataset(str(tmp_path), micsround=4)
+    assert sum([x[0].shape[0] for x in opened['hl'].values()]) == (keys['round'] == 4).sum()